@@ -74,6 +74,11 @@ from collectivevariable import (
     CoordinateFunctionCV, CallableCV, PyEMMAFeaturizerCV,
     GeneratorCV)
 
+from cv_intermediates import (
+    Intermediate, MDTrajConversion, CoordinateSlice, CoordinateBuffer,
+    shared_intermediates
+)
+
 from ensemble import (
     Ensemble, EnsembleCombination, EnsembleFactory, EntersXEnsemble,
     EmptyEnsemble, ExitsXEnsemble, FullEnsemble, PartInXEnsemble,
@@ -83,7 +88,7 @@ from ensemble import (
     ReversedTrajectoryEnsemble, SequentialEnsemble, VolumeEnsemble,
     SequentialEnsemble, IntersectionEnsemble, UnionEnsemble,
     SingleFrameEnsemble, MinusInterfaceEnsemble, TISEnsemble,
-    OptionalEnsemble, join_ensembles
+    OptionalEnsemble, VolumeMasks, join_ensembles
 )
 
 from high_level.interface_set import (
@@ -114,7 +119,7 @@ from pathmover import (
     BackwardExtendMover, ForwardExtendMover, MinusMover,
     SingleReplicaMinusMover, PathMoverFactory, PathReversalMover,
     ReplicaExchangeMover, EnsembleHopMover,
-    SequentialMover, ConditionalMover,
+    SequentialMover, ConcurrentMover, ConditionalMover,
     PathSimulatorMover, PathReversalSet, NeighborEnsembleReplicaExchange,
     SampleMover, StateSwapMover, FinalSubtrajectorySelectMover, EngineMover,
     FirstSubtrajectorySelectMover, MultipleSetMinusMover,
@@ -123,7 +128,7 @@ from pathmover import (
     LastAllowedMover, OneWayExtendMover, SubtrajectorySelectMover,
     IdentityPathMover, RandomAllowedChoiceMover,
     TwoWayShootingMover, ForwardFirstTwoWayShootingMover,
-    BackwardFirstTwoWayShootingMover
+    BackwardFirstTwoWayShootingMover, ConcurrentTwoWayShootingMover
 )
 
 from pathsimulator import (
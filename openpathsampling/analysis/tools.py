@@ -6,6 +6,10 @@ def pathlength(sample):
     return len(sample.trajectory)
 
 def max_lambdas(sample, orderparameter):
+    if hasattr(orderparameter, 'values_for'):
+        # read stored values without loading snapshots if possible
+        return max(orderparameter.values_for(sample.trajectory))
+
     return max(orderparameter(sample.trajectory))
 
 def sampleset_sample_generator(steps):
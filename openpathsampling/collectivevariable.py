@@ -1,9 +1,11 @@
+import numpy as np
+
 import chaindict as cd
 from openpathsampling.netcdfplus import StorableNamedObject, WeakKeyCache, \
-    ObjectJSON, create_to_dict, ObjectStore
+    ObjectJSON, create_to_dict, ObjectStore, LRUValueCache, LoaderProxy
 
 import openpathsampling.engines as peng
-from openpathsampling.engines.openmm.tools import trajectory_to_mdtraj
+from cv_intermediates import MDTrajConversion
 
 
 # ==============================================================================
@@ -99,6 +101,50 @@ class CollectiveVariable(cd.Wrap, StorableNamedObject):
         self.diskcache_enabled = False
         return self
 
+    def with_cache_limit(self, max_count=None, max_bytes=None, spill=False):
+        """
+        Limit the memory used by the in-memory cache of this CV
+
+        By default values are cached as long as their snapshots exist. With
+        a limit the least recently used values are evicted instead. The
+        setting is not stored and needs to be set again after loading.
+
+        Parameters
+        ----------
+        max_count : int or `None`
+            the maximal number of cached values. `None` means no limit
+        max_bytes : int or `None`
+            the maximal memory used by the cached values in bytes. `None`
+            means no limit
+        spill : bool
+            if `True` evicted values are written to all attached incomplete
+            diskcaches that contain the snapshot but not yet its value
+
+        Returns
+        -------
+        :class:`CollectiveVariable`
+            the CV itself
+        """
+        if max_count is None and max_bytes is None:
+            cache = WeakKeyCache()
+        else:
+            cache = LRUValueCache(
+                max_count=max_count,
+                max_bytes=max_bytes,
+                on_evict=self._spill_value if spill else None
+            )
+
+        cache.transfer(self._cache_dict.cache)
+        self._cache_dict.cache = cache
+        return self
+
+    def _spill_value(self, uuid, value):
+        for value_store in self.stores:
+            if value_store.allow_incomplete:
+                # stores only look at the uuid, so no snapshot is loaded
+                value_store[LoaderProxy(value_store.storage.snapshots, uuid)] \
+                    = value
+
     def set_cache_store(self, value_store):
         """
         Attach store variables to the collective variables.
@@ -188,6 +234,52 @@ class CollectiveVariable(cd.Wrap, StorableNamedObject):
         if self._store_dict:
             self._store_dict.cache_all()
 
+    def values_for(self, trajectory):
+        """
+        Return the values of the CV for all frames of a trajectory
+
+        If all values are stored in an attached diskcache they are read in a
+        single vectorized read without loading any snapshot. For a stored
+        trajectory the positions of its snapshots are read at once as well.
+        Otherwise the values are taken from the caches or computed like
+        `cv(trajectory)`.
+
+        Parameters
+        ----------
+        trajectory : :class:`openpathsampling.Trajectory` or list of
+            :class:`openpathsampling.engines.BaseSnapshot`
+            the frames to get the values for
+
+        Returns
+        -------
+        numpy.ndarray
+            the values, wrapped in a `simtk.unit.Quantity` if the values
+            are stored with units
+        """
+        if hasattr(trajectory, 'iter_proxies'):
+            frames = list(trajectory.iter_proxies())
+        else:
+            frames = list(trajectory)
+
+        uuid = getattr(trajectory, '__uuid__', None)
+
+        for value_store in self.stores:
+            storage = value_store.storage
+            snapshots = storage.snapshots
+
+            traj_idx = storage.trajectories.index.get(uuid)
+            if traj_idx is not None and traj_idx >= 0:
+                positions = storage.trajectories.snapshot_indices(traj_idx)
+            else:
+                positions = map(snapshots.pos, frames)
+
+            if None not in positions:
+                values = snapshots.cv_values(self, positions)
+                if values is not None:
+                    return values
+
+        return np.array(self(frames))
+
     def __eq__(self, other):
         """Override the default Equals behavior"""
         if isinstance(other, self.__class__):
@@ -650,8 +742,16 @@ class MDTrajFunctionCV(CoordinateFunctionCV):
     >>> psi_orderparam = FunctionCV("psi", md.compute_dihedrals,
     >>>                              indices=[[2,4,6,8]])
     >>> print psi_orderparam( traj )
+
+    Attributes
+    ----------
+    atom_index_kwargs : tuple of str
+        the names of kwargs that hold atom indices of the full system. These
+        are translated to indices of the subset if `atom_indices` is given
     """
 
+    atom_index_kwargs = ('atom_pairs', 'indices', 'angle_indices')
+
     def __init__(self,
                  name,
                  f,
@@ -659,6 +759,7 @@ class MDTrajFunctionCV(CoordinateFunctionCV):
                  cv_requires_lists=True,
                  cv_wrap_numpy_array=True,
                  cv_scalarize_numpy_singletons=True,
+                 atom_indices=None,
                  **kwargs
                  ):
         """
@@ -677,6 +778,11 @@ class MDTrajFunctionCV(CoordinateFunctionCV):
             dimension less. e.g. `[[1], [2], [3]]` will be turned into
             `[1, 2, 3]`. This is often useful, when you use en external function
             from mdtraj to get only a single value.
+        atom_indices : list of int or `None`
+            if given only these atoms are converted and `f` is called with a
+            trajectory of this subset. Atom indices in the kwargs listed in
+            `atom_index_kwargs` (like `atom_pairs`) are given for the full
+            system and are translated to the subset
 
         """
 
@@ -691,11 +797,44 @@ class MDTrajFunctionCV(CoordinateFunctionCV):
 
         self.topology = topology
 
-    def _eval(self, items):
-        trajectory = peng.Trajectory(items)
+        if atom_indices is None:
+            self.atom_indices = None
+        else:
+            self.atom_indices = [int(atom) for atom in atom_indices]
+
+        self._subset_kwargs = self._kwargs_for_subset(self.kwargs)
+
+    def _kwargs_for_subset(self, kwargs):
+        """
+        Translate atom indices in kwargs to indices in `atom_indices`
+        """
+        if self.atom_indices is None:
+            return kwargs
 
-        t = trajectory_to_mdtraj(trajectory, self.topology.mdtraj)
-        return self.cv_callable(t, **self.kwargs)
+        subset = {atom: pos for pos, atom in enumerate(self.atom_indices)}
+
+        subset_kwargs = dict(kwargs)
+        for key in self.atom_index_kwargs:
+            if key not in kwargs:
+                continue
+
+            atoms = np.asarray(kwargs[key], dtype=int)
+            try:
+                positions = [subset[atom] for atom in atoms.ravel().tolist()]
+            except KeyError as e:
+                raise ValueError(
+                    'Atom %d in `%s` is not part of `atom_indices`.' %
+                    (e.args[0], key))
+
+            subset_kwargs[key] = np.array(
+                positions, dtype=int).reshape(atoms.shape)
+
+        return subset_kwargs
+
+    def _eval(self, items):
+        # the conversion is shared with other CVs on the same snapshots
+        t = MDTrajConversion(self.topology.mdtraj, self.atom_indices)(items)
+        return self.cv_callable(t, **self._subset_kwargs)
 
     @property
     def mdtraj_function(self):
@@ -709,7 +848,9 @@ class MDTrajFunctionCV(CoordinateFunctionCV):
             'kwargs': self.kwargs,
             'cv_requires_lists': self.cv_requires_lists,
             'cv_wrap_numpy_array': self.cv_wrap_numpy_array,
-            'cv_scalarize_numpy_singletons': self.cv_scalarize_numpy_singletons
+            'cv_scalarize_numpy_singletons':
+                self.cv_scalarize_numpy_singletons,
+            'atom_indices': self.atom_indices
         }
 
 
@@ -783,10 +924,8 @@ class MSMBFeaturizerCV(CoordinateGeneratorCV):
         return self.cv_callable
 
     def _eval(self, items):
-        trajectory = peng.Trajectory(items)
-
-        # create an mdtraj trajectory out of it
-        ptraj = trajectory_to_mdtraj(trajectory, self.topology.mdtraj)
+        # create an mdtraj trajectory out of it or reuse the one of another CV
+        ptraj = MDTrajConversion(self.topology.mdtraj)(items)
 
         # run the featurizer
         return self._instance.partial_transform(ptraj)
@@ -868,9 +1007,7 @@ class PyEMMAFeaturizerCV(MSMBFeaturizerCV):
         )
 
     def _eval(self, items):
-        trajectory = peng.Trajectory(items)
-
-        t = trajectory_to_mdtraj(trajectory, self.topology.mdtraj)
+        t = MDTrajConversion(self.topology.mdtraj)(items)
         return self._instance.transform(t)
 
     def to_dict(self):
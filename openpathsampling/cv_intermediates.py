@@ -0,0 +1,375 @@
+"""
+Intermediate results shared by collective variables
+
+Many CVs start with the same expensive step on the same frames, e.g. the
+conversion of the snapshots into an `mdtraj.Trajectory`. An
+:class:`Intermediate` describes such a step. Its results are kept in a small
+LRU cache per thread by the intermediate and the uuids of the frames, so CVs
+that are evaluated one after the other on the same batch of snapshots compute
+it only once.
+"""
+
+import threading
+
+import mdtraj as md
+import numpy as np
+import simtk.unit as u
+
+import openpathsampling.engines as peng
+from openpathsampling.netcdfplus import LRUCache
+
+
+class _Identity(object):
+    """
+    Hashable by identity, keeps the wrapped object alive while it is a key
+
+    Unlike a key built from `id(obj)` the identity of the object cannot be
+    reused by another object as long as the key exists.
+    """
+
+    __slots__ = ['obj']
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    def __hash__(self):
+        return id(self.obj)
+
+    def __eq__(self, other):
+        return type(other) is _Identity and other.obj is self.obj
+
+    def __ne__(self, other):
+        return not self == other
+
+
+class Intermediate(object):
+    """
+    A product computed from a batch of snapshots that CVs can share
+
+    Subclasses implement `key` and `compute`. Two intermediates with the same
+    key must compute the same result. Results are shared between CVs and
+    must not be changed in place.
+
+    Attributes
+    ----------
+    reuses_buffer : bool
+        if `True` computing a new result overwrites the previous result of
+        an intermediate with the same key, so only the last one is kept
+    """
+
+    reuses_buffer = False
+
+    def key(self):
+        """
+        Return a hashable identifier of the computed product
+
+        Returns
+        -------
+        tuple
+        """
+        raise NotImplementedError
+
+    def compute(self, trajectory):
+        """
+        Compute the product for a batch of snapshots
+
+        Parameters
+        ----------
+        trajectory : :class:`openpathsampling.Trajectory`
+            the snapshots of the batch
+
+        Returns
+        -------
+        object
+        """
+        raise NotImplementedError
+
+    def __call__(self, items):
+        return shared_intermediates.get(self, items)
+
+
+class CoordinateBuffer(object):
+    """
+    Gathers the coordinates of snapshots into a reused float32 array
+
+    The array grows to the largest batch and is reused for all later
+    batches, so only the coordinates of the selected atoms are copied once
+    per frame and no arrays are allocated.
+
+    Parameters
+    ----------
+    topology : :class:`mdtraj.Topology`
+        the topology of all atoms in the snapshots
+    atom_indices : list of int or `None`
+        if given only these atoms are gathered
+
+    Attributes
+    ----------
+    topology : :class:`mdtraj.Topology`
+        the topology of the gathered atoms. It is shared by all created
+        trajectories
+    """
+
+    def __init__(self, topology, atom_indices=None):
+        if atom_indices is None:
+            self.atom_indices = None
+            self.topology = topology
+        else:
+            self.atom_indices = np.array(atom_indices, dtype=int)
+            self.topology = topology.subset(self.atom_indices)
+
+        self._xyz = np.empty((0, self.topology.n_atoms, 3), np.float32)
+        self._box = np.empty((0, 3, 3), np.float32)
+
+    def _reserve(self, n_frames):
+        if len(self._xyz) < n_frames:
+            size = max(n_frames, 2 * len(self._xyz))
+            self._xyz = np.empty(
+                (size,) + self._xyz.shape[1:], np.float32)
+            self._box = np.empty((size, 3, 3), np.float32)
+
+    def gather(self, trajectory):
+        """
+        Copy coordinates and box vectors of all frames into the buffer
+
+        Parameters
+        ----------
+        trajectory : :class:`openpathsampling.Trajectory`
+            the frames
+
+        Returns
+        -------
+        xyz : numpy.ndarray, shape=(frames, atoms, 3), dtype=numpy.float32
+            the coordinates without units. A view of the buffer
+        box_vectors : numpy.ndarray, shape=(frames, 3, 3) or `None`
+            the box vectors without units or `None` if a frame has none. A
+            view of the buffer
+        """
+        n_frames = len(trajectory)
+        self._reserve(n_frames)
+
+        xyz = self._xyz[:n_frames]
+        box = self._box[:n_frames]
+
+        for idx, snapshot in enumerate(trajectory):
+            coordinates = snapshot.coordinates
+            if type(coordinates) is u.Quantity:
+                coordinates = coordinates._value
+
+            if self.atom_indices is None:
+                xyz[idx] = coordinates
+            else:
+                xyz[idx] = coordinates[self.atom_indices]
+
+            if box is not None:
+                box_vectors = snapshot.box_vectors
+                if box_vectors is None:
+                    box = None
+                else:
+                    if type(box_vectors) is u.Quantity:
+                        box_vectors = box_vectors._value
+
+                    box[idx] = box_vectors
+
+        return xyz, box
+
+    def to_mdtraj(self, trajectory):
+        """
+        Return an `mdtraj.Trajectory` of the frames that views the buffer
+
+        Parameters
+        ----------
+        trajectory : :class:`openpathsampling.Trajectory`
+            the frames
+
+        Returns
+        -------
+        :class:`mdtraj.Trajectory`
+            the trajectory. It is only valid until the next call
+        """
+        xyz, box = self.gather(trajectory)
+
+        traj = md.Trajectory(xyz, self.topology)
+        if box is not None:
+            traj.unitcell_vectors = box
+
+        return traj
+
+
+class MDTrajConversion(Intermediate):
+    """
+    The batch as an `mdtraj.Trajectory`
+
+    All conversions in a thread with the same topology and atoms share one
+    :class:`CoordinateBuffer`, so the coordinates of a batch are gathered
+    from the snapshots only once. Each call returns its own trajectory with
+    a copy of the gathered coordinates and box, so a CV can change it in
+    place or return views of its coordinates without affecting other CVs.
+    The shared trajectory returned by `compute` is only valid until the
+    next batch is converted. Each thread keeps the buffers of the
+    `buffer_limit` most recently used topologies and atoms.
+
+    Parameters
+    ----------
+    topology : :class:`mdtraj.Topology`
+        the topology of all atoms in the snapshots
+    atom_indices : list of int or `None`
+        if given only these atoms are gathered and the trajectory uses the
+        topology of the subset
+    """
+
+    reuses_buffer = True
+
+    buffer_limit = 4
+
+    _local = threading.local()
+
+    def __init__(self, topology, atom_indices=None):
+        self.topology = topology
+        if atom_indices is None:
+            self.atom_indices = None
+        else:
+            self.atom_indices = tuple(int(atom) for atom in atom_indices)
+
+    def __call__(self, items):
+        shared = super(MDTrajConversion, self).__call__(items)
+
+        lengths = shared.unitcell_lengths
+        angles = shared.unitcell_angles
+
+        # the topology is shared, the arrays are the caller's own
+        return md.Trajectory(
+            shared.xyz.copy(),
+            shared.topology,
+            unitcell_lengths=None if lengths is None else lengths.copy(),
+            unitcell_angles=None if angles is None else angles.copy()
+        )
+
+    def key(self):
+        # hashing a topology is expensive, so it is compared by identity
+        return 'mdtraj', _Identity(self.topology), self.atom_indices
+
+    @classmethod
+    def _thread_buffers(cls):
+        buffers = getattr(cls._local, 'buffers', None)
+        if buffers is None:
+            buffers = LRUCache(cls.buffer_limit)
+            cls._local.buffers = buffers
+
+        return buffers
+
+    def compute(self, trajectory):
+        key = self.key()
+        buffers = self._thread_buffers()
+        try:
+            buffer = buffers[key]
+        except KeyError:
+            buffer = CoordinateBuffer(self.topology, self.atom_indices)
+            buffers[key] = buffer
+
+        return buffer.to_mdtraj(trajectory)
+
+
+class CoordinateSlice(Intermediate):
+    """
+    The coordinates of selected atoms as an array (frames, atoms, 3)
+
+    Parameters
+    ----------
+    atom_indices : list of int
+        the indices of the selected atoms
+    """
+
+    def __init__(self, atom_indices):
+        self.atom_indices = tuple(int(atom) for atom in atom_indices)
+
+    def key(self):
+        return 'coordinates', self.atom_indices
+
+    def compute(self, trajectory):
+        return trajectory.xyz[:, list(self.atom_indices)]
+
+
+class IntermediateCache(threading.local):
+    """
+    LRU cache of intermediates by batch of snapshots
+
+    The cache is thread-local: each thread keeps its own results and
+    counters, so CVs can be evaluated in several threads at once without
+    one thread dropping or overwriting results another one still uses.
+
+    Parameters
+    ----------
+    size_limit : int
+        the maximal number of kept results
+
+    Attributes
+    ----------
+    hits : int
+        the number of results reused
+    misses : int
+        the number of results computed
+    """
+
+    def __init__(self, size_limit=8):
+        self.cache = LRUCache(size_limit)
+        self.hits = 0
+        self.misses = 0
+
+        self._last_keys = {}
+
+    def get(self, intermediate, items):
+        """
+        Return the intermediate for a batch, computing it only if necessary
+
+        Parameters
+        ----------
+        intermediate : :class:`Intermediate`
+            the product to return
+        items : list of :class:`openpathsampling.engines.BaseSnapshot`
+            the batch of snapshots or their proxies
+
+        Returns
+        -------
+        object
+            the product
+        """
+        # proxies know their uuid, so no snapshot is loaded for the key
+        intermediate_key = intermediate.key()
+        key = (
+            intermediate_key,
+            tuple(item.__uuid__ for item in items)
+        )
+
+        try:
+            result = self.cache[key]
+            self.hits += 1
+        except KeyError:
+            if intermediate.reuses_buffer:
+                # the last result is overwritten by the new one
+                last_key = self._last_keys.pop(intermediate_key, None)
+                if last_key in self.cache:
+                    del self.cache[last_key]
+
+                self._last_keys[intermediate_key] = key
+
+            result = intermediate.compute(peng.Trajectory(items))
+            self.cache[key] = result
+            self.misses += 1
+
+            # forget last keys of results that dropped out of the cache
+            for last_key_of, last_key in self._last_keys.items():
+                if last_key not in self.cache:
+                    del self._last_keys[last_key_of]
+
+        return result
+
+    def clear(self):
+        """
+        Remove all kept results
+        """
+        self.cache.clear()
+        self._last_keys.clear()
+
+
+shared_intermediates = IntermediateCache()
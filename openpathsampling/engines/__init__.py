@@ -8,3 +8,6 @@ import features
 from dynamics_engine import (
     DynamicsEngine, NoEngine, EngineError,
     EngineNaNError, EngineMaxLengthError)
+
+from process_pool import (
+    EngineProcessPool, active_pool, python_random, numpy_random)
@@ -91,6 +91,17 @@ class DynamicsEngine(StorableNamedObject):
         4.  a callable will be used as a function to generate the new from the
             old trajectories, e.g. `lambda t: t[:10]` would restart with the
             first 10 frames
+    block_size : int, default: 1
+        the number of frames generated at once before the stopping conditions
+        are tested. All collective variables used by the stopping conditions
+        are evaluated on the whole block in a single call and the trajectory
+        is cut at the first frame where a condition fails, so the returned
+        trajectory is the same as frame by frame. Frames generated past that
+        point are discarded and `current_snapshot` is reset to the last
+        accepted frame. Stochastic engines have already drawn the random
+        numbers for the discarded frames, so the random stream and all later
+        trajectories differ from frame by frame mode. This is useful for
+        fast engines where the per-frame overhead dominates.
 
     Notes
     -----
@@ -109,7 +120,8 @@ class DynamicsEngine(StorableNamedObject):
         'retries_when_error': 0,
         'retries_when_max_length': 0,
         'on_retry': 'full',
-        'on_error': 'fail'
+        'on_error': 'fail',
+        'block_size': 1
     }
 
     units = {
@@ -359,14 +371,17 @@ class DynamicsEngine(StorableNamedObject):
         if continue_conditions is not None:
             if isinstance(continue_conditions, list):
                 for condition in continue_conditions:
-                    can_continue = condition(trajectory, trusted)
-                    stop = stop or not can_continue
+                    # once one condition fails the others cannot change that
+                    if not condition(trajectory, trusted):
+                        stop = True
+                        break
             else:
                 stop = not continue_conditions(trajectory, trusted)
 
         return stop
 
-    def generate(self, snapshot, running=None, direction=+1):
+    def generate(self, snapshot, running=None, direction=+1,
+                 max_length=None):
         r"""
         Generate a trajectory consisting of ntau segments of tau_steps in
         between storage of Snapshots.
@@ -384,6 +399,12 @@ class DynamicsEngine(StorableNamedObject):
             momenta of the given snapshot and then prepending generated
             snapshots with reversed momenta. This will generate a _reversed_
             trajectory that effectively ends in the initial snapshot
+        max_length : int or None
+            a limit for the trajectory length in addition to `n_frames_max`,
+            e.g., the longest trial that can still be accepted. If it is
+            shorter than `n_frames_max` hitting it stops the trajectory
+            regardless of `on_max_length`; no error is raised and no retry
+            is attempted.
 
         Returns
         -------    
@@ -398,13 +419,24 @@ class DynamicsEngine(StorableNamedObject):
         in that case.
         """
 
+        n_frames_max = self.options['n_frames_max']
+        on_max_length = None
+        if max_length is None:
+            max_length = n_frames_max
+        elif not n_frames_max or max_length < n_frames_max:
+            # the limit of the caller is not a failure
+            on_max_length = 'stop'
+        else:
+            max_length = n_frames_max
+
         trajectory = None
         it = self.iter_generate(
             snapshot,
             running,
             direction,
             intervals=0,
-            max_length=self.options['n_frames_max'])
+            max_length=max_length,
+            on_max_length=on_max_length)
 
         for trajectory in it:
             pass
@@ -412,7 +444,7 @@ class DynamicsEngine(StorableNamedObject):
         return trajectory
 
     def iter_generate(self, initial, running=None, direction=+1,
-                      intervals=10, max_length=0):
+                      intervals=10, max_length=0, on_max_length=None):
         r"""
         Return a generator that will generate a trajectory, returning the
         current trajectory in given intervals
@@ -438,6 +470,9 @@ class DynamicsEngine(StorableNamedObject):
         max_length : int
             will limit the simulation length to a number of steps. Default is
             `0` which will run unlimited
+        on_max_length : str or None
+            the behaviour when `max_length` is hit. If `None` (default) the
+            engine's `on_max_length` option is used
 
         Yields
         ------
@@ -475,6 +510,12 @@ class DynamicsEngine(StorableNamedObject):
         final_error = None
         errors = []
 
+        block_size = max(1, self.block_size)
+        if block_size > 1:
+            block_cvs = self._running_cvs(running)
+        else:
+            block_cvs = []
+
         while not valid and final_error is None:
             if attempt_nan + attempt_error > 1:
                 # let's get a new initial trajectory the way the user wants to
@@ -514,6 +555,10 @@ class DynamicsEngine(StorableNamedObject):
             has_nan = False
             has_error = False
 
+            # frames generated ahead in block mode belong to this attempt only
+            block = []
+            block_failure = None
+
             while not stop:
                 if intervals > 0 and frame % intervals == 0:
                     # return the current status
@@ -523,38 +568,35 @@ class DynamicsEngine(StorableNamedObject):
                 elif frame % log_rate == 0:
                     logger.info("Through frame: %d", frame)
 
-                # Do integrator x steps
+                # Do integrator x steps, in block mode for several frames
 
-                snapshot = None
+                if not block and block_failure is None:
+                    block, block_failure = self._generate_block(
+                        block_size, direction, block_cvs)
 
-                try:
-                    with DelayedInterrupt():
-                        snapshot = self.generate_next_frame()
-
-                        # if self.on_nan != 'ignore' and \
-                        if not self.is_valid_snapshot(snapshot):
+                if not block:
+                    kind, info = block_failure
+                    if kind == 'nan':
+                        has_nan = True
+                    elif kind == 'interrupt':
+                        # make sure we will report the last state for
+                        logger.info(
+                            'Keyboard interrupt. Shutting down simulation')
+                        final_error = info
+                    else:
+                        # any other error we start a retry
+                        errors.append(info)
+                        se = str(info).lower()
+                        if 'nan' in se and \
+                                ('particle' in se or 'coordinates' in se):
+                            # this cannot be ignored because we cannot
+                            # continue!
                             has_nan = True
-                            break
-
-                except KeyboardInterrupt as e:
-                    # make sure we will report the last state for
-                    logger.info('Keyboard interrupt. Shutting down simulation')
-                    final_error = e
+                        else:
+                            has_error = True
                     break
 
-                except:
-                    # any other error we start a retry
-                    e = sys.exc_info()
-                    errors.append(e)
-                    se = str(e).lower()
-                    if 'nan' in se and \
-                            ('particle' in se or 'coordinates' in se):
-                        # this cannot be ignored because we cannot continue!
-                        has_nan = True
-                        break
-                    else:
-                        has_error = True
-                        break
+                snapshot = block.pop(0)
 
                 frame += 1
 
@@ -567,13 +609,13 @@ class DynamicsEngine(StorableNamedObject):
 
                 if 0 < max_length < len(trajectory):
                     # hit the max length criterion
-                    on = self.on_max_length
+                    on = on_max_length or self.on_max_length
                     del trajectory[-1]
 
                     if on == 'fail':
                         final_error = EngineMaxLengthError(
                             'Hit maximal length of %d frames.' %
-                            self.options['n_frames_max'],
+                            max_length,
                             trajectory
                         )
                         break
@@ -626,6 +668,14 @@ class DynamicsEngine(StorableNamedObject):
             elif stop:
                 valid = True
 
+            if block:
+                # discard frames generated past the accepted trajectory
+                block = []
+                if direction > 0:
+                    self.current_snapshot = trajectory[-1]
+                else:
+                    self.current_snapshot = trajectory[0].reversed
+
             self.stop(trajectory)
 
         if errors:
@@ -644,6 +694,97 @@ class DynamicsEngine(StorableNamedObject):
     def generate_next_frame(self):
         raise NotImplementedError('Next frame generation must be implemented!')
 
+    def _generate_block(self, n_frames, direction=+1, cvs=None):
+        """Generate up to `n_frames` frames ahead of the current trajectory.
+
+        In block mode the collective variables in `cvs` are evaluated on all
+        new frames with a single list call, so the stop conditions checked
+        afterwards frame by frame will find their values in the CV caches.
+
+        Parameters
+        ----------
+        n_frames : int
+            the maximal number of frames to generate
+        direction : -1 or +1 (DynamicsEngine.FORWARD or DynamicsEngine.BACKWARD)
+            the direction the frames will be added to the trajectory
+        cvs : list of :class:`openpathsampling.CollectiveVariable`
+            the CVs to evaluate on the block
+
+        Returns
+        -------
+        frames : list of :class:`openpathsampling.engines.BaseSnapshot`
+            the generated snapshots in the order they were generated
+        failure : tuple or None
+            `None` if all frames were generated. Otherwise a tuple
+            `(kind, info)` with kind one of `nan`, `interrupt` or `error` and
+            the exception (info) that stopped the block
+        """
+        frames = []
+        failure = None
+
+        while len(frames) < n_frames:
+            try:
+                with DelayedInterrupt():
+                    snapshot = self.generate_next_frame()
+
+                    # if self.on_nan != 'ignore' and \
+                    if not self.is_valid_snapshot(snapshot):
+                        failure = ('nan', None)
+                        break
+
+            except KeyboardInterrupt as e:
+                failure = ('interrupt', e)
+                break
+
+            except:
+                failure = ('error', sys.exc_info())
+                break
+
+            frames.append(snapshot)
+
+        if cvs and len(frames) > 1:
+            if direction > 0:
+                added = frames
+            else:
+                added = [snapshot.reversed for snapshot in frames]
+
+            for cv in cvs:
+                cv(added)
+
+        return frames, failure
+
+    @staticmethod
+    def _running_cvs(running):
+        """
+        Find the collective variables that running conditions depend on
+
+        Conditions that are bound methods of ensembles (e.g.
+        `ensemble.can_append`) report the collective variables of their
+        volumes through :meth:`Ensemble.collectivevariables`. Other
+        conditions are ignored.
+
+        Parameters
+        ----------
+        running : list of callable
+            the continue conditions as passed to `iter_generate`
+
+        Returns
+        -------
+        list of :class:`openpathsampling.CollectiveVariable`
+        """
+        import openpathsampling as paths
+
+        cvs = []
+        for condition in running:
+            obj = getattr(condition, 'im_self', None)
+            if isinstance(obj, paths.Ensemble):
+                cvs.extend(
+                    cv for cv in obj.collectivevariables()
+                    if not any(cv is other for other in cvs)
+                )
+
+        return cvs
+
     def generate_n_frames(self, n_frames=1):
         """Generates n_frames, from but not including the current snapshot.
         
@@ -5,6 +5,8 @@ coordinates : numpy.ndarray, shape=(atoms, 3), dtype=numpy.float32
     atomic coordinates
 """
 
+from shared import compression_options
+
 variables = ['coordinates']
 numpy = ['coordinates']
 
@@ -17,7 +19,8 @@ def netcdfplus_init(store):
         dimensions=('n_atoms', 'n_spatial'),
         description="coordinate of atom '{ix[1]}' in dimension " +
                    "'{ix[2]}' of configuration '{ix[0]}'.",
-        chunksizes=('n_atoms', 'n_spatial'))
+        chunksizes=('n_atoms', 'n_spatial'),
+        **compression_options(store.storage, 'coordinates'))
 
 
 @property
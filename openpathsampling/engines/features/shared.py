@@ -6,6 +6,31 @@ from simtk import unit as u
 from openpathsampling.netcdfplus import StorableObject, ObjectStore, WeakLRUCache
 
 
+def compression_options(storage, name):
+    """
+    Return the options to quantize and compress a coordinate-like variable
+
+    Parameters
+    ----------
+    storage : :class:`openpathsampling.netcdfplus.NetCDFPlus`
+        the storage the variable is created in
+    name : str
+        the name of the feature, like `coordinates` or `velocities`. It is
+        looked up in the `precision` dict of the storage
+
+    Returns
+    -------
+    dict
+        the keyword arguments `precision` and `zlib` for `create_variable`
+    """
+    precision = getattr(storage, 'precision', None) or {}
+
+    return {
+        'precision': precision.get(name),
+        'zlib': getattr(storage, 'zlib', False)
+    }
+
+
 # =============================================================================
 # SIMULATION CONFIGURATION
 # =============================================================================
@@ -112,6 +137,10 @@ class StaticContainerStore(ObjectStore):
         self.vars['coordinates'][idx] = configuration.coordinates
         self.vars['box_vectors'][idx] = configuration.box_vectors
 
+    def _save_many(self, configurations, idx):
+        self.write_many('coordinates', idx, configurations)
+        self.write_many('box_vectors', idx, configurations)
+
     def get(self, indices):
         return [self.load(idx) for idx in indices]
 
@@ -161,7 +190,8 @@ class StaticContainerStore(ObjectStore):
             description="coordinate of atom '{ix[1]}' in dimension " +
                         "'{ix[2]}' of configuration '{ix[0]}'.",
             chunksizes=('n_atoms', 'n_spatial'),
-            simtk_unit=u.nanometers)
+            simtk_unit=u.nanometers,
+            **compression_options(self.storage, 'coordinates'))
 
         self.create_variable(
             'box_vectors', 'numpy.float32',
@@ -239,6 +269,9 @@ class KineticContainerStore(ObjectStore):
     def _save(self, momentum, idx):
         self.vars['velocities'][idx, :, :] = momentum.velocities
 
+    def _save_many(self, momenta, idx):
+        self.write_many('velocities', idx, momenta)
+
     def _load(self, idx):
         velocities = self.vars['velocities'][idx]
 
@@ -304,4 +337,5 @@ class KineticContainerStore(ObjectStore):
             description="the velocity of atom 'atom' in dimension " +
                         "'coordinate' of momentum 'momentum'.",
             chunksizes=('n_atoms', 'n_spatial'),
-            simtk_unit=u.nanometers / u.picoseconds)
+            simtk_unit=u.nanometers / u.picoseconds,
+            **compression_options(self.storage, 'velocities'))
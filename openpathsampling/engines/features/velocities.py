@@ -5,6 +5,8 @@ velocities : numpy.ndarray, shape=(atoms, 3), dtype=numpy.float32
     atomic velocities
 """
 
+from shared import compression_options
+
 variables = ['velocities']
 minus = ['velocities']
 numpy = ['velocities']
@@ -19,4 +21,5 @@ def netcdfplus_init(store):
         dimensions=('n_atoms', 'n_spatial'),
         description="the velocity of atom 'atom' in dimension " +
                     "'coordinate' of momentum 'momentum'.",
-        chunksizes=('n_atoms', 'n_spatial'))
+        chunksizes=('n_atoms', 'n_spatial'),
+        **compression_options(store.storage, 'velocities'))
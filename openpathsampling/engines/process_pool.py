@@ -0,0 +1,596 @@
+"""
+Run trajectory generation of engines and evaluation of collective variables
+in forked worker processes.
+
+@author: David W.H. Swenson
+@author: Jan-Hendrik Prinz
+"""
+
+import contextlib
+import cPickle
+import logging
+import multiprocessing
+import Queue
+import random
+import threading
+import types
+import uuid
+import weakref
+from cStringIO import StringIO
+
+import numpy as np
+
+from openpathsampling.netcdfplus import (
+    StorableObject, StorableNamedObject, LoaderProxy)
+
+from dynamics_engine import EngineMaxLengthError, EngineNaNError, EngineError
+from trajectory import Trajectory
+
+logger = logging.getLogger(__name__)
+
+# the pool used by EngineMovers running in the current thread
+_active = threading.local()
+
+
+def active_pool():
+    """
+    Return the `EngineProcessPool` activated for the current thread
+
+    Returns
+    -------
+    :class:`EngineProcessPool` or None
+        the pool set with `EngineProcessPool.use` or `None` if generation
+        should happen in the current process
+    """
+    return getattr(_active, 'pool', None)
+
+
+def python_random():
+    """
+    Return the generator for `random` numbers of the current thread
+
+    Code that runs inside moves should draw its random numbers from here
+    (or from :func:`numpy_random`) instead of the global `random` module.
+
+    Returns
+    -------
+    :class:`random.Random` or module
+        the generator of the thread set with `EngineProcessPool.use` or the
+        `random` module if the thread has none
+    """
+    return getattr(_active, 'python_random', None) or random
+
+
+def numpy_random():
+    """
+    Return the generator for `numpy.random` numbers of the current thread
+
+    Returns
+    -------
+    :class:`numpy.random.RandomState` or module
+        the generator of the thread set with `EngineProcessPool.use` or the
+        `numpy.random` module if the thread has none
+    """
+    return getattr(_active, 'numpy_random', None) or np.random
+
+
+def _collect_named_objects(objects):
+    """
+    Find all `StorableNamedObject` instances reachable from `objects`
+
+    Named objects are engines, ensembles, volumes, CVs, movers, etc. These
+    exist in the parent and (as copies) in all forked workers and are
+    referenced by uuid when sending data between them.
+
+    Parameters
+    ----------
+    objects : list of object
+        the objects to start the search from
+
+    Returns
+    -------
+    dict of long : :class:`openpathsampling.netcdfplus.StorableNamedObject`
+        the found objects by their uuid
+    """
+    named = {}
+    found = set()
+    todo = list(objects)
+    while todo:
+        obj = todo.pop()
+        if id(obj) in found or type(obj) is LoaderProxy:
+            continue
+        found.add(id(obj))
+
+        if isinstance(obj, StorableNamedObject):
+            named[obj.__uuid__] = obj
+            todo.extend(obj.__dict__.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            todo.extend(obj)
+        elif isinstance(obj, dict):
+            todo.extend(obj.keys())
+            todo.extend(obj.values())
+
+    return named
+
+
+def _reseed():
+    """
+    Make uuids and random numbers of a forked worker independent
+    """
+    StorableObject.INSTANCE_UUID = list(uuid.uuid4().fields[:-1])
+    StorableObject.ACTIVE_LONG = int(uuid.UUID(
+        fields=tuple(
+            StorableObject.INSTANCE_UUID +
+            [StorableObject.CREATION_COUNT]
+        )
+    ))
+    random.seed()
+    np.random.seed()
+
+
+def _run_generate(pool, engine, snapshot, running, direction, max_length):
+    """
+    Generate a trajectory in a worker and return the new frames
+    """
+    try:
+        trajectory = engine.generate(
+            snapshot, running, direction, max_length)
+        return 'ok', pool._new_frames(trajectory, direction)
+    except EngineNaNError as e:
+        return 'nan', (
+            str(e), pool._new_frames(e.last_trajectory, direction))
+    except EngineMaxLengthError as e:
+        return 'max_length', (
+            str(e), pool._new_frames(e.last_trajectory, direction))
+    except Exception as e:
+        return 'error', e
+
+
+def _run_evaluate(pool, cv, snapshots):
+    """
+    Compute the values of a CV for a list of snapshots in a worker
+    """
+    try:
+        return 'ok', cv._eval_dict(snapshots) if snapshots else []
+    except Exception as e:
+        return 'error', e
+
+
+_tasks = {
+    'generate': _run_generate,
+    'evaluate': _run_evaluate
+}
+
+
+def _worker_loop(pool, conn):
+    """
+    Main function of a worker process: run tasks until told to stop
+    """
+    _reseed()
+    pool._in_worker = True
+    while True:
+        message = conn.recv_bytes()
+        if not message:
+            break
+
+        kind, args, seed = pool._loads(message)
+
+        # each task uses the random numbers chosen by the caller, the
+        # worker runs a single thread so the global state can be used
+        random.seed(seed)
+        np.random.seed(seed)
+        result = _tasks[kind](pool, *args)
+
+        try:
+            answer = pool._dumps(result)
+        except (cPickle.PicklingError, TypeError):
+            answer = pool._dumps(
+                ('error', EngineError(repr(result[1]), None)))
+
+        conn.send_bytes(answer)
+
+    conn.close()
+
+
+class EngineProcessPool(object):
+    """
+    A pool of forked worker processes that generate trajectories and compute
+    collective variables
+
+    Each worker is forked from the current process and so works with its own
+    copy of every engine, ensemble, volume and collective variable that is
+    reachable from the `objects` given at creation. Only new data
+    (snapshots and trajectories) is sent between the processes; named
+    objects are referenced by their uuid, so trajectories coming back from a
+    worker refer to the engines of the calling process. Named objects that
+    the workers do not know yet (e.g., the ensembles for the stopping
+    conditions) are sent using their `to_dict` representation.
+
+    Several threads can use the pool at the same time and will be served by
+    different workers. This is used by :class:`openpathsampling.ConcurrentMover`
+    to run independent moves at once. Inside :meth:`use` a thread holds the
+    pool's turn and gives it up only while it waits for a worker, so all
+    other code (creating samples, computing acceptance) still runs one thread
+    at a time. A thread that enters :meth:`use` with a seed gets its own
+    `random.Random` and `numpy.random.RandomState` generators, which are
+    returned by :func:`python_random` and :func:`numpy_random` in that
+    thread, and each task seeds the worker from the caller's generator. With
+    fixed seeds the results therefore do not depend on the order in which
+    threads and workers are scheduled.
+
+    The workers can also compute the values of CVs reachable from `objects`
+    (see :meth:`evaluate_many`), which is used to complete diskcaches with
+    :meth:`openpathsampling.storage.CVStore.complete`.
+
+    Notes
+    -----
+    Workers are created with `fork` and so this is only available on POSIX
+    systems. Start the pool only after all objects have been set up: changes
+    to engines or ensembles after :meth:`start` are not seen by the workers.
+    Collective variables are evaluated inside the workers for the stopping
+    conditions, so their values are not cached in the calling process.
+
+    Parameters
+    ----------
+    n_workers : int
+        the number of worker processes
+    objects : list of object
+        objects from which all named objects (engines, ensembles, ...)
+        shared with the workers can be reached; typically the movers that
+        will use the pool and their engines
+
+    Examples
+    --------
+    >>> pool = EngineProcessPool(2, [mover, engine])
+    >>> pool.start()
+    >>> with pool.use():
+    >>>     change = mover.move(sample_set)
+    >>> pool.close()
+    """
+
+    def __init__(self, n_workers, objects):
+        self.n_workers = n_workers
+        self._named = _collect_named_objects(objects)
+        # named objects exchanged after the fork
+        self._shared = weakref.WeakValueDictionary()
+        self._in_worker = False
+        self._workers = []
+        self._idle = Queue.Queue()
+        self._turn = threading.Lock()
+
+    @property
+    def is_running(self):
+        return len(self._workers) > 0
+
+    def start(self):
+        """
+        Fork the worker processes
+        """
+        if self.is_running:
+            return
+
+        for idx in range(self.n_workers):
+            conn, worker_conn = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_worker_loop,
+                args=(self, worker_conn)
+            )
+            process.daemon = True
+            process.start()
+            worker_conn.close()
+            self._workers.append((process, conn))
+            self._idle.put(conn)
+
+        logger.info('Started %d engine worker processes', self.n_workers)
+
+    def close(self):
+        """
+        Stop and join all worker processes
+        """
+        for process, conn in self._workers:
+            try:
+                conn.send_bytes('')
+            except IOError:
+                # the worker is gone already
+                pass
+            conn.close()
+
+        for process, conn in self._workers:
+            process.join()
+
+        self._workers = []
+        self._idle = Queue.Queue()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @contextlib.contextmanager
+    def use(self, seed=None):
+        """
+        Context in which EngineMovers of this thread use the pool
+
+        Parameters
+        ----------
+        seed : int or None
+            if given the thread gets its own random number generators
+            started with this seed (see :func:`python_random` and
+            :func:`numpy_random`). Otherwise it uses the global ones shared
+            with all other threads
+        """
+        previous = active_pool()
+        if previous is self:
+            yield self
+            return
+
+        previous_random = (
+            getattr(_active, 'python_random', None),
+            getattr(_active, 'numpy_random', None)
+        )
+        if seed is not None:
+            _active.python_random = random.Random(seed)
+            _active.numpy_random = np.random.RandomState(seed)
+
+        self._turn.acquire()
+        _active.pool = self
+        try:
+            yield self
+        finally:
+            _active.pool = previous
+            self._turn.release()
+            _active.python_random, _active.numpy_random = previous_random
+
+    @contextlib.contextmanager
+    def waiting(self):
+        """
+        Context in which the current thread gives up the pool's turn
+
+        Use this around code that waits for other threads using the pool.
+        Does nothing if the thread does not hold the turn.
+        """
+        holds_turn = active_pool() is self
+        if holds_turn:
+            self._turn.release()
+        try:
+            yield
+        finally:
+            if holds_turn:
+                self._turn.acquire()
+
+    def generate(self, engine, snapshot, running=None, direction=+1,
+                 max_length=None):
+        """
+        Generate a trajectory in one of the workers
+
+        Same as :meth:`DynamicsEngine.generate` but blocks only the calling
+        thread while a worker runs the engine.
+
+        Parameters
+        ----------
+        engine : :class:`openpathsampling.engines.DynamicsEngine`
+            the engine to be used, must be known to the pool
+        snapshot : :class:`openpathsampling.engines.BaseSnapshot`
+            initial coordinates and velocities in form of a Snapshot object
+        running : (list of) function(Trajectory)
+            the continue conditions; ensemble methods like
+            `ensemble.can_append` can be used
+        direction : -1 or +1 (DynamicsEngine.FORWARD or DynamicsEngine.BACKWARD)
+            as in :meth:`DynamicsEngine.generate`
+        max_length : int or None
+            as in :meth:`DynamicsEngine.generate`
+
+        Returns
+        -------
+        :class:`openpathsampling.Trajectory`
+            the generated trajectory including `snapshot`
+        """
+        result = self.generate_many(
+            [(engine, snapshot, running, direction, max_length)])
+        if isinstance(result[0], Exception):
+            raise result[0]
+
+        return result[0]
+
+    def generate_many(self, tasks):
+        """
+        Generate several trajectories at the same time
+
+        Each task is sent to its own worker as soon as one is idle, so with
+        enough workers all trajectories are generated concurrently.
+
+        Parameters
+        ----------
+        tasks : list of tuple
+            tuples `(engine, snapshot, running, direction, max_length)` with
+            the arguments of :meth:`generate`
+
+        Returns
+        -------
+        list of :class:`openpathsampling.Trajectory` or Exception
+            the generated trajectories in the order of `tasks`. A task that
+            failed returns the raised exception instead; an
+            :class:`openpathsampling.engines.EngineError` carries the partial
+            trajectory in `last_trajectory`.
+        """
+        for task in tasks:
+            engine = task[0]
+            if engine.__uuid__ not in self._named:
+                raise ValueError(
+                    'The engine `%s` is unknown to this pool.' % engine.name)
+
+        answers = self._run_many('generate', tasks)
+
+        return [
+            self._result(task[1], task[3], answer)
+            for task, answer in zip(tasks, answers)
+        ]
+
+    def evaluate_many(self, tasks):
+        """
+        Compute the values of collective variables in the workers
+
+        Each task is sent to its own worker as soon as one is idle. Only the
+        snapshots are sent to the workers, the CV itself is referenced by its
+        uuid. Values computed in the workers are not cached in the calling
+        process.
+
+        Parameters
+        ----------
+        tasks : list of tuple
+            tuples `(cv, snapshots)` of a
+            :class:`openpathsampling.CollectiveVariable` known to the pool
+            and a list of snapshots
+
+        Returns
+        -------
+        list of list
+            the values of the CV for the snapshots of each task in the order
+            of `tasks`
+        """
+        for cv, snapshots in tasks:
+            if cv.__uuid__ not in self._named:
+                raise ValueError(
+                    'The CV `%s` is unknown to this pool.' % cv.name)
+
+        results = []
+        for status, result in self._run_many('evaluate', tasks):
+            if status != 'ok':
+                raise result
+
+            results.append(result)
+
+        return results
+
+    def _run_many(self, kind, tasks):
+        """
+        Run tasks of one kind in the workers and return the answers
+        """
+        if not self.is_running:
+            self.start()
+
+        # draw the seeds of the workers from the caller's random stream
+        messages = [
+            self._dumps((kind, tuple(task), numpy_random().randint(2 ** 31)))
+            for task in tasks
+        ]
+        answers = [None] * len(tasks)
+
+        # let other threads continue while we wait for the workers
+        with self.waiting():
+            pending = []
+            for idx, message in enumerate(messages):
+                conn = None
+                while conn is None:
+                    try:
+                        conn = self._idle.get(block=not pending)
+                    except Queue.Empty:
+                        # never wait for an idle worker while holding
+                        # others, finish one of our own tasks first
+                        done_idx, done_conn = pending.pop(0)
+                        answers[done_idx] = self._receive(done_conn)
+
+                conn.send_bytes(message)
+                pending.append((idx, conn))
+
+            for idx, conn in pending:
+                answers[idx] = self._receive(conn)
+
+        return map(self._loads, answers)
+
+    def _receive(self, conn):
+        try:
+            return conn.recv_bytes()
+        finally:
+            self._idle.put(conn)
+
+    def _result(self, snapshot, direction, answer):
+        status, result = answer
+        if status == 'ok':
+            return self._join_frames(snapshot, result, direction)
+        elif status == 'nan':
+            message, frames = result
+            return EngineNaNError(
+                message, self._join_frames(snapshot, frames, direction))
+        elif status == 'max_length':
+            message, frames = result
+            return EngineMaxLengthError(
+                message, self._join_frames(snapshot, frames, direction))
+        else:
+            return result
+
+    @staticmethod
+    def _new_frames(trajectory, direction):
+        # the initial snapshot is known to the caller, so we skip it
+        if direction > 0:
+            return list(trajectory[1:])
+        else:
+            return list(trajectory[:-1])
+
+    @staticmethod
+    def _join_frames(snapshot, frames, direction):
+        if direction > 0:
+            return Trajectory([snapshot] + frames)
+        else:
+            return Trajectory(frames + [snapshot])
+
+    def _persistent_id(self, obj):
+        if type(obj) is LoaderProxy:
+            # send the loaded object, the worker cannot read the storage
+            return 'value', obj.__subject__
+
+        if isinstance(obj, StorableNamedObject):
+            uid = obj.__uuid__
+            if self._named.get(uid) is obj:
+                return 'named', uid
+
+            if self._in_worker and self._shared.get(uid) is obj:
+                # received from the calling process, which still has it
+                return 'named', uid
+
+            # the other side might not know this object yet
+            self._shared[uid] = obj
+            return 'dict', obj.__class__, uid, obj.to_dict()
+
+        if type(obj) is types.MethodType and obj.im_self is not None:
+            # bound methods like `ensemble.can_append`
+            return 'method', obj.im_self, obj.im_func.__name__
+
+        return None
+
+    def _persistent_load(self, pid):
+        kind = pid[0]
+        if kind == 'named':
+            uid = pid[1]
+            if uid in self._named:
+                return self._named[uid]
+            else:
+                return self._shared[uid]
+        elif kind == 'dict':
+            cls, uid, dct = pid[1:]
+            obj = self._named.get(uid)
+            if obj is None:
+                obj = self._shared.get(uid)
+            if obj is None:
+                obj = cls.from_dict(dct)
+                obj.__uuid__ = uid
+                self._shared[uid] = obj
+            return obj
+        elif kind == 'method':
+            return getattr(pid[1], pid[2])
+        else:
+            return pid[1]
+
+    def _dumps(self, obj):
+        output = StringIO()
+        pickler = cPickle.Pickler(output, cPickle.HIGHEST_PROTOCOL)
+        pickler.persistent_id = self._persistent_id
+        pickler.dump(obj)
+        return output.getvalue()
+
+    def _loads(self, message):
+        unpickler = cPickle.Unpickler(StringIO(message))
+        unpickler.persistent_load = self._persistent_load
+        return unpickler.load()
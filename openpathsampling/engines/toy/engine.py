@@ -1,8 +1,15 @@
+import logging
+
 import numpy as np
 
 from openpathsampling.engines import DynamicsEngine, SnapshotDescriptor
+from openpathsampling.engines.dynamics_engine import EngineMaxLengthError, \
+    EngineNaNError
+from openpathsampling.engines.trajectory import Trajectory
 from snapshot import ToySnapshot as Snapshot
 
+logger = logging.getLogger(__name__)
+
 
 class ToyEngine(DynamicsEngine):
     """Engine for toy models. Mostly used for 2D examples.
@@ -134,3 +141,155 @@ class ToyEngine(DynamicsEngine):
         for i in range(self.n_steps_per_frame):
             self.integ.step(sys=self)
         return self.current_snapshot
+
+    @staticmethod
+    def is_valid_snapshot(snapshot):
+        if np.isnan(np.min(snapshot.coordinates)):
+            return False
+
+        if np.isnan(np.min(snapshot.velocities)):
+            return False
+
+        return True
+
+    def generate_batch(self, snapshots, running=None, direction=+1):
+        """Generate one trajectory per initial snapshot, all at once.
+
+        All walkers are integrated together: positions and velocities are
+        stacked into arrays of shape `(n_walkers, n_spatial)` and the
+        integrator and PES act on the whole batch in each step. Walkers
+        for which one of the `running` conditions fails are removed from
+        the batch, so the remaining steps only integrate active walkers.
+
+        Walkers with invalid (`nan`) frames and walkers that hit
+        `n_frames_max` are treated according to `on_nan` and
+        `on_max_length`. For `retry` the walker is removed from the batch
+        and its trajectory is generated again using :meth:`generate`.
+
+        Parameters
+        ----------
+        snapshots : list of :class:`.ToySnapshot`
+            initial snapshots, one for each walker
+        running : (list of) function(:class:`.Trajectory`)
+            callable function of a 'Trajectory' that returns True or False.
+            If one of these returns False the walker is stopped.
+        direction : -1 or +1 (DynamicsEngine.FORWARD or DynamicsEngine.BACKWARD)
+            as in :meth:`.DynamicsEngine.generate`
+
+        Returns
+        -------
+        list of :class:`.Trajectory`
+            the trajectory of each walker, in the order of `snapshots`
+        """
+        if direction == 0:
+            raise RuntimeError(
+                'direction must be positive (FORWARD) or negative (BACKWARD).')
+
+        try:
+            iter(running)
+        except TypeError:
+            running = [running]
+
+        if direction > 0:
+            starts = list(snapshots)
+        else:
+            starts = [snap.reversed for snap in snapshots]
+
+        trajectories = [Trajectory([snap]) for snap in snapshots]
+        for snap in starts:
+            self.check_snapshot_type(snap)
+
+        max_length = self.options['n_frames_max'] or 0
+
+        active = [
+            idx for idx, traj in enumerate(trajectories)
+            if not self.stop_conditions(trajectory=traj,
+                                        continue_conditions=running,
+                                        trusted=False)
+        ]
+
+        # keep the single-walker state, we only borrow the engine arrays
+        old_positions = self.positions
+        old_velocities = self.velocities
+
+        self.positions = np.array(
+            [starts[idx].coordinates[0] for idx in active], dtype=float)
+        self.velocities = np.array(
+            [starts[idx].velocities[0] for idx in active], dtype=float)
+
+        # walkers that are generated again one by one
+        retry = []
+
+        frame = 0
+        try:
+            while active:
+                for i in range(self.n_steps_per_frame):
+                    self.integ.step(sys=self)
+
+                frame += 1
+                if frame % 10 == 0:
+                    logger.info("Through frame: %d, active walkers: %d",
+                                frame, len(active))
+
+                # one copy per frame; each snapshot holds a view of its row
+                frame_pos = self.positions.copy()
+                frame_vel = self.velocities.copy()
+
+                keep = []
+                for row, idx in enumerate(active):
+                    snapshot = Snapshot(
+                        coordinates=frame_pos[row:row + 1],
+                        velocities=frame_vel[row:row + 1],
+                        engine=self
+                    )
+                    traj = trajectories[idx]
+
+                    if not self.is_valid_snapshot(snapshot):
+                        if self.on_nan == 'retry':
+                            retry.append(idx)
+                            continue
+
+                        raise EngineNaNError('`nan` in snapshot', traj)
+
+                    if direction > 0:
+                        traj.append(snapshot)
+                    else:
+                        traj.insert(0, snapshot.reversed)
+
+                    if 0 < max_length < len(traj):
+                        if direction > 0:
+                            del traj[-1]
+                        else:
+                            del traj[0]
+
+                        if self.on_max_length == 'fail':
+                            raise EngineMaxLengthError(
+                                'Hit maximal length of %d frames.' %
+                                max_length,
+                                traj
+                            )
+                        elif self.on_max_length == 'retry':
+                            retry.append(idx)
+                        else:
+                            logger.info(
+                                'Trajectory hit max length. Stopping.')
+
+                    elif not self.stop_conditions(trajectory=traj,
+                                                  continue_conditions=running):
+                        keep.append(row)
+
+                if len(keep) < len(active):
+                    active = [active[row] for row in keep]
+                    self.positions = self.positions[keep]
+                    self.velocities = self.velocities[keep]
+
+            for idx in retry:
+                logger.info('Generating walker %d again.', idx)
+                trajectories[idx] = self.generate(
+                    snapshots[idx], running, direction)
+
+        finally:
+            self.positions = old_positions
+            self.velocities = old_velocities
+
+        return trajectories
@@ -18,6 +18,10 @@ class LeapfrogVerletIntegrator(ToyIntegrator):
     Not for actual use, but the momentum and position update functions are
     used in other integrators, so we inherit from this.
 
+    All updates are elementwise on `sys.positions` and `sys.velocities`,
+    so they work equally well on a single state of shape `(n_spatial,)`
+    and on a batch of walkers of shape `(n_walkers, n_spatial)`.
+
     Parameters
     ----------
     dt : float
@@ -110,7 +114,7 @@ class LangevinBAOABIntegrator(LeapfrogVerletIntegrator):
 
 
     def _OU_update(self, sys, mydt):
-        R = np.random.normal(size=len(sys.velocities))
+        R = np.random.normal(size=np.shape(sys.velocities))
         sys.velocities = (self._c1 * sys.velocities +
                           self._c3 * np.sqrt(sys._minv) * R)
 
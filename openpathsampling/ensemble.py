@@ -8,7 +8,10 @@ import abc
 import logging
 import itertools
 
+import numpy as np
+
 from openpathsampling.netcdfplus import StorableNamedObject
+from openpathsampling.volume import _unique
 import openpathsampling as paths
 
 
@@ -41,6 +44,46 @@ def join_ensembles(ensemble_list):
     return ensemble
 
 
+class VolumeMasks(object):
+    """
+    Volume masks of one trajectory, computed once per volume
+
+    Used by :meth:`Ensemble.evaluate_array` to share the masks between all
+    parts of an ensemble.
+
+    Parameters
+    ----------
+    trajectory : :class:`openpathsampling.Trajectory`
+        the trajectory for which the masks are computed
+    """
+
+    def __init__(self, trajectory):
+        self.trajectory = trajectory
+        # id(volume) -> (volume, mask); the volume is kept to keep id valid
+        self._masks = {}
+
+    def __call__(self, volume):
+        """
+        The boolean array which frames are in `volume`
+
+        Parameters
+        ----------
+        volume : :class:`openpathsampling.Volume`
+
+        Returns
+        -------
+        numpy.ndarray of bool
+        """
+        entry = self._masks.get(id(volume))
+        if entry is None:
+            entry = (volume, volume.mask(self.trajectory))
+            self._masks[id(volume)] = entry
+        return entry[1]
+
+    def __len__(self):
+        return len(self.trajectory)
+
+
 # note: the cache is not storable, because that would just be silly!
 class EnsembleCache(object):
     """Object used by ensembles to enable fast algorithms for basic functions.
@@ -52,12 +95,25 @@ class EnsembleCache(object):
 
     This object also contains basic functions to manage the cache.
 
+    In addition to the `contents`, which are only valid as long as the
+    trajectory is extended frame by frame, the cache keeps per-frame results
+    keyed on snapshot identity in `frame_results`. These survive a reset:
+    the results of the frames of the last trajectory before the reset remain
+    available through :meth:`.frame_result`, so that a new trajectory which
+    shares a prefix or suffix with the previous one (e.g. a trial after a
+    shooting move) only needs to evaluate its new frames. The frame results
+    are used by the trusted calls of :class:`AllInXEnsemble` and
+    :class:`PartInXEnsemble` (and their complements); other ensembles,
+    e.g. :class:`SequentialEnsemble`, reuse frames only through these
+    subensembles.
+
     Attributes
     ----------
         start_frame : :class:`openpathsampling.snapshot.Snapshot`
         prev_last_frame : :class:`openpathsampling.snapshot.Snapshot`
         direction : +1 or -1
         contents : dictionary
+        frame_results : dictionary
     """
 
     def __init__(self, direction=None):
@@ -66,6 +122,8 @@ class EnsembleCache(object):
         self.last_length = None
         self.direction = direction
         self.contents = {}
+        self.frame_results = {}
+        self._previous_frame_results = {}
         self.trusted = False
 
     def bad_direction_error(self):
@@ -154,6 +212,10 @@ class EnsembleCache(object):
         self.last_length = len(trajectory)
         if reset:
             logger.debug("Resetting cache " + str(self))
+            # keep the frame results of the last trajectory around: frames
+            # the new trajectory shares with it need not be evaluated again
+            self._previous_frame_results = self.frame_results
+            self.frame_results = {}
             if self.direction > 0:
                 self.start_frame = trajectory.get_as_proxy(0)
                 self.prev_last_frame = trajectory.get_as_proxy(-1)
@@ -179,6 +241,39 @@ class EnsembleCache(object):
 
         return reset
 
+    def frame_result(self, frame, function):
+        """Result of `function(frame)`, reusing results known for the frame.
+
+        Results are keyed on the snapshot, so a frame that was already
+        evaluated for the current trajectory, or for the last trajectory
+        before the cache was reset, is not evaluated again. Only results for
+        the frames of these two trajectories are kept.
+
+        Parameters
+        ----------
+        frame : :class:`openpathsampling.snapshot.Snapshot`
+            the frame (or its proxy) to evaluate
+        function : callable
+            the function to evaluate on the frame if the result is unknown;
+            must always be the same function for a given cache
+
+        Returns
+        -------
+        result of `function(frame)`
+        """
+        try:
+            return self.frame_results[frame]
+        except KeyError:
+            pass
+
+        try:
+            result = self._previous_frame_results[frame]
+        except KeyError:
+            result = function(frame)
+
+        self.frame_results[frame] = result
+        return result
+
 
 class Ensemble(StorableNamedObject):
     """
@@ -241,6 +336,38 @@ class Ensemble(StorableNamedObject):
     def check(self, trajectory):
         return self(trajectory, trusted=False)
 
+    def evaluate_array(self, trajectory, masks=None):
+        """
+        Return `True` if the trajectory is part of the path ensemble.
+
+        Same result as `self(trajectory)`, but each volume is evaluated once
+        for all frames using :meth:`openpathsampling.Volume.mask`, which for
+        CV based volumes works on the array of all CV values of the
+        trajectory. The ensemble is then tested using array operations.
+        Ensembles (and volumes) that cannot be treated this way fall back
+        to the frame-by-frame test. This is meant for analysis of many
+        stored trajectories.
+
+        Parameters
+        ----------
+        trajectory : :class:`.Trajectory`
+            The trajectory to be checked
+        masks : :class:`VolumeMasks` or None
+            the masks already computed for `trajectory`. Use this to share
+            masks between several ensembles tested on the same trajectory
+
+        Returns
+        -------
+        bool
+        """
+        if masks is None:
+            masks = VolumeMasks(trajectory)
+        return self._evaluate_masks(trajectory, masks)
+
+    def _evaluate_masks(self, trajectory, masks):
+        # cannot be vectorized, use the frame-by-frame test
+        return self(trajectory, trusted=False)
+
     def trajectory_summary(self, trajectory):
         """
         Return dict with info on how this ensemble "sees" the trajectory.
@@ -1075,6 +1202,19 @@ class Ensemble(StorableNamedObject):
         """
         return 'Ensemble'
 
+    def collectivevariables(self):
+        """
+        Return the collective variables this ensemble depends on
+
+        These are collected from the volumes of the ensemble and its
+        subensembles.
+
+        Returns
+        -------
+        list of :class:`openpathsampling.CollectiveVariable`
+        """
+        return []
+
     def __or__(self, other):
         if self is other:
             return self
@@ -1226,6 +1366,9 @@ class NegatedEnsemble(Ensemble):
     def __call__(self, trajectory, trusted=None, candidate=False):
         return not self.ensemble(trajectory, trusted, candidate)
 
+    def _evaluate_masks(self, trajectory, masks):
+        return not self.ensemble._evaluate_masks(trajectory, masks)
+
     def can_append(self, trajectory, trusted=False):
         # We cannot guess the result here so keep on running forever
         return True
@@ -1234,6 +1377,9 @@ class NegatedEnsemble(Ensemble):
         # We cannot guess the result here so keep on running forever
         return True
 
+    def collectivevariables(self):
+        return self.ensemble.collectivevariables()
+
     def _str(self):
         return 'not ' + str(self.ensemble)
 
@@ -1253,6 +1399,11 @@ class EnsembleCombination(Ensemble):
     def to_dict(self):
         return {'ensemble1': self.ensemble1, 'ensemble2': self.ensemble2}
 
+    def collectivevariables(self):
+        return _unique(
+            self.ensemble1.collectivevariables() +
+            self.ensemble2.collectivevariables())
+
     def _generalized_short_circuit(self, combo, f1, f2, trajectory, trusted,
                                    fname=""):
         """
@@ -1311,6 +1462,15 @@ class EnsembleCombination(Ensemble):
             fname="__call__"
         )
 
+    def _evaluate_masks(self, trajectory, masks):
+        a = self.ensemble1._evaluate_masks(trajectory, masks)
+        res_true = self.fnc(a, True)
+        if self.fnc(a, False) == res_true:
+            return res_true
+        else:
+            return self.fnc(
+                a, self.ensemble2._evaluate_masks(trajectory, masks))
+
     def can_append(self, trajectory, trusted=False):
         return self._generalized_short_circuit(
             combo=self.fnc,
@@ -1401,6 +1561,355 @@ class IntersectionEnsemble(EnsembleCombination):
 #             str_fnc='{0}\nand not\n{1}')
 
 
+class _SequenceAutomaton(object):
+    """
+    A SequentialEnsemble compiled into a matcher over per-frame volume labels
+
+    Works for sequences built from the frame-by-frame ensembles
+    (All/Part-In/Out-X, LengthEnsemble, Full/EmptyEnsemble), their unions and
+    intersections, and Optional- and SingleFrameEnsembles of those. Each
+    frame is labeled once by the volumes it is in (as a bitmask) and a
+    subtrajectory assigned to one of the subensembles is summarized by its
+    length and the volumes that contain all or any of its frames. The
+    greedy assignment of frames used by :class:`SequentialEnsemble` then
+    only needs a constant amount of work per added frame, instead of
+    rechecking sliced subtrajectories.
+
+    Notes
+    -----
+    The automaton follows a single start frame at a time. Growing a
+    subtrajectory is linear in its length, but a search that has to move
+    its start frame restarts the automaton there (see
+    :meth:`iter_valid_slices`).
+
+    Parameters
+    ----------
+    pieces : list of tuple(function, function)
+        for each subensemble the `__call__` and `can_append` test as
+        functions of `(length, all_in, any_in)` of a subtrajectory
+    volumes : list of :class:`openpathsampling.Volume`
+        the volumes, `volumes[i]` is represented by bit `1 << i`
+    """
+
+    def __init__(self, pieces, volumes):
+        self.pieces = pieces
+        self.volumes = volumes
+        self.full_mask = (1 << len(volumes)) - 1
+        self.final_piece = len(pieces) - 1
+        # which pieces allow zero frames
+        self.allows_empty = [call(0, self.full_mask, 0)
+                             for call, can_append in pieces]
+
+    @classmethod
+    def compile(cls, ensemble):
+        """
+        Compile a SequentialEnsemble
+
+        Parameters
+        ----------
+        ensemble : :class:`SequentialEnsemble`
+            the ensemble to be compiled
+
+        Returns
+        -------
+        :class:`_SequenceAutomaton` or None
+            the compiled matcher or None if one of the subensembles is not
+            supported
+        """
+        volumes = []
+        pieces = []
+        for ens in ensemble.ensembles:
+            piece = cls._compile_piece(ens, volumes)
+            if piece is None:
+                return None
+            pieces.append(piece)
+
+        return cls(pieces, volumes)
+
+    @classmethod
+    def _compile_piece(cls, ens, volumes):
+        # exact type checks: subclasses might change the meaning
+        ens_type = type(ens)
+
+        if ens_type in [AllInXEnsemble, AllOutXEnsemble,
+                        PartInXEnsemble, PartOutXEnsemble]:
+            for idx, vol in enumerate(volumes):
+                if vol is ens.volume:
+                    bit = 1 << idx
+                    break
+            else:
+                bit = 1 << len(volumes)
+                volumes.append(ens.volume)
+
+            if ens_type is AllInXEnsemble:
+                return (
+                    lambda n, all_in, any_in: n > 0 and bool(all_in & bit),
+                    lambda n, all_in, any_in: n == 0 or bool(all_in & bit)
+                )
+            elif ens_type is AllOutXEnsemble:
+                return (
+                    lambda n, all_in, any_in: n > 0 and not any_in & bit,
+                    lambda n, all_in, any_in: n == 0 or not any_in & bit
+                )
+            elif ens_type is PartInXEnsemble:
+                return (
+                    lambda n, all_in, any_in: bool(any_in & bit),
+                    lambda n, all_in, any_in: True
+                )
+            else:
+                return (
+                    lambda n, all_in, any_in: not all_in & bit,
+                    lambda n, all_in, any_in: True
+                )
+
+        elif ens_type is LengthEnsemble:
+            length = ens.length
+            if type(length) is int:
+                return (
+                    lambda n, all_in, any_in: n == length,
+                    lambda n, all_in, any_in: n < length
+                )
+            else:
+                start = length.start
+                if start is None:
+                    start = 0
+                stop = length.stop
+                if stop is None:
+                    return (
+                        lambda n, all_in, any_in: n >= start,
+                        lambda n, all_in, any_in: True
+                    )
+                else:
+                    return (
+                        lambda n, all_in, any_in: start <= n < stop,
+                        lambda n, all_in, any_in: n < stop - 1
+                    )
+
+        elif ens_type is FullEnsemble:
+            return (
+                lambda n, all_in, any_in: True,
+                lambda n, all_in, any_in: True
+            )
+
+        elif ens_type is EmptyEnsemble:
+            return (
+                lambda n, all_in, any_in: False,
+                lambda n, all_in, any_in: False
+            )
+
+        elif ens_type in [UnionEnsemble, IntersectionEnsemble]:
+            piece1 = cls._compile_piece(ens.ensemble1, volumes)
+            piece2 = cls._compile_piece(ens.ensemble2, volumes)
+            if piece1 is None or piece2 is None:
+                return None
+            call1, can_append1 = piece1
+            call2, can_append2 = piece2
+            if ens_type is UnionEnsemble:
+                return (
+                    lambda n, all_in, any_in: (
+                        call1(n, all_in, any_in) or
+                        call2(n, all_in, any_in)),
+                    lambda n, all_in, any_in: (
+                        can_append1(n, all_in, any_in) or
+                        can_append2(n, all_in, any_in))
+                )
+            else:
+                return (
+                    lambda n, all_in, any_in: (
+                        call1(n, all_in, any_in) and
+                        call2(n, all_in, any_in)),
+                    lambda n, all_in, any_in: (
+                        can_append1(n, all_in, any_in) and
+                        can_append2(n, all_in, any_in))
+                )
+
+        elif ens_type in [OptionalEnsemble, SingleFrameEnsemble,
+                          AppendedNameEnsemble]:
+            return cls._compile_piece(ens._new_ensemble, volumes)
+
+        else:
+            return None
+
+    def labels(self, trajectory):
+        """
+        Lazily computed volume bitmasks of the frames of a trajectory
+
+        Returns
+        -------
+        function(int) -> int
+            returns the bitmask of volumes containing the frame at the index
+        """
+        volumes = self.volumes
+        cache = [None] * len(trajectory)
+
+        def label(idx):
+            value = cache[idx]
+            if value is None:
+                frame = trajectory.get_as_proxy(idx)
+                value = 0
+                for bit_idx, vol in enumerate(volumes):
+                    if vol(frame):
+                        value |= 1 << bit_idx
+                cache[idx] = value
+            return value
+
+        return label
+
+    def mask_labels(self, masks):
+        """
+        Volume bitmasks of all frames from precomputed volume masks
+
+        Parameters
+        ----------
+        masks : :class:`VolumeMasks`
+            the masks of the trajectory
+
+        Returns
+        -------
+        function(int) -> int
+            returns the bitmask of volumes containing the frame at the index
+        """
+        labels = np.zeros(len(masks), dtype=int)
+        for bit_idx, vol in enumerate(self.volumes):
+            labels[masks(vol)] |= 1 << bit_idx
+        return labels.tolist().__getitem__
+
+    def start(self):
+        """
+        The state of the greedy assignment for an empty trajectory
+
+        The state is a list `[ens_num, length, all_in, any_in, valid, dead]`
+        with the number of the subensemble the last frames are assigned to,
+        the summary of these frames, whether all earlier subtrajectories
+        are in their ensembles and whether the assignment failed already.
+        """
+        return [0, 0, self.full_mask, 0, True, False]
+
+    def advance(self, state, label):
+        """
+        Add a frame with the given label to the end of the trajectory
+
+        This follows `SequentialEnsemble._find_subtraj_final`: a frame stays
+        with the current subensemble while it can append to or contains the
+        subtrajectory. Otherwise the next subensemble is tried, skipping
+        those that allow zero frames.
+        """
+        if state[5]:
+            return
+
+        ens_num, n, all_in, any_in, valid = state[:5]
+        while ens_num <= self.final_piece:
+            call, can_append = self.pieces[ens_num]
+            new_n = n + 1
+            new_all_in = all_in & label
+            new_any_in = any_in | label
+            if can_append(new_n, new_all_in, new_any_in) or \
+                    call(new_n, new_all_in, new_any_in):
+                state[:5] = [ens_num, new_n, new_all_in, new_any_in, valid]
+                return
+            elif n > 0:
+                if ens_num == self.final_piece:
+                    # frames left after the last ensemble
+                    break
+                valid = valid and call(n, all_in, any_in)
+            elif not self.allows_empty[ens_num]:
+                break
+
+            ens_num += 1
+            n, all_in, any_in = 0, self.full_mask, 0
+
+        state[5] = True
+
+    def strict_can_append(self, state):
+        """
+        Result of `SequentialEnsemble.strict_can_append` for the state
+        """
+        if state[5]:
+            return False
+        ens_num, n, all_in, any_in = state[:4]
+        if n > 0 and ens_num == self.final_piece:
+            return self.pieces[ens_num][1](n, all_in, any_in)
+        return True
+
+    def accepts(self, state):
+        """
+        Result of `SequentialEnsemble.__call__` for the state
+        """
+        if state[5] or not state[4]:
+            return False
+        ens_num, n, all_in, any_in = state[:4]
+        if n > 0:
+            if not self.pieces[ens_num][0](n, all_in, any_in):
+                return False
+            ens_num += 1
+        return all(self.allows_empty[ens_num:])
+
+    def run(self, label, start, end):
+        """
+        The state after assigning the frames `start` to `end` (exclusive)
+        """
+        state = self.start()
+        for idx in range(start, end):
+            self.advance(state, label(idx))
+            if state[5]:
+                break
+        return state
+
+    def iter_valid_slices(self, trajectory, max_length, min_length, overlap):
+        """
+        Same as the forward search in :meth:`Ensemble.iter_valid_slices`
+
+        Notes
+        -----
+        Each frame is labeled once and extending the current subtrajectory
+        by a frame is O(1). A start frame that does not lead to a match is
+        dropped by moving the start one frame ahead and running the
+        automaton again from there, which costs the length of the new
+        subtrajectory. The search is therefore O(N) if the trajectory
+        splits into matching subtrajectories, but O(N * L) in the worst
+        case, where L is the typical length a candidate grows to before it
+        fails (at most `max_length`). The volumes are evaluated only once
+        per frame in either case.
+        """
+        length = len(trajectory)
+        label = self.labels(trajectory)
+
+        start = 0
+        end = start + min_length
+        state = None
+        state_start = state_end = None
+
+        while start <= length - min_length and end <= length:
+            if state is not None and state_start == start and \
+                    state_end == end - 1:
+                self.advance(state, label(end - 1))
+            else:
+                state = self.run(label, start, end)
+                state_start = start
+            state_end = end
+
+            if end < length and self.strict_can_append(state):
+                end += 1
+                if end - start > max_length + 1:
+                    start += 1
+                    end = start + min_length
+            else:
+                if end - start <= max_length and self.accepts(state):
+                    yield slice(start, end)
+                    pad = min(overlap, end - start - 1)
+                    start = end - pad
+                    if end == length:
+                        start = length
+                elif end - start >= min_length + 1 and \
+                        self.accepts(self.run(label, start, end - 1)):
+                    yield slice(start, end - 1)
+                    pad = min(overlap + 1, end - start - 2)
+                    start = end - pad
+                else:
+                    start += 1
+                end = start + min_length
+
+
 class SequentialEnsemble(Ensemble):
     """Ensemble which satisfies several subensembles in sequence.
 
@@ -1454,6 +1963,10 @@ class SequentialEnsemble(Ensemble):
         self._cache_strict_can_prepend = EnsembleCache(-1)
         self._cache_check_reverse = EnsembleCache(-1)
 
+        # automaton for the search of subtrajectories, can be turned off
+        self._use_automaton = True
+        self._automaton = None
+
         # sanity checks
         if len(self.min_overlap) != len(self.max_overlap):
             raise ValueError("len(min_overlap) != len(max_overlap)")
@@ -1577,6 +2090,13 @@ class SequentialEnsemble(Ensemble):
             subtraj_first = subtraj_final
         return True
 
+    def _evaluate_masks(self, trajectory, masks):
+        automaton = self.automaton
+        if automaton is None:
+            return self(trajectory, trusted=False)
+        labels = automaton.mask_labels(masks)
+        return automaton.accepts(automaton.run(labels, 0, len(masks)))
+
     def _find_subtraj_final(self, traj, subtraj_first, ens_num,
                             last_checked=None):
         """
@@ -1808,6 +2328,57 @@ class SequentialEnsemble(Ensemble):
                         )
                         return False
 
+    @property
+    def automaton(self):
+        """
+        The sequence compiled for fast subtrajectory searches or None
+
+        None is returned if the automaton is turned off or one of the
+        subensembles cannot be compiled. See `_SequenceAutomaton`.
+        """
+        if not self._use_automaton:
+            return None
+        if self._automaton is None:
+            self._automaton = _SequenceAutomaton.compile(self)
+            if self._automaton is None:
+                # do not try again
+                self._use_automaton = False
+        return self._automaton
+
+    def iter_valid_slices(
+            self,
+            trajectory,
+            max_length=None,
+            min_length=1,
+            overlap=1,
+            reverse=False
+    ):
+        """
+        Return an iterator over slices of subtrajectories matching the ensemble
+
+        Same as :meth:`Ensemble.iter_valid_slices`. Forward searches use the
+        compiled :attr:`automaton` if there is one, which gives the same
+        slices, but labels each frame only once and tests a growing
+        subtrajectory in constant time per frame. Failed start frames still
+        restart the search, so the worst case remains quadratic in the
+        trajectory length (see :meth:`_SequenceAutomaton.iter_valid_slices`).
+        """
+        automaton = self.automaton
+        if reverse or automaton is None:
+            return super(SequentialEnsemble, self).iter_valid_slices(
+                trajectory, max_length, min_length, overlap, reverse)
+
+        length = len(trajectory)
+        if max_length is None:
+            max_length = length
+
+        return automaton.iter_valid_slices(
+            trajectory,
+            max_length=min(length, max_length),
+            min_length=max(1, min_length),
+            overlap=overlap
+        )
+
     def can_append(self, trajectory, trusted=False):
         return self._generic_can_append(trajectory, trusted, strict=False)
 
@@ -1975,6 +2546,10 @@ class SequentialEnsemble(Ensemble):
     def strict_can_prepend(self, trajectory, trusted=False):
         return self._generic_can_prepend(trajectory, trusted, strict=True)
 
+    def collectivevariables(self):
+        return _unique(sum(
+            [ens.collectivevariables() for ens in self.ensembles], []))
+
     def _str(self):
         head = "[\n"
         tail = "\n]"
@@ -2066,6 +2641,9 @@ class VolumeEnsemble(Ensemble):
         """
         return self.volume
 
+    def collectivevariables(self):
+        return self._volume.collectivevariables()
+
 
 class AllInXEnsemble(VolumeEnsemble):
     """
@@ -2098,30 +2676,30 @@ class AllInXEnsemble(VolumeEnsemble):
             if len(trajectory) < 2:
                 cache.contents['previous'] = None
             else:
-                # NOTE: is it possible that we'd reset a cache more than
-                # once in a single trajectory? that could mean that this
-                # starts to scale quadratically. I can't think of a case
-                # where this is a practical concern (short-circuit logic
-                # means the recache should only happen once per trajectory
-                # for All*XEnsembles, and the call should only happen once
-                # per trajectory for Part*XEnsembles.) In any case, the fix
-                # would be to implement a more complicated cache.reset,
-                # which checks whether the previous traj was a subtraj of
-                # this one (other than one frame less). ~~~DWHS
+                # frames shared with the trajectory before the reset (e.g.
+                # the old path after a shooting move) are taken from the
+                # cache's frame results, so that only new frames are
+                # evaluated and repeated resets do not scale quadratically
                 if frame_num == -1:
-                    reset_value = self(trajectory[:-1], trusted=False)
+                    frames = trajectory.as_proxies()[:-1]
                 elif frame_num == 0:
-                    reset_value = self(trajectory[1:], trusted=False)
+                    frames = reversed(trajectory.as_proxies()[1:])
                 else:  # pragma: no cover
                     raise RuntimeError("Bad value for frame_num: " +
                                        str(frame_num))
+                reset_value = True
+                for frame in frames:
+                    if not cache.frame_result(frame, self._volume):
+                        reset_value = False
+                        break
                 cache.contents['previous'] = reset_value
 
         cached_val = cache.contents['previous']
         if cached_val or cached_val is None:
             # need to check this frame (no prev traj, or prev traj is True)
             frame = trajectory.get_as_proxy(frame_num)
-            cache.contents['previous'] = self._volume(frame)
+            cache.contents['previous'] = cache.frame_result(frame,
+                                                            self._volume)
             return cache.contents['previous']
         else:
             # cached_val is false, result must be false
@@ -2161,6 +2739,9 @@ class AllInXEnsemble(VolumeEnsemble):
                     return False
             return True
 
+    def _evaluate_masks(self, trajectory, masks):
+        return len(masks) > 0 and bool(np.all(masks(self.volume)))
+
     def check_reverse(self, trajectory, trusted=False):
         # order in this one only matters if it is trusted
         if trusted and self._use_cache:
@@ -2188,6 +2769,9 @@ class AllOutXEnsemble(AllInXEnsemble):
     def _volume(self):
         return ~self.volume
 
+    def _evaluate_masks(self, trajectory, masks):
+        return len(masks) > 0 and not np.any(masks(self.volume))
+
     def _str(self):
         return 'x[t] in {0} for all t'.format(self._volume)
 
@@ -2203,6 +2787,50 @@ class PartInXEnsemble(VolumeEnsemble):
     def _str(self):
         return 'exists t such that x[t] in {0}'.format(self._volume)
 
+    def _trusted_call(self, trajectory, cache):
+        """
+        Generalized version of the call when trusted.
+
+        Same as :meth:`AllInXEnsemble._trusted_call`, but
+        `cache.contents['previous']` tells whether any frame of the previous
+        trajectory is in the volume.
+
+        Paramters
+        ---------
+        trajectory : paths.Trajectory
+            input trajectory to test
+        cache : paths.EnsembleCache
+            ensemble cache for this function
+
+        Returns
+        -------
+        bool :
+            result of __call__
+        """
+        frame_num = -(cache.direction + 1) / 2  # 1 -> -1; -1 -> 0
+        reset = cache.check(trajectory)
+        if reset:
+            # frames shared with the trajectory before the reset are taken
+            # from the cache's frame results
+            if frame_num == -1:
+                frames = trajectory.as_proxies()[:-1]
+            elif frame_num == 0:
+                frames = reversed(trajectory.as_proxies()[1:])
+            else:  # pragma: no cover
+                raise RuntimeError("Bad value for frame_num: " +
+                                   str(frame_num))
+            cache.contents['previous'] = any(
+                cache.frame_result(frame, self._volume) for frame in frames
+            )
+
+        if not cache.contents['previous']:
+            # only the new frame can change the result
+            frame = trajectory.get_as_proxy(frame_num)
+            cache.contents['previous'] = cache.frame_result(frame,
+                                                            self._volume)
+
+        return cache.contents['previous']
+
     def __call__(self, trajectory, trusted=None, candidate=False):
         """
         Returns True if the trajectory is part of the PathEnsemble
@@ -2211,12 +2839,23 @@ class PartInXEnsemble(VolumeEnsemble):
         ----------
         trajectory : :class:`openpathsampling.trajectory.Trajectory`
             The trajectory to be checked
+        trusted : bool
+            if `True` the trajectory is assumed to be the previous one
+            extended by a frame, so that only the new frame is tested
         """
+        if len(trajectory) == 0:
+            return False
+        if trusted and self._use_cache:
+            return self._trusted_call(trajectory, self._cache_call)
+
         for frame in trajectory.as_proxies():
             if self._volume(frame):
                 return True
         return False
 
+    def _evaluate_masks(self, trajectory, masks):
+        return bool(np.any(masks(self.volume)))
+
     def __invert__(self):
         return AllOutXEnsemble(self.volume, self.trusted)
 
@@ -2243,6 +2882,9 @@ class PartOutXEnsemble(PartInXEnsemble):
                 return True
         return False
 
+    def _evaluate_masks(self, trajectory, masks):
+        return not np.all(masks(self.volume))
+
 
 class ExitsXEnsemble(VolumeEnsemble):
     """
@@ -2320,9 +2962,18 @@ class WrappedEnsemble(Ensemble):
     def __call__(self, trajectory, trusted=None, candidate=False):
         return self._new_ensemble(self._alter(trajectory), trusted)
 
+    def _evaluate_masks(self, trajectory, masks):
+        if type(self)._alter is not WrappedEnsemble._alter:
+            # the masks are for the unaltered trajectory
+            return self(trajectory, trusted=False)
+        return self._new_ensemble._evaluate_masks(trajectory, masks)
+
     def _alter(self, trajectory):
         return trajectory
 
+    def collectivevariables(self):
+        return self._new_ensemble.collectivevariables()
+
     def can_append(self, trajectory, trusted=None):
         return self._new_ensemble.can_append(self._alter(trajectory),
                                              trusted)
@@ -2,6 +2,48 @@ import openpathsampling as paths
 import openpathsampling.netcdfplus as netcdfplus
 import copy
 
+
+class InterfaceIndexCache(netcdfplus.Cache):
+    """Volume result cache that answers from the index of an InterfaceSet.
+
+    Installed as the result cache of the interface volumes by
+    :meth:`.InterfaceSet.enable_index`. A snapshot is in the interface
+    volume at `index` if and only if the innermost interface it is in has
+    an index smaller than or equal to `index`, so all volumes of the set
+    are answered from a single :meth:`.InterfaceSet.interface_index` per
+    snapshot. All calls answered this way count as cache hits of the
+    volume.
+
+    Parameters
+    ----------
+    interface_set : :class:`.InterfaceSet`
+        the interface set the volume belongs to
+    index : int
+        the index of the volume in the interface set
+    cache : :class:`openpathsampling.netcdfplus.Cache` or None
+        a result cache the volume already had. It is asked first and filled
+        with the computed results
+    """
+    def __init__(self, interface_set, index, cache=None):
+        super(InterfaceIndexCache, self).__init__()
+        self.interface_set = interface_set
+        self.index = index
+        self.cache = cache
+
+    def __getitem__(self, item):
+        if self.cache is not None:
+            try:
+                return self.cache[item]
+            except KeyError:
+                pass
+
+        result = self.interface_set.interface_index(item) <= self.index
+        if self.cache is not None:
+            self.cache[item] = result
+
+        return result
+
+
 class InterfaceSet(netcdfplus.StorableNamedObject):
     """List of volumes representing a set of interfaces, plus metadata.
 
@@ -40,6 +82,8 @@ class InterfaceSet(netcdfplus.StorableNamedObject):
             self.direction = 0
 
         self._set_lambda_dict()
+        self._index_cache = netcdfplus.WeakKeyCache()
+        self._index_volumes = None
 
     def _set_lambda_dict(self):
         vlambdas = self.lambdas
@@ -63,6 +107,110 @@ class InterfaceSet(netcdfplus.StorableNamedObject):
         """
         return self._lambda_dict[volume]
 
+    def interface_index(self, snapshot):
+        """Index of the innermost interface volume containing the snapshot
+
+        The result is computed once per snapshot and cached. For nested
+        interfaces the snapshot is in all interface volumes from this index
+        on.
+
+        Parameters
+        ----------
+        snapshot : :class:`.BaseSnapshot`
+            the snapshot to locate
+
+        Returns
+        -------
+        int
+            index of the innermost interface volume containing the snapshot,
+            or `len(self)` if it is in none of them
+        """
+        try:
+            return self._index_cache[snapshot]
+        except KeyError:
+            pass
+
+        if self._index_volumes is None:
+            index = len(self.volumes)
+            for (i, volume) in enumerate(self.volumes):
+                if volume(snapshot):
+                    index = i
+                    break
+        else:
+            index = self._bisect_index(snapshot)
+
+        self._index_cache[snapshot] = index
+        return index
+
+    def enable_index(self):
+        """Let the interface volumes answer from :meth:`.interface_index`.
+
+        Each interface volume gets an :class:`InterfaceIndexCache` as its
+        result cache. A result cache the volume already has (see
+        :meth:`.Volume.enable_cache`) is kept behind it. Use
+        :meth:`disable_index` (or :meth:`.Volume.disable_cache` of a single
+        volume) to remove it again.
+
+        Returns
+        -------
+        :class:`.InterfaceSet`
+            the interface set itself
+
+        Raises
+        ------
+        ValueError
+            if the interfaces are not known to be nested
+        """
+        if self._index_volumes is None:
+            raise ValueError('The interfaces of ' + repr(self) +
+                             ' are not known to be nested.')
+
+        for (i, volume) in enumerate(self.volumes):
+            cache = volume._result_cache
+            if isinstance(cache, InterfaceIndexCache):
+                cache = cache.cache
+            volume._result_cache = InterfaceIndexCache(self, i, cache)
+
+        return self
+
+    def disable_index(self):
+        """Stop answering the interface volumes from the index
+
+        A result cache the volumes had before :meth:`enable_index` is put
+        back in place.
+
+        Returns
+        -------
+        :class:`.InterfaceSet`
+            the interface set itself
+        """
+        for volume in self.volumes:
+            cache = volume._result_cache
+            if isinstance(cache, InterfaceIndexCache):
+                volume._result_cache = cache.cache
+
+        return self
+
+    @property
+    def index_enabled(self):
+        """bool : `True` if the volumes answer from the interface index"""
+        return all(isinstance(volume._result_cache, InterfaceIndexCache)
+                   for volume in self.volumes)
+
+    def _bisect_index(self, snapshot):
+        """Bisection over the nested volumes in `_index_volumes`"""
+        volumes = self._index_volumes
+        lower = 0
+        upper = len(volumes)
+        while lower < upper:
+            middle = (lower + upper) // 2
+            if volumes[middle](snapshot):
+                upper = middle
+            else:
+                lower = middle + 1
+
+        return lower
+
     def _slice_dict(self, slicer):
         dct = self.to_dict()
         dct['volumes'] = self.volumes[slicer]
@@ -146,6 +294,52 @@ class GenericVolumeInterfaceSet(InterfaceSet):
             self.volume_func = lambda maxv: volume_func(self.minvals, maxv)
         elif self.direction < 0:
             self.volume_func = lambda minv: volume_func(minv, self.maxvals)
+        self._set_interface_index(volume_func)
+
+    def _nesting_key(self, lmbda, fixed):
+        """Distance of the interface at `lmbda` from the fixed boundary
+
+        Interfaces are nested if this increases along the interface set.
+        """
+        return self.direction * (lmbda - fixed)
+
+    def _set_interface_index(self, volume_func):
+        """Find :meth:`.interface_index` by bisection for nested interfaces.
+
+        If the interfaces are nested the index is found by bisection over
+        the sorted lambdas and :meth:`.enable_index` can be used.
+        """
+        self._index_cache = netcdfplus.WeakKeyCache()
+        self._index_volumes = None
+        if self.direction == 0 or self.lambdas is None:
+            return
+
+        if not isinstance(self.intersect_with, paths.FullVolume):
+            # the interface volumes are `intersect_with & volume`; if the
+            # range logic returned `intersect_with` itself, it would ask
+            # this interface set for its own result
+            if any(vol is self.intersect_with for vol in self.volumes):
+                return
+
+        minvs, maxvs, _ = self._sanitize_input(self.minvals, self.maxvals)
+        fixed = {1: minvs, -1: maxvs}[self.direction][0]
+        keys = [self._nesting_key(lmbda, fixed) for lmbda in self.lambdas]
+        if keys != sorted(keys):
+            return
+
+        self._index_volumes = [volume_func(minv, maxv)
+                               for (minv, maxv) in zip(minvs, maxvs)]
+
+    def _bisect_index(self, snapshot):
+        if isinstance(self.intersect_with, paths.FullVolume):
+            return super(GenericVolumeInterfaceSet, self)._bisect_index(
+                snapshot)
+
+        # bisect over the plain interfaces; outside of `intersect_with`
+        # the snapshot is in none of the interface volumes
+        if not self.intersect_with(snapshot):
+            return len(self.volumes)
+        return super(GenericVolumeInterfaceSet, self)._bisect_index(snapshot)
 
     def to_dict(self):
         return {'cv': self.cv,
@@ -315,6 +509,14 @@ class PeriodicVolumeInterfaceSet(GenericVolumeInterfaceSet):
                                                          intersect_with,
                                                          volume_func)
 
+    def _nesting_key(self, lmbda, fixed):
+        if self.period_min is None or self.period_max is None:
+            return super(PeriodicVolumeInterfaceSet, self)._nesting_key(
+                lmbda, fixed)
+        # distance along the periodic domain
+        return (self.direction * (lmbda - fixed)) % (self.period_max -
+                                                     self.period_min)
+
     def to_dict(self):
         dct = super(PeriodicVolumeInterfaceSet, self).to_dict()
         dct['period_min'] = self.period_min
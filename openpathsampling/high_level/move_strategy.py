@@ -338,10 +338,15 @@ class TwoWayShootingStrategy(SingleEnsembleMoveStrategy):
     replace : bool
         whether to replace existing movers, default True. See
         :class:`.MoveStrategy` documentation for details.
+    concurrent : bool
+        if True, the forward and backward halves of each shot are generated
+        at the same time in two worker processes of the pool started by
+        :meth:`.PathSampling.run` (see
+        :class:`.ConcurrentTwoWayShootingMover`); default False
     """
     _level = levels.MOVER
     def __init__(self, modifier, selector=None, ensembles=None, engine=None,
-                 group="shooting", replace=True):
+                 group="shooting", replace=True, concurrent=False):
         super(TwoWayShootingStrategy, self).__init__(
             ensembles=ensembles, group=group, replace=replace
         )
@@ -350,13 +355,18 @@ class TwoWayShootingStrategy(SingleEnsembleMoveStrategy):
             selector = paths.UniformSelector()
         self.selector = selector
         self.engine = engine
+        self.concurrent = concurrent
 
     def make_movers(self, scheme):
         # ensemble_list = self.get_ensembles(scheme, self.ensembles)
         ensemble_list = self.get_init_ensembles(scheme)
         ensembles = reduce(list.__add__, map(lambda x: list(x), ensemble_list))
+        if self.concurrent:
+            mover_class = paths.ConcurrentTwoWayShootingMover
+        else:
+            mover_class = paths.TwoWayShootingMover
         shooters = [
-            paths.TwoWayShootingMover(
+            mover_class(
                 ensemble=ens,
                 selector=self.selector,
                 modifier=self.modifier,
@@ -566,6 +576,64 @@ class EnsembleHopStrategy(ReplicaExchangeStrategy):
         return hops
 
 
+class ConcurrentStrategy(MoveStrategy):
+    """
+    Converts the movers of a group into concurrent moves.
+
+    The movers of the group are collected into :class:`.ConcurrentMover`
+    instances such that the movers in each of them act on different
+    ensembles. Usually all shooting movers of a scheme are independent, so
+    each move of the group then shoots in all ensembles at the same time.
+
+    Parameters
+    ----------
+    group : string
+        the name of the mover group, default is "shooting"
+    replace : bool
+        whether to replace the group, default True
+    from_group : string or None
+        the group with the movers to be combined; None (default) uses
+        `group`
+    n_workers : int or None
+        the number of worker processes of each :class:`.ConcurrentMover`,
+        see there for details
+    """
+    _level = levels.SUPERGROUP
+    def __init__(self, group="shooting", replace=True, from_group=None,
+                 n_workers=None):
+        super(ConcurrentStrategy, self).__init__(
+            ensembles=None, group=group, replace=replace
+        )
+        self.from_group = from_group
+        if self.from_group is None:
+            self.from_group = self.group
+        self.n_workers = n_workers
+
+    def make_movers(self, scheme):
+        # a KeyError here indicates that there is no existing group of that
+        # name: build scheme.movers[self.from_group] before trying to use it!
+        batches = []
+        for mover in scheme.movers[self.from_group]:
+            ensembles = set(mover.input_ensembles + mover.output_ensembles)
+            for batch_movers, batch_ensembles in batches:
+                if not batch_ensembles & ensembles:
+                    batch_movers.append(mover)
+                    batch_ensembles |= ensembles
+                    break
+            else:
+                batches.append(([mover], ensembles))
+
+        movers = []
+        for batch_movers, _ in batches:
+            mover = paths.ConcurrentMover(batch_movers,
+                                          n_workers=self.n_workers)
+            mover.named("Concurrent " + str(self.group) + " " +
+                        str(len(movers)))
+            movers.append(mover)
+
+        return movers
+
+
 class PathReversalStrategy(MoveStrategy):
     """
     Creates PathReversalMovers for the strategy.
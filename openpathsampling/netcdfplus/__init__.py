@@ -1,10 +1,12 @@
 from base import StorableNamedObject, StorableObject, create_to_dict
 from cache import WeakKeyCache, WeakLRUCache, WeakValueCache, MaxCache, \
-    NoCache, Cache, LRUCache, LRUChunkLoadingCache
+    NoCache, Cache, LRUCache, LRUChunkLoadingCache, LRUValueCache
 from dictify import ObjectJSON, StorableObjectJSON, UUIDObjectJSON
 from netcdfplus import NetCDFPlus
+from chunking import ChunkingPolicy, FramesPerChunk, AtomBlockChunking
+from memmap import MemmapBackend, MemmapVariable
 
-from stores import ObjectStore
+from stores import ObjectStore, HashedList, LazyHashedList
 from stores import IndexedObjectStore
 from stores import VariableStore
 from stores import DictStore, ImmutableDictStore
@@ -1,6 +1,9 @@
 from collections import OrderedDict
+import sys
 import weakref
 
+import numpy as np
+
 __author__ = 'Jan-Hendrik Prinz'
 
 
@@ -122,6 +125,9 @@ class NoCache(Cache):
     def items(self):
         return []
 
+    def values(self):
+        return []
+
     def transfer(self, old_cache):
         return self
 
@@ -193,6 +199,9 @@ class LRUCache(Cache):
         self._cache[key] = value
         self._check_size_limit()
 
+    def __delitem__(self, key):
+        del self._cache[key]
+
     def _check_size_limit(self):
         while len(self._cache) > self.size_limit:
             self._cache.popitem(last=False)
@@ -336,6 +345,174 @@ class WeakLRUCache(Cache):
             yield key
 
 
+def _value_nbytes(value):
+    # the memory used by a cached value. Quantities are measured by their
+    # value, everything that is not a numpy array by `sys.getsizeof`
+    value = getattr(value, '_value', value)
+    if isinstance(value, (np.ndarray, np.generic)):
+        return value.nbytes
+
+    return sys.getsizeof(value)
+
+
+class LRUValueCache(Cache):
+    """
+    Implements a Least Recently Used Cache limited by count and/or memory
+
+    Values are stored by the `__uuid__` of their keys, so the cache does not
+    keep the keys alive and its memory usage does not depend on how many
+    keys exist elsewhere. Keys without `__uuid__` are used directly.
+
+    Parameters
+    ----------
+    max_count : int or `None`
+        the maximal number of cached values. `None` means no limit
+    max_bytes : int or `None`
+        the maximal memory used by the cached values in bytes. `None` means
+        no limit
+    on_evict : callable or `None`
+        if given, `on_evict(key, value)` is called for each evicted value.
+        The key is the uuid of the original key
+
+    Attributes
+    ----------
+    hits : int
+        the number of successful lookups
+    misses : int
+        the number of failed lookups
+    evictions : int
+        the number of values removed to obey the limits
+    """
+
+    def __init__(self, max_count=None, max_bytes=None, on_evict=None):
+        super(LRUValueCache, self).__init__()
+        self.max_count = max_count
+        self.max_bytes = max_bytes
+        self.on_evict = on_evict
+
+        self._cache = OrderedDict()
+        self._nbytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(item):
+        return getattr(item, '__uuid__', item)
+
+    @property
+    def count(self):
+        return len(self._cache), 0
+
+    @property
+    def size(self):
+        return -1 if self.max_count is None else self.max_count, 0
+
+    @property
+    def nbytes(self):
+        """
+        int : the memory used by the cached values in bytes
+        """
+        return self._nbytes
+
+    @property
+    def stats(self):
+        """
+        dict : the number of hits, misses and evictions and the memory used
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'bytes': self._nbytes,
+            'max_bytes': -1 if self.max_bytes is None else self.max_bytes
+        }
+
+    def __iter__(self):
+        return iter(self._cache)
+
+    def __reversed__(self):
+        return reversed(self._cache)
+
+    def __len__(self):
+        return len(self._cache)
+
+    def __contains__(self, item):
+        return self._key(item) in self._cache
+
+    def __getitem__(self, item):
+        key = self._key(item)
+        try:
+            nbytes, value = self._cache.pop(key)
+        except KeyError:
+            self.misses += 1
+            raise
+
+        self._cache[key] = (nbytes, value)
+        self.hits += 1
+        return value
+
+    def __setitem__(self, key, value, **kwargs):
+        key = self._key(key)
+        if key in self._cache:
+            self._nbytes -= self._cache.pop(key)[0]
+
+        nbytes = _value_nbytes(value)
+        self._cache[key] = (nbytes, value)
+        self._nbytes += nbytes
+        self._check_size_limit()
+
+    def get_silent(self, item):
+        """
+        Return item from the cache without reordering the LRU
+
+        Parameters
+        ----------
+        item : object
+            the key of the value to be retrieved from the cache
+
+        Returns
+        -------
+        `object` or `None`
+            the requested value if it exists else `None`
+        """
+        entry = self._cache.get(self._key(item))
+        if entry is None:
+            return None
+
+        return entry[1]
+
+    def keys(self):
+        return self._cache.keys()
+
+    def values(self):
+        return [value for _, value in self._cache.itervalues()]
+
+    def iteritems(self):
+        for key, (_, value) in self._cache.iteritems():
+            yield key, value
+
+    def items(self):
+        return list(self.iteritems())
+
+    def _check_size_limit(self):
+        while len(self._cache) > 0 and (
+                (self.max_count is not None and
+                 len(self._cache) > self.max_count) or
+                (self.max_bytes is not None and
+                 self._nbytes > self.max_bytes)):
+            key, (nbytes, value) = self._cache.popitem(last=False)
+            self._nbytes -= nbytes
+            self.evictions += 1
+            if self.on_evict is not None:
+                self.on_evict(key, value)
+
+    def clear(self):
+        self._cache.clear()
+        self._nbytes = 0
+
+
 class WeakValueCache(weakref.WeakValueDictionary, Cache):
     """
     Implements a cache that keeps weak references to all elements
@@ -0,0 +1,109 @@
+"""
+Policies to choose the chunk sizes of netCDF variables
+
+@author: Jan-Hendrik Prinz
+"""
+
+
+class ChunkingPolicy(object):
+    """
+    Decides the chunk sizes of a variable when it is created
+
+    A policy receives the dimensions of the new variable and the chunk sizes
+    the store would use and returns the chunk sizes to be used instead. The
+    first dimension always counts the objects in the store. Chunk sizes can
+    be ints, names of dimensions or `-1`, which both refer to the full length
+    of a dimension.
+
+    The base class keeps the chunk sizes of the store.
+    """
+
+    def chunksizes(self, dimensions, chunksizes):
+        """
+        Return the chunk sizes to be used for a new variable
+
+        Parameters
+        ----------
+        dimensions : tuple of str or int
+            the dimensions of the variable. If the last one is `'...'` the
+            variable has variable length and there is no chunk size for it
+        chunksizes : tuple or `None`
+            the chunk sizes proposed by the store
+
+        Returns
+        -------
+        tuple or `None`
+            the chunk sizes to be used
+        """
+        return chunksizes
+
+    @staticmethod
+    def _fixed_dimensions(dimensions):
+        if dimensions[-1] == '...':
+            return dimensions[:-1]
+
+        return dimensions
+
+
+class FramesPerChunk(ChunkingPolicy):
+    """
+    Store a fixed number of objects in each chunk
+
+    Small numbers make appending and reading single objects cheap. Large
+    numbers make reading one part, like a single atom, of many objects fast.
+
+    Parameters
+    ----------
+    n_frames : int
+        the number of objects in a chunk
+    """
+
+    def __init__(self, n_frames):
+        self.n_frames = n_frames
+
+    def chunksizes(self, dimensions, chunksizes):
+        if chunksizes is None:
+            chunksizes = [-1] * len(self._fixed_dimensions(dimensions))
+
+        return tuple([self.n_frames] + list(chunksizes[1:]))
+
+
+class AtomBlockChunking(ChunkingPolicy):
+    """
+    Split the atoms of each object into blocks stored in separate chunks
+
+    Together with many frames per chunk this allows to read a few atoms of a
+    whole trajectory without reading the coordinates of all other atoms.
+
+    Parameters
+    ----------
+    n_atoms : int
+        the number of atoms in a block
+    n_frames : int or `None`
+        the number of objects in a chunk. If `None` the number proposed by
+        the store is used
+    dimension : str
+        the name of the dimension that is split into blocks
+    """
+
+    def __init__(self, n_atoms, n_frames=None, dimension='n_atoms'):
+        self.n_atoms = n_atoms
+        self.n_frames = n_frames
+        self.dimension = dimension
+
+    def chunksizes(self, dimensions, chunksizes):
+        fixed = self._fixed_dimensions(dimensions)
+
+        if chunksizes is None:
+            chunksizes = [1] + [-1] * (len(fixed) - 1)
+
+        chunksizes = list(chunksizes)
+
+        if self.n_frames is not None:
+            chunksizes[0] = self.n_frames
+
+        for ix, dim in enumerate(fixed[1:], 1):
+            if type(dim) is str and dim.endswith(self.dimension):
+                chunksizes[ix] = self.n_atoms
+
+        return tuple(chunksizes)
@@ -0,0 +1,326 @@
+"""
+Memory mapped storage of numeric netCDF+ variables
+
+Variables are stored as raw, append-only files next to the netCDF file. Each
+variable has a JSON sidecar with its type, dimensions, length and attributes.
+A :class:`MemmapVariable` implements the part of the `netCDF4.Variable` API
+used by netCDF+, so stores and value delegates can use it in place of a
+netCDF variable. Reads do not need the HDF5 lock, so several processes can
+read at the same time. Read-only files return views of the memory map
+without copying, while writable files return copies, so changing a loaded
+array never changes the stored values.
+
+@author: Jan-Hendrik Prinz
+"""
+
+import json
+import os
+import shutil
+
+import numpy as np
+
+from writebehind import _row_stop
+
+
+class MemmapVariable(object):
+    """
+    A numeric variable with an unlimited first dimension in a raw file
+
+    Attributes that do not start with an underscore are stored like netCDF
+    attributes in the JSON sidecar.
+
+    Parameters
+    ----------
+    path : str
+        the path of the files without extension. Data is stored in
+        `path.bin` and the metadata in `path.json`
+    name : str
+        the name of the variable
+    dtype : numpy.dtype
+        the type of a single value
+    dimensions : tuple of str
+        the names of the dimensions. The first is unlimited
+    row_shape : tuple of int
+        the shape of a single row, i.e. of all but the first dimension
+    length : int
+        the number of rows already stored
+    attributes : dict or `None`
+        the attributes of the variable
+    readonly : bool
+        if `True` the file is mapped read-only
+    """
+
+    def __init__(self, path, name, dtype, dimensions, row_shape, length=0,
+                 attributes=None, readonly=False):
+        self._path = path
+        self._name = name
+        self._dtype = np.dtype(dtype)
+        self._dimensions = tuple(dimensions)
+        self._row_shape = tuple(row_shape)
+        self._length = length
+        self._attributes = attributes or {}
+        self._readonly = readonly
+        self._data = None
+
+    @classmethod
+    def load(cls, path, readonly=False):
+        """
+        Open a variable from its files
+
+        Parameters
+        ----------
+        path : str
+            the path of the files without extension
+        readonly : bool
+            if `True` the file is mapped read-only
+
+        Returns
+        -------
+        :class:`MemmapVariable`
+        """
+        with open(path + '.json') as f:
+            meta = json.load(f)
+
+        return cls(
+            path,
+            str(meta['name']),
+            str(meta['dtype']),
+            [str(dim) for dim in meta['dimensions']],
+            meta['row_shape'],
+            meta['length'],
+            meta['attributes'],
+            readonly
+        )
+
+    def save_meta(self):
+        """
+        Write the metadata to the JSON sidecar
+        """
+        if self._readonly:
+            return
+
+        meta = {
+            'name': self._name,
+            'dtype': self._dtype.str,
+            'dimensions': list(self._dimensions),
+            'row_shape': list(self._row_shape),
+            'length': self._length,
+            'attributes': self._attributes
+        }
+
+        with open(self._path + '.json', 'w') as f:
+            json.dump(meta, f)
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def dtype(self):
+        return self._dtype
+
+    @property
+    def dimensions(self):
+        return self._dimensions
+
+    @property
+    def shape(self):
+        return (self._length,) + self._row_shape
+
+    @property
+    def ndim(self):
+        return len(self._dimensions)
+
+    def __len__(self):
+        return self._length
+
+    def ncattrs(self):
+        return list(self._attributes)
+
+    def getncattr(self, name):
+        try:
+            return self._attributes[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def setncattr(self, name, value):
+        self._attributes[name] = value
+        self.save_meta()
+
+    def __getattr__(self, item):
+        if item.startswith('_'):
+            raise AttributeError(item)
+
+        return self.getncattr(item)
+
+    def __setattr__(self, key, value):
+        if key.startswith('_'):
+            object.__setattr__(self, key, value)
+        else:
+            self.setncattr(key, value)
+
+    def chunking(self):
+        return 'contiguous'
+
+    def set_auto_mask(self, value):
+        pass
+
+    def set_auto_scale(self, value):
+        pass
+
+    def set_auto_maskandscale(self, value):
+        pass
+
+    def _map(self, rows):
+        # make sure that at least `rows` rows are mapped
+        if self._data is not None and len(self._data) >= rows:
+            return
+
+        filename = self._path + '.bin'
+        row_bytes = self._dtype.itemsize * int(np.prod(self._row_shape))
+
+        if os.path.isfile(filename):
+            size = os.path.getsize(filename)
+        else:
+            size = 0
+
+        if self._readonly:
+            capacity = size // row_bytes
+            mode = 'r'
+        else:
+            # grow in large steps, so appending does not remap every time
+            mapped = 0 if self._data is None else len(self._data)
+            capacity = max(rows, 2 * mapped, 16)
+            if size < capacity * row_bytes:
+                with open(filename, 'ab') as f:
+                    f.truncate(capacity * row_bytes)
+
+            mode = 'r+'
+
+        if self._data is not None:
+            self._data.flush()
+
+        if capacity == 0:
+            self._data = None
+        else:
+            self._data = np.memmap(
+                filename, dtype=self._dtype, mode=mode,
+                shape=(capacity,) + self._row_shape)
+
+    def __getitem__(self, key):
+        self._map(self._length)
+
+        if self._data is None:
+            data = np.empty((0,) + self._row_shape, dtype=self._dtype)
+        else:
+            data = self._data[:self._length]
+
+        value = data[key]
+        if not self._readonly and isinstance(value, np.ndarray):
+            # a view of a writable map would write through to the file
+            value = np.array(value)
+
+        return value
+
+    def __setitem__(self, key, value):
+        if self._readonly:
+            raise IOError('Variable `%s` is read-only.' % self._name)
+
+        stop = _row_stop(key)
+        if stop is None:
+            stop = self._length
+
+        length = max(self._length, stop)
+        self._map(length)
+        self._data[:length][key] = value
+        self._length = length
+
+    def sync(self):
+        """
+        Write all changes and the metadata to disk
+        """
+        if self._data is not None and not self._readonly:
+            self._data.flush()
+
+        self.save_meta()
+
+    def close(self):
+        """
+        Write all changes and unmap the file
+        """
+        self.sync()
+        self._data = None
+
+
+class MemmapBackend(object):
+    """
+    A directory of memory mapped variables
+
+    Parameters
+    ----------
+    directory : str
+        the directory that holds the files of the variables
+    mode : str
+        `'w'` removes existing variables, `'r'` maps all variables read-only
+        and all other modes open existing variables for appending
+
+    Attributes
+    ----------
+    variables : dict of str : :class:`MemmapVariable`
+        the variables by name
+    """
+
+    def __init__(self, directory, mode='a'):
+        self.directory = directory
+        self.readonly = mode == 'r'
+        self.variables = {}
+
+        if mode == 'w' and os.path.isdir(directory):
+            shutil.rmtree(directory)
+
+        if not os.path.isdir(directory):
+            if self.readonly:
+                raise RuntimeError(
+                    "Directory '%s' does not exist." % directory)
+
+            os.makedirs(directory)
+
+        for filename in sorted(os.listdir(directory)):
+            if filename.endswith('.json'):
+                variable = MemmapVariable.load(
+                    os.path.join(directory, filename[:-5]), self.readonly)
+                self.variables[variable.name] = variable
+
+    def create_variable(self, name, dtype, dimensions, row_shape):
+        """
+        Create a new variable
+
+        Parameters
+        ----------
+        name : str
+            the name of the variable
+        dtype : numpy.dtype
+            the type of a single value
+        dimensions : tuple of str
+            the names of the dimensions. The first is unlimited
+        row_shape : tuple of int
+            the shape of all but the first dimension
+
+        Returns
+        -------
+        :class:`MemmapVariable`
+        """
+        variable = MemmapVariable(
+            os.path.join(self.directory, name),
+            name, dtype, dimensions, row_shape)
+        variable.save_meta()
+        self.variables[name] = variable
+        return variable
+
+    def sync(self):
+        for variable in self.variables.values():
+            variable.sync()
+
+    def close(self):
+        for variable in self.variables.values():
+            variable.close()
@@ -13,6 +13,8 @@ import numpy as np
 from dictify import UUIDObjectJSON
 from stores import NamedObjectStore, ObjectStore
 from proxy import LoaderProxy
+from writebehind import WriteBehindQueue, WriteBehindVariable
+from memmap import MemmapBackend
 
 logger = logging.getLogger(__name__)
 init_log = logging.getLogger('openpathsampling.initialization')
@@ -170,7 +172,16 @@ class NetCDFPlus(netCDF4.Dataset):
         """
         pass
 
-    def __init__(self, filename, mode=None, fallback=None):
+    def __init__(
+            self,
+            filename,
+            mode=None,
+            fallback=None,
+            lazy_index=False,
+            chunking=None,
+            in_memory=False,
+            persist=False,
+            memmap=False):
         """
         Create a storage for complex objects in a netCDF file
 
@@ -187,6 +198,36 @@ class NetCDFPlus(netCDF4.Dataset):
             in this storage. By default you will not try to resave objects
             that could be found in the fallback. Note that the fall back does
             only work if `use_uuid` is enabled
+        lazy_index : bool
+            if `True` the uuids of the stored objects are not read when an
+            existing file is opened. They stay in the file and are looked up
+            using a sorted index that is built on first use. This makes
+            opening large files fast, but the sorted index is not saved: the
+            first lookup in each store reads and sorts all of its uuids,
+            which is O(N log N), and the index then stays in memory with 24
+            bytes per stored uuid (still much less than the python objects
+            of the default index). See
+            :class:`openpathsampling.netcdfplus.LazyHashedList`
+        chunking : dict of str : :class:`ChunkingPolicy` or `None`
+            the chunking policies for new variables. Keys are either the full
+            name of a variable like `snapshot0_coordinates` or the name of
+            the variable inside its store like `coordinates`, which applies
+            to all stores
+        in_memory : bool
+            if `True` the file is kept in memory (netCDF4 diskless mode) and
+            no file I/O happens while the storage is open. An existing file
+            is read into memory when opened
+        persist : bool
+            if `True` an in-memory storage is written to `filename` when it
+            is closed. Otherwise all content is lost on closing
+        memmap : bool
+            if `True` variables of numpy types (like coordinates, velocities
+            and CV values) of a new file are stored as memory mapped files in
+            the directory `filename + '.arrays'` instead of in the netCDF
+            file. See :class:`openpathsampling.netcdfplus.MemmapBackend`.
+            Existing files use the layout they were created with. Cannot be
+            combined with `in_memory`, and the arrays of an existing memmap
+            file opened with `in_memory` stay on disk
 
         Notes
         -----
@@ -198,6 +239,11 @@ class NetCDFPlus(netCDF4.Dataset):
         if mode is None:
             mode = 'a'
 
+        if memmap and in_memory:
+            raise ValueError(
+                'Memory mapped arrays are stored on disk and cannot be used '
+                'with an in-memory storage.')
+
         exists = os.path.isfile(filename)
         if exists and mode == 'a':
             logger.info(
@@ -227,6 +273,9 @@ class NetCDFPlus(netCDF4.Dataset):
 
         self.filename = filename
         self.fallback = fallback
+        self.lazy_index = lazy_index
+        self.chunking = chunking or {}
+        self.in_memory = in_memory
 
         # this can be set to false to re-store objects present in the fallback
         self.exclude_from_fallback = True
@@ -235,7 +284,21 @@ class NetCDFPlus(netCDF4.Dataset):
         self.exclude_proxy_from_other = False
 
         # call netCDF4-python to create or open .nc file
-        super(NetCDFPlus, self).__init__(filename, mode)
+        if in_memory:
+            super(NetCDFPlus, self).__init__(
+                filename, mode, diskless=True, persist=persist)
+        else:
+            super(NetCDFPlus, self).__init__(filename, mode)
+
+        # numeric variables can live in memory mapped files next to the file
+        self._arrays = None
+        if mode == 'w':
+            if memmap:
+                self.setncattr('memmap_arrays', 'True')
+                self._arrays = MemmapBackend(self.arrays_directory, mode)
+        elif 'memmap_arrays' in self.ncattrs():
+            self._arrays = MemmapBackend(self.arrays_directory, mode)
+            self.variables.update(self._arrays.variables)
 
         self._setup_class()
 
@@ -331,6 +394,13 @@ class NetCDFPlus(netCDF4.Dataset):
     def _create_simplifier(self):
         self.simplifier = UUIDObjectJSON(self)
 
+    @property
+    def arrays_directory(self):
+        """
+        str : the directory of memory mapped variables of this file
+        """
+        return self.filename + '.arrays'
+
     @property
     def file_size(self):
         return os.path.getsize(self.filename)
@@ -396,6 +466,110 @@ class NetCDFPlus(netCDF4.Dataset):
         self._storages_base_cls = {}
         self.vars = dict()
         self.units = dict()
+        self._writer = None
+
+    @property
+    def write_behind(self):
+        """
+        bool : `True` if writes are queued and flushed in the background
+        """
+        return self._writer is not None
+
+    def enable_write_behind(self, batch_size=256):
+        """
+        Queue all writes and flush them to disk in a background thread
+
+        Saving objects then only does the bookkeeping (indices, uuids and
+        caches) and the serialization on the calling thread, while the
+        actual writes to the netCDF variables happen in the background.
+        `sync`, `close` and loading objects that are not in the cache wait
+        until all queued writes have been applied.
+
+        Parameters
+        ----------
+        batch_size : int
+            the maximal number of variable writes applied at once
+        """
+        if self._writer is not None:
+            return
+
+        self._writer = WriteBehindQueue(batch_size)
+        for delegate in self.vars.values():
+            delegate.variable = WriteBehindVariable(
+                delegate.variable, self._writer)
+
+    def disable_write_behind(self):
+        """
+        Apply all queued writes and write synchronously from now on
+        """
+        if self._writer is None:
+            return
+
+        writer = self._writer
+        self._writer = None
+        try:
+            writer.stop()
+        finally:
+            for delegate in self.vars.values():
+                if isinstance(delegate.variable, WriteBehindVariable):
+                    delegate.variable = delegate.variable.variable
+
+    def flush_writes(self):
+        """
+        Wait until all queued writes have been applied
+
+        Needs to be called before accessing `storage.variables` directly if
+        write-behind is enabled. Does nothing otherwise.
+        """
+        if self._writer is not None:
+            self._writer.drain()
+
+    def dimension_length(self, dimension):
+        """
+        Return the length of a dimension including queued writes
+
+        Parameters
+        ----------
+        dimension : str
+            the name of the dimension
+
+        Returns
+        -------
+        int
+            the length of the dimension once all queued writes are applied
+        """
+        if self._writer is None:
+            return len(self.dimensions[dimension])
+
+        with self._writer.lock:
+            length = len(self.dimensions[dimension])
+
+        return max(length, self._writer.pending_length(dimension))
+
+    def sync(self):
+        """
+        Write all (including queued) changes to disk
+        """
+        self.flush_writes()
+        if self._arrays is not None:
+            self._arrays.sync()
+
+        super(NetCDFPlus, self).sync()
+
+    def close(self):
+        """
+        Apply all queued writes and close the file
+
+        The file is closed even if a queued write failed, the error is
+        raised afterwards.
+        """
+        try:
+            self.disable_write_behind()
+        finally:
+            if self._arrays is not None:
+                self._arrays.close()
+
+            super(NetCDFPlus, self).close()
 
     def create_store(self, name, store, register_attr=True):
         """
@@ -664,6 +838,7 @@ class NetCDFPlus(netCDF4.Dataset):
             store = self._objects[obj.base_cls]
 
             if store.json:
+                self.flush_writes()
                 return store.variables['json'][store.idx(obj)]
 
         return None
@@ -683,6 +858,7 @@ class NetCDFPlus(netCDF4.Dataset):
 
         """
         if dim_name not in self.dimensions:
+            self.flush_writes()
             self.createDimension(dim_name, size)
 
     def cache_image(self):
@@ -826,9 +1002,10 @@ class NetCDFPlus(netCDF4.Dataset):
             setter = lambda v: np.array(v, dtype=np.int8)
 
         elif var_type == 'index':
+            # single rows are read as 0-d arrays which are not iterable
             getter = lambda v: \
                 [None if int(w) < 0 else int(w) for w in v.tolist()] \
-                if hasattr(v, '__iter__') else None if int(v) < 0 else int(v)
+                if np.ndim(v) > 0 else None if int(v) < 0 else int(v)
             setter = lambda v: \
                 [-1 if w is None else w for w in v] \
                 if hasattr(v, '__iter__') else -1 if v is None else v
@@ -987,6 +1164,19 @@ class NetCDFPlus(netCDF4.Dataset):
                         None if u[0] == '-' else LoaderProxy(store, long(u, 16))
                         for u in to_uuid_chunks34(v)
                     ]
+            if hasattr(var, 'scale_factor'):
+                # quantized variables are unpacked by netCDF4 to a float
+                # type that might differ from the one that was stored
+                dtype = self.var_type_to_nc_type(var.var_type)
+
+                def _get_cast(my_getter):
+                    if my_getter is None:
+                        return lambda v: np.asarray(v, dtype=dtype)
+                    else:
+                        return lambda v: my_getter(np.asarray(v, dtype=dtype))
+
+                getter = _get_cast(getter)
+
             if True or self.support_simtk_unit:
                 if hasattr(var, 'unit_simtk'):
                     if var_name not in self.units:
@@ -1024,6 +1214,9 @@ class NetCDFPlus(netCDF4.Dataset):
                     else:
                         getter = _get2(lambda v: v)
 
+            if self._writer is not None:
+                var = WriteBehindVariable(var, self._writer)
+
             delegate = NetCDFPlus.ValueDelegate(var, getter, setter, store)
 
             # this is a trick to speed up the s/getter. If we do not need
@@ -1042,7 +1235,9 @@ class NetCDFPlus(netCDF4.Dataset):
                         description=None,
                         chunksizes=None,
                         simtk_unit=None,
-                        maskable=False):
+                        maskable=False,
+                        precision=None,
+                        zlib=False):
         """
         Create a new variable in the netCDF storage.
 
@@ -1086,8 +1281,20 @@ class NetCDFPlus(netCDF4.Dataset):
             exist and if they have not yet been written they are filled with
             a fill_value which is treated as a non-set variable. The created
             variable will interpret this values as `None` when returned
+        precision : float or `None`
+            If set, the values of a float variable are stored as fixed point
+            32-bit integers in multiples of `precision` (in units of
+            `simtk_unit`). This uses the netCDF `scale_factor` convention, so
+            values are quantized when written and converted back to floats
+            when read.
+        zlib : bool, default: False
+            If set to `True` the variable is compressed with zlib. This works
+            best together with `precision`
         """
 
+        # the background writer must not access the file while we change it
+        self.flush_writes()
+
         ncfile = self
 
         if type(dimensions) is str:
@@ -1115,6 +1322,15 @@ class NetCDFPlus(netCDF4.Dataset):
                 chunksizes = tuple(list(chunksizes) + [2])
 
         nc_type = self.var_type_to_nc_type(var_type)
+        value_type = nc_type
+
+        if precision is not None:
+            if nc_type not in [np.float32, np.float64]:
+                raise ValueError(
+                    'Only float variables can be quantized. Variable "%s" '
+                    'is of type "%s".' % (var_name, var_type))
+
+            nc_type = np.int32
 
         for dim_name, size in new_dimensions.items():
             ncfile.create_dimension(dim_name, size)
@@ -1132,9 +1348,23 @@ class NetCDFPlus(netCDF4.Dataset):
                 if type(dim) is str:
                     chunksizes[ix] = len(ncfile.dimensions[dim])
 
+                # chunks cannot be larger than a fixed dimension
+                dimension = ncfile.dimensions[dimensions[ix]]
+                if not dimension.isunlimited():
+                    chunksizes[ix] = min(chunksizes[ix], len(dimension))
+
             chunksizes = tuple(chunksizes)
 
-        if variable_length:
+        if self._arrays is not None and var_type.startswith('numpy.') and \
+                not variable_length and not maskable and \
+                precision is None and \
+                ncfile.dimensions[dimensions[0]].isunlimited():
+            ncvar = self._arrays.create_variable(
+                var_name, nc_type, dimensions,
+                [len(ncfile.dimensions[dim]) for dim in dimensions[1:]])
+
+            self.variables[var_name] = ncvar
+        elif variable_length:
             vlen_t = ncfile.createVLType(nc_type, var_name + '_vlen')
             ncvar = ncfile.createVariable(
                 var_name, vlen_t, dimensions, chunksizes=chunksizes
@@ -1144,10 +1374,14 @@ class NetCDFPlus(netCDF4.Dataset):
         else:
             ncvar = ncfile.createVariable(
                 var_name, nc_type, dimensions, chunksizes=chunksizes,
+                zlib=zlib
             )
 
         setattr(ncvar, 'var_type', var_type)
 
+        if precision is not None:
+            setattr(ncvar, 'scale_factor', value_type(precision))
+
         if self.support_simtk_unit and simtk_unit is not None:
 
             import simtk.unit as u
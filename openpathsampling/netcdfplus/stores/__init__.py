@@ -1,4 +1,4 @@
-from object import ObjectStore
+from object import ObjectStore, HashedList, LazyHashedList
 from dict import DictStore, ImmutableDictStore
 from named import UniqueNamedObjectStore, NamedObjectStore
 from indexed import IndexedObjectStore
@@ -70,6 +70,7 @@ class NamedObjectStore(ObjectStore):
         This allows to load by name for named objects
         """
         if not self._names_loaded:
+            self.storage.flush_writes()
             for idx, name in enumerate(
                     self.storage.variables[self.prefix + "_name"][:]):
                 self._update_name_in_cache(name, idx)
@@ -91,6 +92,7 @@ class NamedObjectStore(ObjectStore):
 
         """
         if not self._cached_all:
+            self.storage.flush_writes()
             idxs = range(len(self))
             jsons = self.variables['json'][:]
             names = self.variables['name'][:]
@@ -249,6 +251,9 @@ class NamedObjectStore(ObjectStore):
         except KeyError:
             pass
 
+        # the object might still be queued for writing
+        self.storage.flush_writes()
+
         if self._log_debug:
             logger.debug(
                 'Calling load object of type `%s` @ IDX #%d' %
@@ -354,11 +359,30 @@ class NamedObjectStore(ObjectStore):
             raise
 
         n_idx = self.index[obj.__uuid__]
-        self.storage.variables[self.prefix + '_name'][n_idx] = name
+        self.vars['name'][n_idx] = name
         self._update_name_in_cache(name, n_idx)
 
         return reference
 
+    def save_many(self, objs):
+        """
+        Saves several objects to the storage.
+
+        Names are fixed and written in `save`, so named objects are saved
+        one by one.
+
+        Parameters
+        ----------
+        objs : list of :py:class:`openpathsampling.netcdfplus.base.StorableNamedObject`
+            the objects to be stored
+
+        Returns
+        -------
+        list
+            the references of the stored objects, `None` for `None`
+        """
+        return [None if obj is None else self.save(obj) for obj in objs]
+
 
 class UniqueNamedObjectStore(NamedObjectStore):
 
@@ -2,9 +2,11 @@ import logging
 from uuid import UUID
 from weakref import WeakValueDictionary
 
+import numpy as np
+
 from openpathsampling.netcdfplus.base import StorableNamedObject, StorableObject
 from openpathsampling.netcdfplus.cache import MaxCache, Cache, NoCache, \
-    WeakLRUCache
+    WeakLRUCache, LRUChunkLoadingCache
 from openpathsampling.netcdfplus.proxy import LoaderProxy
 
 logger = logging.getLogger(__name__)
@@ -54,6 +56,231 @@ class HashedList(dict):
         return self._list
 
 
+_LOWER_64 = (1 << 64) - 1
+
+# the columns of the hex digits in a uuid string
+_UUID_HEX_COLUMNS = [i for i in range(36) if i not in (8, 13, 18, 23)]
+
+_HEX_VALUES = np.zeros(256, dtype=np.uint64)
+for _value, _char in enumerate('0123456789abcdef'):
+    _HEX_VALUES[ord(_char)] = _value
+    _HEX_VALUES[ord(_char.upper())] = _value
+
+
+def uuid_strings_to_array(strings):
+    """
+    Convert stored uuid strings to arrays of their upper and lower 64 bits
+
+    Parameters
+    ----------
+    strings : list of str
+        uuid strings as stored in a variable of type `uuid`. Strings
+        starting with `-` represent `None`
+
+    Returns
+    -------
+    hi : numpy.ndarray of numpy.uint64
+        the upper 64 bits of the uuids
+    lo : numpy.ndarray of numpy.uint64
+        the lower 64 bits of the uuids
+    valid : numpy.ndarray of bool
+        `False` for entries that represent `None`
+    """
+    n = len(strings)
+    if n == 0:
+        empty = np.zeros(0, dtype=np.uint64)
+        return empty, empty, np.zeros(0, dtype=bool)
+
+    chars = np.frombuffer(
+        ''.join(strings).encode('ascii'), dtype=np.uint8).reshape(n, 36)
+
+    valid = chars[:, 0] != ord('-')
+    nibbles = _HEX_VALUES[chars[:, _UUID_HEX_COLUMNS]]
+
+    four = np.uint64(4)
+    hi = np.zeros(n, dtype=np.uint64)
+    lo = np.zeros(n, dtype=np.uint64)
+    for k in range(16):
+        hi = (hi << four) | nibbles[:, k]
+        lo = (lo << four) | nibbles[:, 16 + k]
+
+    return hi, lo, valid
+
+
+class LazyHashedList(object):
+    """
+    A drop-in for :class:`HashedList` that keeps stored uuids in the file
+
+    Opening a store does not read any uuid. The position of a uuid is found
+    by bisection in a sorted array of all stored uuids. This array is not
+    saved in the file. It is built chunk-wise on the first lookup, which
+    reads all N stored uuids and sorts them in O(N log N), and is then kept
+    in memory for the lifetime of the list, with 24 bytes per uuid (two
+    64 bit halves of the uuid and the row) instead of python objects. The
+    uuid at a position is read from the file and kept in a small LRU cache
+    of chunks. Objects added after opening are kept in memory like in
+    :class:`HashedList`.
+
+    Parameters
+    ----------
+    variable : :class:`openpathsampling.netcdfplus.NetCDFPlus.ValueDelegate`
+        the delegate to the variable of type `uuid` holding the uuids
+    size : int or None
+        the number of stored uuids. If `None` the length of the variable
+    chunksize : int
+        the number of uuids read at once
+    max_chunks : int
+        the maximal number of chunks kept in memory
+    """
+
+    def __init__(self, variable, size=None, chunksize=4096, max_chunks=64):
+        self.variable = variable
+        self.chunksize = chunksize
+
+        if size is None:
+            size = len(variable)
+
+        self._size = size
+        self._chunks = LRUChunkLoadingCache(chunksize, max_chunks, variable)
+        self._chunks.update_size(size)
+        self._sorted = None
+
+        self._added = {}
+        self._overrides = {}
+        self._list = []
+
+    def _disk_keys(self, hi, lo, rows):
+        return hi, lo, rows
+
+    def _load_sorted(self):
+        keys_hi = []
+        keys_lo = []
+        values = []
+        for left in range(0, self._size, self.chunksize):
+            right = min(self._size, left + self.chunksize)
+            hi, lo, valid = uuid_strings_to_array(
+                self.variable.variable[left:right])
+            rows = np.arange(left, right, dtype=np.int64)
+            hi, lo, rows = self._disk_keys(hi[valid], lo[valid], rows[valid])
+            keys_hi.append(hi)
+            keys_lo.append(lo)
+            values.append(rows)
+
+        keys_hi = np.concatenate(keys_hi)
+        keys_lo = np.concatenate(keys_lo)
+        values = np.concatenate(values)
+
+        order = np.lexsort((keys_lo, keys_hi))
+
+        return keys_hi[order], keys_lo[order], values[order]
+
+    def _disk_get(self, key):
+        if self._size == 0 or not isinstance(key, (int, long)):
+            return None
+
+        if self._sorted is None:
+            self._sorted = self._load_sorted()
+
+        keys_hi, keys_lo, values = self._sorted
+
+        hi = np.uint64(key >> 64)
+        lo = np.uint64(key & _LOWER_64)
+
+        left = keys_hi.searchsorted(hi, 'left')
+        right = keys_hi.searchsorted(hi, 'right')
+        pos = left + keys_lo[left:right].searchsorted(lo)
+
+        if pos < right and keys_lo[pos] == lo:
+            return int(values[pos])
+
+        return None
+
+    def _lookup(self, key):
+        value = self._added.get(key)
+        if value is None:
+            value = self._overrides.get(key)
+            if value is None:
+                value = self._disk_get(key)
+
+        return value
+
+    def _row_uuid(self, row):
+        if row >= self._size:
+            return self._list[row - self._size]
+        else:
+            return self._chunks[row]
+
+    def __len__(self):
+        return self._size + len(self._added)
+
+    def append(self, key):
+        self._added[key] = len(self)
+        self._list.append(key)
+
+    def extend(self, t):
+        map(self.append, t)
+
+    def __setitem__(self, key, value):
+        if value < self._size:
+            self._overrides[key] = value
+        else:
+            self._added[key] = value
+            self._list[value - self._size] = key
+
+    def __getitem__(self, key):
+        value = self._lookup(key)
+        if value is None:
+            raise KeyError(key)
+
+        return value
+
+    def __delitem__(self, key):
+        del self._added[key]
+
+    def __contains__(self, key):
+        return self._lookup(key) is not None
+
+    def get(self, key, d=None):
+        value = self._lookup(key)
+        if value is None:
+            return d
+
+        return value
+
+    def index(self, key):
+        return self._row_uuid(key)
+
+    def mark(self, key):
+        if key not in self:
+            self._added[key] = -2
+
+    def unmark(self, key):
+        if key in self._added:
+            del self._added[key]
+
+    def clear(self):
+        self._size = 0
+        self._sorted = None
+        self._chunks.clear()
+        self._chunks.update_size(0)
+        self._added.clear()
+        self._overrides.clear()
+        self._list = []
+
+    @property
+    def list(self):
+        """
+        iterator over all uuids in the order they were stored
+        """
+        for left in range(0, self._size, self.chunksize):
+            right = min(self._size, left + self.chunksize)
+            for uuid in self.variable[left:right]:
+                yield uuid
+
+        for uuid in self._list:
+            yield uuid
+
+
 class ObjectStore(StorableNamedObject):
     """
     Base Class for storing complex objects in a netCDF4 file. It holds a
@@ -226,12 +453,18 @@ class ObjectStore(StorableNamedObject):
     def create_uuid_index(self):
         return HashedList()
 
+    def create_lazy_uuid_index(self):
+        return LazyHashedList(self.vars['uuid'])
+
     def restore(self):
         self.load_indices()
 
     def load_indices(self):
-        self.index.clear()
-        self.index.extend(self.vars['uuid'][:])
+        if self.storage.lazy_index:
+            self.index = self.create_lazy_uuid_index()
+        else:
+            self.index.clear()
+            self.index.extend(self.vars['uuid'][:])
 
     @property
     def storage(self):
@@ -321,7 +554,7 @@ class ObjectStore(StorableNamedObject):
         Add iteration over all elements in the storage
         """
         # we want to iterator in the order object were saved!
-        for uuid in self.index._list:
+        for uuid in self.index.list:
             yield self.load(uuid)
 
     def __len__(self):
@@ -334,7 +567,7 @@ class ObjectStore(StorableNamedObject):
             number of stored objects
 
         """
-        return len(self.storage.dimensions[self.prefix])
+        return self.storage.dimension_length(self.prefix)
 
     def write(self, variable, idx, obj, attribute=None):
         if attribute is None:
@@ -353,6 +586,76 @@ class ObjectStore(StorableNamedObject):
             else:
                 setattr(obj, attribute, proxy)
 
+    def write_many(self, variable, idx, objs, attribute=None):
+        """
+        Write an attribute of several objects to consecutive rows
+
+        Parameters
+        ----------
+        variable : str
+            the name of the variable to write to
+        idx : int
+            the first row to write to
+        objs : list of object
+            the objects to get the values from. `objs[i]` is written to row
+            `idx + i`
+        attribute : str or `None`
+            the attribute of the objects to be written. If `None` the name of
+            the variable is used
+        """
+        if attribute is None:
+            attribute = variable
+
+        var = self.vars[variable]
+        values = [getattr(obj, attribute) for obj in objs]
+
+        if var.store is not None and not hasattr(var, 'var_vlen'):
+            # save all referenced objects at once, so the setter only needs
+            # to look up their references
+            var.store.save_many(values)
+
+        self.write_rows(variable, idx, values)
+
+        if var.var_type.startswith('lazy'):
+            for obj, val in zip(objs, values):
+                proxy = var.store.proxy(val)
+                if isinstance(obj, LoaderProxy):
+                    # for a loader proxy apply it to the real object
+                    setattr(obj.__subject__, attribute, proxy)
+                else:
+                    setattr(obj, attribute, proxy)
+
+    def write_rows(self, variable, idx, values):
+        """
+        Write values to consecutive rows of a variable in a single slab
+
+        Parameters
+        ----------
+        variable : str
+            the name of the variable to write to
+        idx : int
+            the first row to write to
+        values : list
+            the values to be written. These are converted like in
+            `vars[variable][idx] = value`
+        """
+        if len(values) == 0:
+            return
+
+        var = self.vars[variable]
+        values = map(var.setter, values)
+
+        if var.dtype is str or hasattr(var, 'var_vlen'):
+            data = np.empty(len(values), dtype=object)
+            data[:] = values
+        elif hasattr(var, 'scale_factor'):
+            # quantized variables are packed by netCDF4 from floats
+            data = np.array(values, dtype=np.asarray(var.scale_factor).dtype)
+        else:
+            data = np.array(values, dtype=var.dtype)
+
+        var.variable[idx:idx + len(values)] = data
+
     def proxy(self, item):
         """
         Return a proxy of a object for this store
@@ -440,6 +743,7 @@ class ObjectStore(StorableNamedObject):
 
         """
         if not self._cached_all:
+            self.storage.flush_writes()
             idxs = range(len(self))
             jsons = self.variables['json'][:]
 
@@ -452,6 +756,16 @@ class ObjectStore(StorableNamedObject):
     def _save(self, obj, idx):
         self.vars['json'][idx] = obj
 
+    def _save_many(self, objs, idx):
+        if type(self)._save.im_func is ObjectStore._save.im_func:
+            # only the json is stored so write it in a single slab
+            self.write_rows('json', idx, objs)
+        else:
+            # a subclass stores more than the json so fall back to saving
+            # one by one unless it overrides `_save_many` as well
+            for pos, obj in enumerate(objs, idx):
+                self._save(obj, pos)
+
     @property
     def last(self):
         """
@@ -560,7 +874,9 @@ class ObjectStore(StorableNamedObject):
             chunksizes=None,
             description=None,
             simtk_unit=None,
-            maskable=False
+            maskable=False,
+            precision=None,
+            zlib=False
     ):
         """
         Create a new variable in the netCDF storage. This is just a helper
@@ -603,6 +919,12 @@ class ObjectStore(StorableNamedObject):
             exist and if they have not yet been written they are filled with
             a fill_value which is treated as a non-set variable. The created
             variable will interpret this values as `None` when returned
+        precision : float or `None`
+            If set, a float variable is stored as fixed point integers in
+            multiples of `precision`. See
+            :meth:`openpathsampling.netcdfplus.NetCDFPlus.create_variable`
+        zlib : bool, default: False
+            If set to `True` the variable is compressed with zlib
         """
 
         # add the main dimension to the var_type
@@ -648,6 +970,13 @@ class ObjectStore(StorableNamedObject):
                 ]
             )
 
+        chunking = self.storage.chunking
+        policy = chunking.get(
+            self.prefix + '_' + var_name, chunking.get(var_name))
+
+        if policy is not None:
+            chunksizes = policy.chunksizes(dimensions, chunksizes)
+
         self.storage.create_variable(
             self.prefix + '_' + var_name,
             var_type=var_type,
@@ -655,7 +984,9 @@ class ObjectStore(StorableNamedObject):
             chunksizes=chunksizes,
             description=description,
             simtk_unit=simtk_unit,
-            maskable=maskable
+            maskable=maskable,
+            precision=precision,
+            zlib=zlib
         )
 
     @property
@@ -736,6 +1067,9 @@ class ObjectStore(StorableNamedObject):
         except KeyError:
             pass
 
+        # the object might still be queued for writing
+        self.storage.flush_writes()
+
         if self._log_debug:
             logger.debug(
                 'Calling load object of type `%s` @ IDX #%d' %
@@ -897,6 +1231,69 @@ class ObjectStore(StorableNamedObject):
 
         return self.reference(obj)
 
+    def save_many(self, objs):
+        """
+        Saves several objects to the storage at once.
+
+        All new objects get a contiguous range of indices and their uuids
+        are written in a single slab. The json of plain object stores and
+        the variables of `VariableStore` are written in slabs as well; stores
+        that override `_save` only write in slabs if they also implement
+        `_save_many`, otherwise their objects are written one by one.
+        Everything else (proxies, already saved objects, `None`) is passed on
+        to `save`.
+
+        Parameters
+        ----------
+        objs : list of :class:`openpathsampling.netcdfplus.base.StorableObject`
+            the objects to be stored
+
+        Returns
+        -------
+        list
+            the references of the stored objects, `None` for `None`
+        """
+        new = []
+
+        if self.fallback_store is None and self.storage.fallback is None:
+            uuids = set()
+            for obj in objs:
+                if obj is None or type(obj) is LoaderProxy:
+                    continue
+
+                uuid = obj.__uuid__
+                if uuid not in self.index and uuid not in uuids and \
+                        isinstance(obj, self.content_class):
+                    uuids.add(uuid)
+                    new.append(obj)
+
+        if new:
+            n_idx = len(self.index)
+
+            # mark all as saved so circular dependencies will not cause
+            # infinite loops
+            self.index.extend([obj.__uuid__ for obj in new])
+
+            logger.debug('Saving %d objects of type %s using IDX #%d - #%d' % (
+                len(new), self.content_class.__name__,
+                n_idx, n_idx + len(new) - 1))
+
+            try:
+                self._save_many(new, n_idx)
+
+            except:
+                # in case we did not succeed remove the marks as being saved
+                for obj in new:
+                    del self.index[obj.__uuid__]
+                raise
+
+            for pos, obj in enumerate(new, n_idx):
+                self.cache[pos] = obj
+
+            self._set_ids(n_idx, new)
+
+        return [None if obj is None else self.save(obj) for obj in objs]
+
     def __setitem__(self, key, value):
         """
         Enable saving using __setitem__
@@ -938,6 +1335,93 @@ class ObjectStore(StorableNamedObject):
 
             return obj
 
+    def reference_positions(self, references):
+        """
+        Return the indices in this store of stored references
+
+        Parameters
+        ----------
+        references : list of str
+            references to objects in this store as stored in variables of
+            type `obj.<store>` or `lazyobj.<store>`. References starting
+            with `-` represent `None`
+
+        Returns
+        -------
+        numpy.ndarray of numpy.int64
+            the indices of the referenced objects, `-1` for `None`
+        """
+        index = self.index
+        return np.array([
+            -1 if ref[0] == '-' else index[int(UUID(ref))]
+            for ref in references], dtype=np.int64)
+
+    def ragged_reference_positions(self, references):
+        """
+        Return the indices in this store of stored lists of references
+
+        Parameters
+        ----------
+        references : list of str
+            lists of references as stored in variable length variables of
+            type `obj.<store>` or `lazyobj.<store>`
+
+        Returns
+        -------
+        positions : numpy.ndarray of numpy.int64
+            the concatenated indices of all lists
+        lengths : numpy.ndarray of numpy.int64
+            the length of each list
+        """
+        rows = [
+            self.reference_positions(self.storage.to_uuid_chunks(row))
+            for row in references]
+
+        lengths = np.array(map(len, rows), dtype=np.int64)
+        if rows:
+            positions = np.concatenate(rows)
+        else:
+            positions = np.zeros(0, dtype=np.int64)
+
+        return positions, lengths
+
+    @staticmethod
+    def split_ragged(positions, lengths):
+        """
+        Split concatenated indices into lists of the given lengths
+
+        The inverse of the concatenation in `ragged_reference_positions`
+        """
+        ends = np.cumsum(lengths)
+        return [positions[end - length:end]
+                for end, length in zip(ends, lengths)]
+
+    def positions_to_objects(self, positions, lazy=False):
+        """
+        Return the objects at given indices in this store
+
+        Parameters
+        ----------
+        positions : iterable of int
+            the indices of the objects, `-1` for `None`
+        lazy : bool
+            if `True` return :class:`LoaderProxy` objects instead of
+            loading the objects
+
+        Returns
+        -------
+        list of :class:`openpathsampling.netcdfplus.base.StorableObject`
+        """
+        if lazy:
+            index = self.index
+            return [
+                None if pos < 0 else LoaderProxy(self, index.index(int(pos)))
+                for pos in positions]
+        else:
+            return [
+                None if pos < 0 else self.load(int(pos))
+                for pos in positions]
+
     def uuid(self, uuid):
         """
         Return last object with a given uuid
@@ -960,5 +1444,8 @@ class ObjectStore(StorableNamedObject):
     def _set_id(self, idx, obj):
         self.vars['uuid'][idx] = obj.__uuid__
 
+    def _set_ids(self, idx, objs):
+        self.write_rows('uuid', idx, [obj.__uuid__ for obj in objs])
+
     def _get_id(self, idx, obj):
         obj.__uuid__ = self.index.index(int(idx))
@@ -4,6 +4,8 @@ from object import ObjectStore
 
 import logging
 
+import numpy as np
+
 logger = logging.getLogger(__name__)
 init_log = logging.getLogger('openpathsampling.initialization')
 
@@ -53,6 +55,13 @@ class VariableStore(ObjectStore):
         for var in self.var_names:
             self.write(var, idx, obj)
 
+    def _save_many(self, objs, idx):
+        if type(self)._save.im_func is VariableStore._save.im_func:
+            for var in self.var_names:
+                self.write_many(var, idx, objs)
+        else:
+            super(VariableStore, self)._save_many(objs, idx)
+
     def _load(self, idx):
         # kwargs = {var: self.vars[var][idx] for var in self.var_names}
         args = [self.vars[var][idx] for var in self.var_names]
@@ -105,6 +114,86 @@ class VariableStore(ObjectStore):
 
             self._cached_all = True
 
+    def cache_table(self):
+        """
+        Return the content of the store as a table of numpy arrays
+
+        References to other objects are replaced by their indices in the
+        referenced store, so that `cache_all_from_table` can fill the cache
+        without parsing any uuid. Used to persist a decoded storage.
+
+        Returns
+        -------
+        dict of str : numpy.ndarray or `None`
+            the columns of the table or `None` if some variable cannot be
+            represented by numbers
+        """
+        self.storage.flush_writes()
+
+        table = {}
+        for var in self.var_names:
+            delegate = self.vars[var]
+            values = self.variables[var][:]
+            var_type = delegate.var_type
+
+            if var_type.startswith('obj.') or var_type.startswith('lazyobj.'):
+                if hasattr(delegate, 'var_vlen'):
+                    table[var], table[var + '_length'] = \
+                        delegate.store.ragged_reference_positions(values)
+                else:
+                    table[var] = delegate.store.reference_positions(values)
+
+            elif isinstance(delegate.dtype, np.dtype) and \
+                    not hasattr(delegate, 'var_vlen') and \
+                    not np.ma.is_masked(values):
+                table[var] = np.asarray(values)
+
+            else:
+                return None
+
+        return table
+
+    def cache_all_from_table(self, table):
+        """
+        Fill the cache from a table created by `cache_table`
+
+        Parameters
+        ----------
+        table : dict of str : numpy.ndarray
+            the columns of the table
+        """
+        if self._cached_all:
+            return
+
+        max_length = self.cache.size[0]
+        max_length = len(self) if max_length < 0 else max_length
+        length = min(len(self), max_length)
+
+        columns = []
+        for var in self.var_names:
+            delegate = self.vars[var]
+            column = table[var]
+            var_type = delegate.var_type
+
+            if var_type.startswith('obj.') or var_type.startswith('lazyobj.'):
+                lazy = var_type.startswith('lazyobj.')
+                store = delegate.store
+                if var + '_length' in table:
+                    rows = self.split_ragged(
+                        column, table[var + '_length'][:length])
+                    columns.append([
+                        store.positions_to_objects(row, lazy) for row in rows])
+                else:
+                    columns.append(
+                        store.positions_to_objects(column[:length], lazy))
+            else:
+                columns.append(map(delegate.getter, column[:length]))
+
+        [self.add_to_cache(idx, data)
+         for idx, data in enumerate(zip(*columns))]
+
+        self._cached_all = True
+
     def add_to_cache(self, idx, data):
         if idx not in self.cache:
             # attr = {var: self.vars[var].getter(data[nn])
@@ -0,0 +1,283 @@
+"""
+Write-behind of netCDF variable writes in a background thread.
+
+@author: Jan-Hendrik Prinz
+"""
+
+import logging
+import Queue
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def _row_stop(key):
+    """
+    Return the first row after the rows of the first dimension in `key`
+
+    Parameters
+    ----------
+    key : int or slice or tuple
+        the key used in `variable[key] = value`
+
+    Returns
+    -------
+    int or None
+        the row after the last written row or `None` if unknown
+    """
+    if type(key) is tuple:
+        if len(key) == 0:
+            return None
+        key = key[0]
+
+    if type(key) is slice:
+        return key.stop
+    elif isinstance(key, (int, long, np.integer)) and key >= 0:
+        return int(key) + 1
+
+    return None
+
+
+def _is_numeric(variable):
+    dtype = variable.dtype
+    return isinstance(dtype, np.dtype) and dtype.kind in 'biuf'
+
+
+def _value_dtype(variable):
+    # quantized variables are written as floats and packed by netCDF4
+    if hasattr(variable, 'scale_factor'):
+        return np.asarray(variable.scale_factor).dtype
+
+    return variable.dtype
+
+
+class WriteBehindQueue(object):
+    """
+    Queue of netCDF variable writes that are flushed by a background thread
+
+    All writes are queued by the simulation thread and applied in order and
+    in batches by a daemon thread. Access to the netCDF file from both
+    threads is serialized by `lock`. Until a write has been applied the
+    queue remembers the written value (for single rows of numeric variables)
+    and the number of rows in each dimension, so that the bookkeeping of the
+    stores stays consistent with the data that will end up on disk.
+
+    If a write fails, all later writes are dropped and the error is raised
+    by this and every later call of `put`, `drain` and `stop`.
+
+    Parameters
+    ----------
+    batch_size : int
+        the maximal number of writes applied at once while holding the lock
+
+    Attributes
+    ----------
+    lock : :class:`threading.RLock`
+        the lock to hold while accessing the netCDF file
+    """
+
+    def __init__(self, batch_size=256):
+        self.batch_size = batch_size
+        self.lock = threading.RLock()
+
+        self._queue = Queue.Queue()
+        self._pending_count = {}
+        self._pending_values = {}
+        self._pending_length = {}
+        self._error = None
+
+        self._thread = threading.Thread(
+            target=self._run, name='netcdfplus-write-behind')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _check_error(self):
+        # a failed write is never retried, so the file stays inconsistent
+        # and all later writes and flushes fail as well
+        if self._error is not None:
+            raise self._error
+
+    def put(self, variable, key, value):
+        """
+        Queue `variable[key] = value`
+
+        Parameters
+        ----------
+        variable : :class:`netCDF4.Variable`
+            the variable to write to
+        key : int or slice or tuple
+            the position to write at
+        value : object
+            the value to be written. Must already be converted to a type the
+            netCDF variable accepts
+        """
+        self._check_error()
+
+        name = variable.name
+        if _is_numeric(variable):
+            # copy, so later changes of the value are not written
+            value = np.array(value, dtype=_value_dtype(variable))
+
+        with self.lock:
+            if _is_numeric(variable):
+                if isinstance(key, (int, long, np.integer)):
+                    self._pending_values[(name, int(key))] = value
+                else:
+                    # rows written by other keys cannot be answered anymore
+                    for pending in self._pending_values.keys():
+                        if pending[0] == name:
+                            del self._pending_values[pending]
+
+            self._pending_count[name] = self._pending_count.get(name, 0) + 1
+
+            stop = _row_stop(key)
+            if stop is not None and len(variable.dimensions) > 0:
+                dimension = variable.dimensions[0]
+                self._pending_length[dimension] = max(
+                    self._pending_length.get(dimension, 0), stop)
+
+        self._queue.put((variable, key, value))
+
+    def has_pending(self, variable):
+        """
+        bool : `True` if writes to the variable have not been applied yet
+        """
+        return self._pending_count.get(variable.name, 0) > 0
+
+    def pending_value(self, variable, key):
+        """
+        Return the queued value for `variable[key]` as it would be read
+
+        Parameters
+        ----------
+        variable : :class:`netCDF4.Variable`
+            the variable to read from
+        key : int
+            the row to be read
+
+        Returns
+        -------
+        numpy.ndarray or numpy scalar
+
+        Raises
+        ------
+        KeyError
+            if no value is queued for this row
+        """
+        try:
+            hashable_key = int(key)
+        except TypeError:
+            raise KeyError(key)
+
+        with self.lock:
+            return self._pending_values[(variable.name, hashable_key)][()]
+
+    def pending_length(self, dimension):
+        """
+        int : the number of rows in the dimension once all writes are applied
+        """
+        return self._pending_length.get(dimension, 0)
+
+    def drain(self):
+        """
+        Wait until all queued writes have been applied
+        """
+        self._queue.join()
+        self._check_error()
+
+    def stop(self):
+        """
+        Apply all queued writes and stop the background thread
+        """
+        self._queue.put(None)
+        self._thread.join()
+        self._check_error()
+
+    def _run(self):
+        stop = False
+        while not stop:
+            batch = [self._queue.get()]
+            while batch[-1] is not None and len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except Queue.Empty:
+                    break
+
+            with self.lock:
+                for write in batch:
+                    if write is None:
+                        stop = True
+                    else:
+                        self._apply(*write)
+
+            for _ in batch:
+                self._queue.task_done()
+
+    def _apply(self, variable, key, value):
+        # called while holding the lock
+        name = variable.name
+        try:
+            if self._error is None:
+                variable[key] = value
+        except Exception as e:
+            logger.error(
+                'Write-behind to variable `%s` failed: %s' % (name, str(e)))
+            self._error = e
+        finally:
+            self._pending_count[name] -= 1
+            try:
+                hashable_key = (name, int(key))
+                if self._pending_values.get(hashable_key) is value:
+                    del self._pending_values[hashable_key]
+            except TypeError:
+                pass
+
+
+class WriteBehindVariable(object):
+    """
+    Wraps a netCDF variable to queue writes in a :class:`WriteBehindQueue`
+
+    Reads of rows with queued values are answered from the queue. Other
+    reads of a variable with queued writes wait until these are applied.
+
+    Parameters
+    ----------
+    variable : :class:`netCDF4.Variable`
+        the wrapped variable
+    writer : :class:`WriteBehindQueue`
+        the queue to put writes into
+    """
+
+    def __init__(self, variable, writer):
+        self.variable = variable
+        self.writer = writer
+
+    def __setitem__(self, key, value):
+        self.writer.put(self.variable, key, value)
+
+    def __getitem__(self, key):
+        writer = self.writer
+        if writer.has_pending(self.variable):
+            try:
+                return writer.pending_value(self.variable, key)
+            except KeyError:
+                writer.drain()
+
+        with writer.lock:
+            return self.variable[key]
+
+    def __len__(self):
+        with self.writer.lock:
+            length = len(self.variable)
+
+        if len(self.variable.dimensions) > 0:
+            length = max(
+                length,
+                self.writer.pending_length(self.variable.dimensions[0]))
+
+        return length
+
+    def __getattr__(self, item):
+        return getattr(self.variable, item)
@@ -7,7 +7,7 @@ Created on 19.07.2014
 
 import abc
 import logging
-import random
+import threading
 
 import numpy as np
 import openpathsampling as paths
@@ -189,6 +189,22 @@ class PathMover(TreeMixin, StorableNamedObject):
         """
         return []
 
+    def n_engine_workers(self):
+        """
+        The number of trajectories this mover generates at the same time
+
+        Used to size the :class:`openpathsampling.engines.EngineProcessPool`
+        of a simulation.
+
+        Returns
+        -------
+        int
+            the number of worker processes this mover can keep busy
+        """
+        return max([0] + [
+            mover.n_engine_workers() for mover in self.submovers
+        ])
+
     @staticmethod
     def _flatten(ensembles):
         if type(ensembles) is list:
@@ -425,7 +441,7 @@ class PathMover(TreeMixin, StorableNamedObject):
                 "," + str(sample.trajectory) +
                 "," + repr(sample.ensemble) +
                 ")")
-        selected = random.choice(legal)
+        selected = paths.engines.python_random().choice(legal)
         logger.debug(
             "selected sample: (" + str(selected.replica) +
             "," + str(selected.trajectory) +
@@ -495,7 +511,7 @@ class SampleMover(PathMover):
     def __init__(self):
         super(SampleMover, self).__init__()
 
-    def metropolis(self, trials):
+    def metropolis(self, trials, rand=None):
         """Implements the Metropolis acceptance for a list of trial samples
 
         The Metropolis uses the .bias for each sample and checks of samples
@@ -507,6 +523,9 @@ class SampleMover(PathMover):
         ----------
         trials : list of openpathsampling.Sample
             the list of all samples to be applied in a change.
+        rand : float or None
+            the random number to compare with. If `None` (default) a new
+            one is drawn.
 
         Returns
         -------
@@ -541,7 +560,8 @@ class SampleMover(PathMover):
             else:
                 probability *= sample.bias
 
-        rand = random.random()
+        if rand is None:
+            rand = paths.engines.python_random().random()
 
         if rand > probability:
             # rejected
@@ -611,8 +631,9 @@ class SampleMover(PathMover):
                 details=paths.Details(**e.details)
             )
 
-        # 4. accept/reject
-        accepted, acceptance_details = self._accept(trials)
+        # 4. accept/reject, the trial might have drawn the random number
+        accepted, acceptance_details = self._accept(
+            trials, rand=call_details.get('metropolis_random'))
 
         # update details
         kwargs = {}
@@ -650,13 +671,13 @@ class SampleMover(PathMover):
         # Default is that the original samples are returned
         return args
 
-    def _accept(self, trials):
+    def _accept(self, trials, rand=None):
         """Function to determine the acceptance of a trial
 
         Defaults to calling the Metropolis acceptance criterion for all returned
         trial samples. Means all samples most be valid and accepted.
         """
-        return self.metropolis(trials)
+        return self.metropolis(trials, rand)
 
 
 ###############################################################################
@@ -687,6 +708,14 @@ class EngineMover(SampleMover):
       calls the functions to make the trajectories (depending on the nature
       of the mover). Frequently, this is the only thing to override (two-way
       shooting, shifting).
+
+    The default ``_run`` draws the random number for the Metropolis
+    acceptance before it runs the engine. If the selector can tell the
+    longest trial that will be accepted with that number (see
+    :meth:`.ShootingPointSelector.max_trial_length`, e.g.,
+    :class:`.UniformSelector`), the engine is stopped one frame after that
+    length; longer trials would be rejected anyway. Such trials have
+    ``early_reject = True`` in their details.
     """
 
     default_engine = None
@@ -718,6 +747,9 @@ class EngineMover(SampleMover):
     def engine(self, engine):
         self._engine = engine
 
+    def n_engine_workers(self):
+        return 1
+
     def _called_ensembles(self):
         return [self.ensemble]
 
@@ -801,24 +833,73 @@ class EngineMover(SampleMover):
 
         return trial, trial_details
 
-    def _make_forward_trajectory(self, trajectory, shooting_index):
+    def _generate(self, initial_snapshot, running, max_length=None):
+        """Run the engine, in a worker process if a pool is active
+
+        See :class:`openpathsampling.engines.EngineProcessPool`.
+
+        If `max_length` is given, a trajectory cut at this length is
+        returned instead of raising an `EngineMaxLengthError`.
+        """
+        pool = paths.engines.active_pool()
+        try:
+            if pool is not None:
+                return pool.generate(self.engine, initial_snapshot,
+                                     running=running, max_length=max_length)
+            else:
+                return self.engine.generate(initial_snapshot,
+                                            running=running,
+                                            max_length=max_length)
+        except paths.engines.EngineMaxLengthError as e:
+            if max_length is not None and \
+                    len(e.last_trajectory) >= max_length:
+                return e.last_trajectory
+            raise
+
+    @staticmethod
+    def _was_cut(partial_trajectory, max_length, running):
+        # a trajectory that ended by itself fails its running condition
+        return (max_length is not None and
+                len(partial_trajectory) >= max_length and
+                bool(running(partial_trajectory, False)))
+
+    def _make_forward_trajectory(self, trajectory, shooting_index,
+                                 max_trial_length=None, details=None):
         initial_snapshot = trajectory[shooting_index]  # .copy()
         run_f = paths.PrefixTrajectoryEnsemble(self.target_ensemble,
                                                trajectory[0:shooting_index]
                                               ).can_append
-        partial_trajectory = self.engine.generate(initial_snapshot,
-                                                  running=[run_f])
+        max_length = None
+        if max_trial_length is not None:
+            # one frame more makes sure a cut trial is rejected
+            max_length = max_trial_length - shooting_index + 1
+        partial_trajectory = self._generate(initial_snapshot,
+                                            running=[run_f],
+                                            max_length=max_length)
+        if details is not None:
+            details['early_reject'] = self._was_cut(
+                partial_trajectory, max_length, run_f)
         trial_trajectory = (trajectory[0:shooting_index] +
                             partial_trajectory)
         return trial_trajectory
 
-    def _make_backward_trajectory(self, trajectory, shooting_index):
+    def _make_backward_trajectory(self, trajectory, shooting_index,
+                                  max_trial_length=None, details=None):
         initial_snapshot = trajectory[shooting_index].reversed  # _copy()
         run_f = paths.SuffixTrajectoryEnsemble(self.target_ensemble,
                                                trajectory[shooting_index + 1:]
                                               ).can_prepend
-        partial_trajectory = self.engine.generate(initial_snapshot,
-                                                  running=[run_f])
+        max_length = None
+        if max_trial_length is not None:
+            # one frame more makes sure a cut trial is rejected
+            max_length = (max_trial_length -
+                          (len(trajectory) - shooting_index - 1) + 1)
+        partial_trajectory = self._generate(initial_snapshot,
+                                            running=[run_f],
+                                            max_length=max_length)
+        if details is not None:
+            details['early_reject'] = self._was_cut(
+                partial_trajectory, max_length, run_f)
         trial_trajectory = (partial_trajectory.reversed +
                             trajectory[shooting_index + 1:])
         return trial_trajectory
@@ -841,18 +922,25 @@ class EngineMover(SampleMover):
             sh_dir=self.direction
         ))
 
+        # draw the acceptance first, longer trials need not be finished
+        rand = paths.engines.python_random().random()
+        max_trial_length = self.selector.max_trial_length(trajectory, rand)
+
+        # `early_reject` marks trials cut short because they would be
+        # rejected anyway
+        details = {'metropolis_random': rand}
         if self.direction == "forward":
             trial_trajectory = self._make_forward_trajectory(
-                trajectory, shooting_index
+                trajectory, shooting_index, max_trial_length, details
             )
         elif self.direction == "backward":
             trial_trajectory = self._make_backward_trajectory(
-                trajectory, shooting_index
+                trajectory, shooting_index, max_trial_length, details
             )
         else:
             raise RuntimeError("Unknown direction: " + str(self.direction))
 
-        return trial_trajectory, {}
+        return trial_trajectory, details
 
 
 class ForwardShootMover(EngineMover):
@@ -1202,7 +1290,7 @@ class RandomSubtrajectorySelectMover(SubtrajectorySelectMover):
     """
 
     def _choose(self, trajectory_list):
-        return random.choice(trajectory_list), {}
+        return paths.engines.python_random().choice(trajectory_list), {}
 
 
 class FirstSubtrajectorySelectMover(SubtrajectorySelectMover):
@@ -1489,7 +1577,7 @@ class SelectionMover(PathMover):
     def move(self, sample_set):
         weights = self._selector(sample_set)
 
-        rand = np.random.random() * sum(weights)
+        rand = paths.engines.numpy_random().random_sample() * sum(weights)
 
         idx = 0
         prob = weights[0]
@@ -1834,6 +1922,135 @@ class SequentialMover(PathMover):
         return paths.SequentialMoveChange(movechanges, mover=self)
 
 
+class ConcurrentMover(SequentialMover):
+    """
+    Performs independent moves at the same time in worker processes.
+
+    The movers need to act on disjoint sets of ensembles, e.g., one shooting
+    move for each interface, so that the result does not depend on the order
+    in which they are done. Each mover is run in its own thread and the
+    engines of all EngineMovers generate their trajectories in an
+    :class:`openpathsampling.engines.EngineProcessPool`. The result is the
+    same as that of a :class:`SequentialMover` with the same movers.
+
+    If a pool is active (see :meth:`EngineProcessPool.use`), e.g., the one
+    of :meth:`PathSampling.run`, its workers are used. Otherwise the mover
+    forks its own workers on the first move.
+    Changes to the movers, their ensembles or engines made after that are
+    not seen by the workers; use :meth:`close` to stop the workers, they
+    will be restarted on the next move.
+
+    Before the movers are started one seed per mover is drawn from
+    :func:`openpathsampling.engines.numpy_random`. Each mover then gets its
+    own random number generators and seeds the workers of its trajectories
+    from them, so runs with a fixed seed are reproducible regardless of how
+    threads and workers are scheduled.
+
+    Thread safety: engines run in the worker processes, each with its own
+    copy, so they need not be thread-safe. All other code of the movers
+    (selection, modification, acceptance and the evaluation of collective
+    variables including :obj:`openpathsampling.shared_intermediates`) runs
+    while the mover holds the pool's turn, i.e. one thread at a time. Code
+    called by the movers must draw random numbers from
+    :func:`openpathsampling.engines.python_random` and
+    :func:`openpathsampling.engines.numpy_random` and must not use shared
+    state outside of this turn, e.g. in threads of its own.
+    """
+
+    def __init__(self, movers, n_workers=None):
+        """
+        Parameters
+        ----------
+        movers : list of openpathsampling.PathMover
+            the list of pathmovers to be run concurrently. They must not
+            share input or output ensembles.
+        n_workers : int or None
+            the number of worker processes. If `None` (default) one worker
+            per mover is used; if `0` no workers are used and the moves
+            are done one after the other as in :class:`SequentialMover`.
+        """
+        super(ConcurrentMover, self).__init__(movers)
+
+        used = set()
+        for mover in movers:
+            ensembles = set(mover.input_ensembles + mover.output_ensembles)
+            if used & ensembles:
+                raise ValueError(
+                    'Movers in a ConcurrentMover must act on different '
+                    'ensembles.')
+            used |= ensembles
+
+        if n_workers is None:
+            n_workers = len(movers)
+
+        self.n_workers = n_workers
+        self._pool = None
+
+    def _make_pool(self):
+        engines = [
+            mover.engine for mover in self if isinstance(mover, EngineMover)
+        ]
+        return paths.engines.EngineProcessPool(
+            self.n_workers, [self] + engines)
+
+    def close(self):
+        """
+        Stop the worker processes
+        """
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+
+    def n_engine_workers(self):
+        if self.n_workers == 0 or len(self.movers) < 2:
+            return super(ConcurrentMover, self).n_engine_workers()
+
+        return sum(mover.n_engine_workers() for mover in self.movers)
+
+    def move(self, sample_set):
+        if self.n_workers == 0 or len(self.movers) < 2:
+            return super(ConcurrentMover, self).move(sample_set)
+
+        logger.debug("Starting concurrent move")
+
+        pool = paths.engines.active_pool()
+        if pool is None:
+            if self._pool is None:
+                self._pool = self._make_pool()
+                self._pool.start()
+
+            pool = self._pool
+
+        movechanges = [None] * len(self.movers)
+        errors = []
+
+        # draw all randomness up front in the order of the movers
+        rng = paths.engines.numpy_random()
+        seeds = [rng.randint(2 ** 31) for _ in self.movers]
+
+        def run(idx, mover):
+            with pool.use(seed=seeds[idx]):
+                try:
+                    movechanges[idx] = mover.move(sample_set)
+                except Exception as e:
+                    errors.append(e)
+
+        threads = [
+            threading.Thread(target=run, args=(idx, mover))
+            for idx, mover in enumerate(self.movers)
+        ]
+        with pool.waiting():
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        if errors:
+            raise errors[0]
+
+        return paths.SequentialMoveChange(movechanges, mover=self)
+
+
 class PartialAcceptanceSequentialMover(SequentialMover):
     """
     Performs each move in its movers list until complete or until one is not
@@ -2190,8 +2407,8 @@ class AbstractTwoWayShootingMover(EngineMover):
             self.target_ensemble,
             trajectory[0:shooting_index]
         )
-        fwd_partial = self.engine.generate(initial_snapshot,
-                                           running=[fwd_ens.can_append])
+        fwd_partial = self._generate(initial_snapshot,
+                                     running=[fwd_ens.can_append])
         return fwd_partial
 
     def _make_backward_trajectory(self, trajectory, initial_snapshot,
@@ -2201,8 +2418,8 @@ class AbstractTwoWayShootingMover(EngineMover):
             self.target_ensemble,
             trajectory[shooting_index + 1:]
         )
-        bkwd_partial = self.engine.generate(initial_snapshot.reversed,
-                                            running=[bkwd_ens.can_prepend])
+        bkwd_partial = self._generate(initial_snapshot.reversed,
+                                      running=[bkwd_ens.can_prepend])
         return bkwd_partial
 
     def _run(self, trajectory, shooting_index):
@@ -2297,6 +2514,119 @@ class BackwardFirstTwoWayShootingMover(AbstractTwoWayShootingMover):
         return trial_trajectory, details
 
 
+
+class ConcurrentTwoWayShootingMover(AbstractTwoWayShootingMover):
+    """
+    Two-way shooting that generates both halves at the same time.
+
+    The forward and the backward half are run by two workers of an
+    :class:`openpathsampling.engines.EngineProcessPool` and joined
+    afterwards. The stopping conditions of each half only know the old
+    other half of the trajectory, not the new one. For ensembles in which
+    each half stops when it reaches a state (like TPS and TIS) this gives
+    the same trials as :class:`TwoWayShootingMover`.
+
+    The halves are only generated at the same time if a pool is active,
+    e.g., the one that :meth:`PathSampling.run` starts for schemes with
+    such movers or the one of a :class:`ConcurrentMover`. Without a pool
+    they are generated one after the other in the current process. The
+    seeds of the two workers are drawn in the calling thread, so runs with
+    a fixed seed are reproducible.
+    """
+
+    def __init__(self, ensemble, selector, modifier, engine=None):
+        super(ConcurrentTwoWayShootingMover, self).__init__(
+            ensemble=ensemble,
+            selector=selector,
+            modifier=modifier,
+            engine=engine
+        )
+
+    def n_engine_workers(self):
+        return 2
+
+    def _run(self, trajectory, shooting_index):
+        """
+        The actual shooting process (after shooting point is chosen).
+
+        Parameters
+        ----------
+        trajectory : :class:`.Trajectory`
+            input trajectory
+        shooting_index : int
+            index of the shooting point within `trajectory`
+
+        Returns
+        -------
+        trial_trajectory : :class:`.Trajectory`
+            the resulting trial trajectory
+        details : dict
+            details dictionary (includes modified shooting point)
+        """
+        shoot_str = "Running {sh_dir} from frame {fnum} in [0:{maxt}]"
+        logger.info(shoot_str.format(
+            fnum=shooting_index,
+            maxt=len(trajectory) - 1,
+            sh_dir="Concurrent"
+        ))
+
+        original = trajectory[shooting_index]
+        modified = self.modifier(original)
+
+        fwd_ens = paths.PrefixTrajectoryEnsemble(
+            self.target_ensemble,
+            trajectory[0:shooting_index]
+        )
+        bkwd_ens = paths.SuffixTrajectoryEnsemble(
+            self.target_ensemble,
+            trajectory[shooting_index + 1:]
+        )
+
+        tasks = [
+            (self.engine, modified, [fwd_ens.can_append], +1, None),
+            (self.engine, modified.reversed, [bkwd_ens.can_prepend], +1,
+             None)
+        ]
+
+        pool = paths.engines.active_pool()
+        if pool is not None:
+            fwd_partial, bkwd_partial = pool.generate_many(tasks)
+        else:
+            # same results as from the pool, one half after the other
+            partials = []
+            for engine, snapshot, running, direction, max_length in tasks:
+                try:
+                    partials.append(engine.generate(
+                        snapshot, running, direction, max_length))
+                except paths.engines.EngineError as e:
+                    partials.append(e)
+            fwd_partial, bkwd_partial = partials
+
+        for partial in [fwd_partial, bkwd_partial]:
+            if isinstance(partial, Exception) and \
+                    not isinstance(partial, paths.engines.EngineError):
+                raise partial
+
+        failed = [
+            partial for partial in [fwd_partial, bkwd_partial]
+            if isinstance(partial, paths.engines.EngineError)
+        ]
+        if failed:
+            # report the first failure with all that has been generated
+            if isinstance(fwd_partial, Exception):
+                fwd_partial = fwd_partial.last_trajectory
+            if isinstance(bkwd_partial, Exception):
+                bkwd_partial = bkwd_partial.last_trajectory
+
+            raise failed[0].__class__(
+                str(failed[0]), bkwd_partial.reversed + fwd_partial[1:])
+
+        # join the two
+        trial_trajectory = bkwd_partial.reversed + fwd_partial[1:]
+
+        details = {'modified_shooting_snapshot': modified}
+        return trial_trajectory, details
+
 class TwoWayShootingMover(RandomChoiceMover):
     def __init__(self, ensemble, selector, modifier, engine=None):
         movers = [
@@ -675,7 +675,49 @@ class PathSampling(PathSimulator):
         n_steps_to_run = n_steps - self.step
         self.run(n_steps_to_run)
 
+    def _make_engine_pool(self):
+        """
+        Return a pool for the concurrent movers of the scheme, if any
+        """
+        if self.root_mover is None or \
+                paths.engines.active_pool() is not None:
+            return None
+
+        n_workers = self.root_mover.n_engine_workers()
+        if n_workers < 2:
+            return None
+
+        engines = [
+            mover.engine for mover in self.root_mover
+            if isinstance(mover, paths.EngineMover)
+        ]
+        return paths.engines.EngineProcessPool(
+            n_workers, [self.root_mover] + engines)
+
     def run(self, n_steps):
+        """
+        Run the simulator for a number of steps
+
+        If the move scheme generates several trajectories at the same time
+        (e.g., with :class:`.ConcurrentMover` or
+        :class:`.ConcurrentTwoWayShootingMover`) an
+        :class:`openpathsampling.engines.EngineProcessPool` with enough
+        workers is forked at the beginning and closed at the end of the
+        run. All movers generate their trajectories in its workers then.
+
+        Parameters
+        ----------
+        n_steps : int
+            number of step to be run
+        """
+        pool = self._make_engine_pool()
+        if pool is None:
+            self._run(n_steps)
+        else:
+            with pool, pool.use():
+                self._run(n_steps)
+
+    def _run(self, n_steps):
         mcstep = None
 
         # cvs = list()
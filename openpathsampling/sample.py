@@ -1,4 +1,3 @@
-import random
 import logging
 
 import openpathsampling as paths
@@ -85,9 +84,11 @@ class SampleSet(StorableObject):
 
     def __getitem__(self, key):
         if isinstance(key, paths.Ensemble):
-            return random.choice(self.ensemble_dict[key])
+            return paths.engines.python_random().choice(
+                self.ensemble_dict[key])
         elif type(key) is int:
-            return random.choice(self.replica_dict[key])
+            return paths.engines.python_random().choice(
+                self.replica_dict[key])
         elif hasattr(key, '__iter__'):
             return (self[element] for element in key)
         elif type(key) is slice:
@@ -1,8 +1,7 @@
 import math
 import logging
 
-import numpy as np
-
+import openpathsampling as paths
 from openpathsampling.netcdfplus import StorableNamedObject
 
 logger = logging.getLogger(__name__)
@@ -68,6 +67,27 @@ class ShootingPointSelector(StorableNamedObject):
 
         return sum(self._biases(trajectory))
 
+    def max_trial_length(self, old_trajectory, rand):
+        '''
+        Returns the maximal length of a trial that can still be accepted
+
+        Parameters
+        ----------
+        old_trajectory : :class:`openpathsampling.Trajectory`
+            the trajectory the shooting point was picked from
+        rand : float
+            the random number of the Metropolis acceptance, drawn before
+            the trial is generated
+
+        Returns
+        -------
+        int or None
+            every trial longer than this is rejected by the acceptance
+            with `rand`. `None` means this cannot be known before the trial
+            is generated (the default).
+        '''
+        return None
+
     def pick(self, trajectory):
         '''
         Returns the index of the chosen snapshot within `trajectory`
@@ -81,7 +101,7 @@ class ShootingPointSelector(StorableNamedObject):
         prob_list = self._biases(trajectory)
         sum_bias = sum(prob_list)
 
-        rand = np.random.random() * sum_bias
+        rand = paths.engines.numpy_random().random_sample() * sum_bias
         idx = 0
         prob = prob_list[0]
         while prob <= rand and idx < len(prob_list):
@@ -131,9 +151,18 @@ class UniformSelector(ShootingPointSelector):
     def sum_bias(self, trajectory):
         return float(len(trajectory) - self.pad_start - self.pad_end)
 
+    def max_trial_length(self, old_trajectory, rand):
+        # acceptance is sum_bias(old) / sum_bias(new), which is at least
+        # `rand` up to this length
+        if rand <= 0.0:
+            return None
+
+        pad = self.pad_start + self.pad_end
+        return int(math.floor(self.sum_bias(old_trajectory) / rand)) + pad
+
     def pick(self, trajectory):
-        idx = np.random.random_integers(self.pad_start, 
-                                        len(trajectory) - self.pad_end - 1)
+        idx = paths.engines.numpy_random().random_integers(
+            self.pad_start, len(trajectory) - self.pad_end - 1)
         return idx
 
 
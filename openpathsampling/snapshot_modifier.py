@@ -140,7 +140,8 @@ class RandomVelocities(SnapshotModifier):
                 sigma = radicand.sqrt()
             except AttributeError:  # if masses regular list
                 sigma = np.sqrt(radicand)
-            vel_subset[atom_i] = sigma * np.random.normal(size=n_spatial)
+            vel_subset[atom_i] = sigma * paths.engines.numpy_random().normal(
+                size=n_spatial)
 
         self.apply_to_subset(velocities, vel_subset)
         new_snap = snapshot.copy_with_replacement(velocities=velocities)
@@ -372,7 +373,8 @@ class GeneralizedDirectionModifier(SnapshotModifier):
         for atom_i in atoms_to_change:
             initial_sum_sq_vel = sum([v**2 for v in vel_subset[atom_i]],
                                      zero_with_units)
-            randoms = np.random.normal(size=len(vel_subset[atom_i]))
+            randoms = paths.engines.numpy_random().normal(
+                size=len(vel_subset[atom_i]))
             delta_v = dv_widths[atom_i] * randoms
             vel_subset[atom_i] += delta_v
             final_sum_sq_vel = sum([v**2 for v in vel_subset[atom_i]],
@@ -458,5 +460,5 @@ class SingleAtomVelocityDirectionModifier(GeneralizedDirectionModifier):
     VelocityDirectionModifier
     """
     def _select_atoms_to_modify(self, n_subset_atoms):
-        return [np.random.choice(range(n_subset_atoms))]
+        return [paths.engines.numpy_random().choice(range(n_subset_atoms))]
 
@@ -7,4 +7,7 @@ from stores import (
 
 from storage import Storage, AnalysisStorage
 
-from util import join_md_storage, split_md_storage
+from util import join_md_storage, split_md_storage, compact_storage, \
+    keep_active, benchmark_chunking
+
+from policy import StoragePolicy, AcceptedPathsPolicy
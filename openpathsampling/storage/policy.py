@@ -0,0 +1,53 @@
+from util import keep_active
+
+
+class StoragePolicy(object):
+    """
+    Decides which snapshots of a MC step are stored in full
+
+    A policy is attached to a :class:`openpathsampling.Storage`. When a
+    MC step is saved the trajectories and snapshots returned by `keep` are
+    stored in full. All other snapshots referenced by the step, like the ones
+    of rejected trials, are only mentioned: their uuids and the values of CVs
+    with a diskcache are stored, but not their coordinates or velocities.
+    """
+
+    def keep(self, step):
+        """
+        Return the trajectories and snapshots to be stored in full
+
+        Parameters
+        ----------
+        step : :obj:`openpathsampling.MCStep`
+            the step to be saved
+
+        Returns
+        -------
+        list of :obj:`openpathsampling.Trajectory` or
+        :obj:`openpathsampling.engines.BaseSnapshot`
+        """
+        raise NotImplementedError
+
+
+class AcceptedPathsPolicy(StoragePolicy):
+    """
+    Store only the active sampleset of each step in full
+
+    Since the active sampleset contains all accepted samples, only the
+    coordinates of accepted trials (and of the initial samples) are kept.
+
+    Parameters
+    ----------
+    shooting_points : bool
+        if `True` (default) the shooting points of all moves are also stored
+        in full, even those of rejected trials
+    """
+
+    def __init__(self, shooting_points=True):
+        self.shooting_points = shooting_points
+
+    def keep(self, step):
+        if self.shooting_points:
+            return keep_active(step)
+        else:
+            return [sample.trajectory for sample in step.active]
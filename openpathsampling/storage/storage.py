@@ -5,8 +5,11 @@ Created on 06.07.2014
 """
 
 import logging
+import os
 import time
 
+import numpy as np
+
 import openpathsampling as paths
 from openpathsampling.netcdfplus import NetCDFPlus, WeakLRUCache, ObjectStore, \
     ImmutableDictStore, NamedObjectStore
@@ -41,7 +44,15 @@ class Storage(NetCDFPlus):
             filename,
             mode=None,
             template=None,
-            fallback=None):
+            fallback=None,
+            lazy_index=False,
+            policy=None,
+            precision=None,
+            zlib=False,
+            chunking=None,
+            in_memory=False,
+            persist=False,
+            memmap=False):
         """
         Create a netCDF+ storage for OPS Objects
 
@@ -55,13 +66,57 @@ class Storage(NetCDFPlus):
         template : :class:`openpathsampling.Snapshot`
             a Snapshot instance that contains a reference to a Topology, the
             number of atoms and used units
+        fallback : :class:`openpathsampling.Storage`
+            the _fallback_ storage to be loaded from if an object is not present
+            in this storage
+        lazy_index : bool
+            if `True` the uuids of stored objects are not read when opening
+            the file but looked up in the file when needed. Use this to
+            quickly open large files
+        policy : :class:`openpathsampling.storage.StoragePolicy` or `None`
+            if set, this decides which snapshots of a saved MC step are stored
+            in full. All others are only mentioned. If `None` (default) all
+            snapshots are stored in full
+        precision : dict of str : float or `None`
+            the precision of quantized snapshot features by feature name,
+            e.g. `{'coordinates': 1e-3}` to store coordinates as fixed point
+            integers to 1e-3 nm (like XTC). Values are decoded on loading.
+            Only affects snapshot types added to the file after opening
+        zlib : bool
+            if `True` the coordinates and velocities of snapshot types added
+            to the file after opening are compressed with zlib
+        chunking : dict of str : :class:`openpathsampling.netcdfplus.ChunkingPolicy`
+            the chunking policies of variables created in this file by
+            variable name, e.g. `{'coordinates': FramesPerChunk(1024)}`. Use
+            :func:`openpathsampling.storage.benchmark_chunking` to compare
+            policies
+        in_memory : bool
+            if `True` the storage is kept in memory without any file I/O.
+            Useful for short runs and tests
+        persist : bool
+            if `True` an in-memory storage is written to `filename` when it
+            is closed
+        memmap : bool
+            if `True` coordinates, velocities and other numpy variables of a
+            new file are stored in memory mapped files in the directory
+            `filename + '.arrays'`. Reading them needs no netCDF lock and
+            no copy if the file is opened read-only. Cannot be combined with
+            `in_memory`
         """
 
         self._template = template
+        self.policy = policy
+        self.precision = precision
+        self.zlib = zlib
         super(Storage, self).__init__(
             filename,
             mode,
-            fallback=fallback)
+            fallback=fallback,
+            lazy_index=lazy_index,
+            chunking=chunking,
+            in_memory=in_memory,
+            persist=persist,
+            memmap=memmap)
 
     def _create_storages(self):
         """
@@ -142,6 +197,46 @@ class Storage(NetCDFPlus):
         self.cvs.sync_all()
         self.sync()
 
+    def cache_image(self):
+        """
+        Return an dict containing information about all caches
+
+        In addition to the stores this contains the in-memory caches of all
+        loaded CVs under `cv_caches` by CV name.
+
+        Returns
+        -------
+        dict
+            a nested dict containing information about the number and types of
+            cached objects
+        """
+        image = super(Storage, self).cache_image()
+
+        cv_caches = {}
+        for cv in self.cvs.cache.values():
+            if cv is None:
+                continue
+
+            cache = cv._cache_dict.cache
+            size = cache.size
+            count = cache.count
+            profile = {
+                'count': count[0] + count[1],
+                'count_strong': count[0],
+                'count_weak': count[1],
+                'max': size[0],
+                'size_strong': size[0],
+                'size_weak': size[1],
+            }
+            if hasattr(cache, 'stats'):
+                profile.update(cache.stats)
+
+            cv_caches[cv.name] = profile
+
+        image['cv_caches'] = cv_caches
+
+        return image
+
     def set_caching_mode(self, mode='default'):
         r"""
         Set default values for all caches
@@ -451,7 +546,19 @@ class AnalysisStorage(Storage):
 
     """
 
-    def __init__(self, filename, caching_mode='analysis'):
+    stores_to_cache = [
+        'cvs',
+        'trajectories',
+        'volumes',
+        'ensembles',
+        'samples',
+        'samplesets',
+        'pathmovers',
+        'movechanges',
+        'steps',
+    ]
+
+    def __init__(self, filename, caching_mode='analysis', cache_file=None):
         """
         Open a storage in read-only and do caching useful for analysis.
 
@@ -465,6 +572,12 @@ class AnalysisStorage(Storage):
             size system and lots of memory you might want to try `unlimited`
             which will not load all objects but keep every object you load.
             This is fastest but might crash for large storages.
+        cache_file : str or bool or `None`
+            If given, the name of a sidecar file that keeps the references
+            between the cached objects as integer arrays. It is written after
+            the first full load and makes opening the same (unchanged)
+            storage again much faster. `True` uses `filename` with the
+            extension `.analysis.npz` appended.
 
         """
         super(AnalysisStorage, self).__init__(
@@ -474,11 +587,16 @@ class AnalysisStorage(Storage):
 
         self.set_caching_mode(caching_mode)
 
+        if cache_file is True:
+            cache_file = filename + '.analysis.npz'
+        elif cache_file is False:
+            cache_file = None
+
         # Let's go caching
-        AnalysisStorage.cache_for_analysis(self)
+        AnalysisStorage.cache_for_analysis(self, cache_file)
 
     @staticmethod
-    def cache_for_analysis(storage):
+    def cache_for_analysis(storage, cache_file=None):
         """
         Run specific caching useful for later analysis sessions.
 
@@ -486,32 +604,107 @@ class AnalysisStorage(Storage):
         ----------
         storage : :class:`openpathsampling.storage.Storage`
             The storage the caching should act upon.
+        cache_file : str or `None`
+            The name of a sidecar file to fill the caches from. If it does
+            not exist or does not match the storage it will be (re)written
+            after caching.
 
         """
+        tables = None
+        if cache_file is not None:
+            tables = AnalysisStorage.load_cache_file(storage, cache_file)
 
         with AnalysisStorage.CacheTimer('Cached all CVs'):
             for cv, (cv_store, cv_store_idx) in \
                     storage.snapshots.cv_list.items():
                 cv_store.cache.load_max()
 
-        stores_to_cache = ['cvs',
-                           'trajectories',
-                           'volumes',
-                           'ensembles',
-                           'samples',
-                           'samplesets',
-                           'pathmovers',
-                           'movechanges',
-                           'steps',
-                           ]
-
-        for store_name in stores_to_cache:
+        for store_name in AnalysisStorage.stores_to_cache:
             store = getattr(storage, store_name)
             with AnalysisStorage.CacheTimer('Cache all objects', store):
-                store.cache_all()
+                if tables is not None and store_name in tables:
+                    store.cache_all_from_table(tables[store_name])
+                else:
+                    store.cache_all()
+
+        if cache_file is not None and tables is None:
+            with AnalysisStorage.CacheTimer('Write cache file'):
+                AnalysisStorage.save_cache_file(storage, cache_file)
 
 #        storage.trajectories.cache_all()
 
+    @staticmethod
+    def save_cache_file(storage, cache_file):
+        """
+        Write the references between objects of the cached stores to a file
+
+        Parameters
+        ----------
+        storage : :class:`openpathsampling.storage.Storage`
+            The storage to write the tables of
+        cache_file : str
+            The name of the file to be written
+        """
+        arrays = {'file_size': np.array([storage.file_size])}
+
+        for store_name in AnalysisStorage.stores_to_cache:
+            store = getattr(storage, store_name)
+            if hasattr(store, 'cache_table'):
+                table = store.cache_table()
+                if table is not None:
+                    arrays[store_name + '.__len__'] = np.array([len(store)])
+                    for column, values in table.items():
+                        arrays[store_name + '.' + column] = values
+
+        try:
+            with open(cache_file, 'wb') as f:
+                np.savez(f, **arrays)
+        except IOError as e:
+            logger.warning(
+                'Could not write cache file `%s`: %s' % (cache_file, str(e)))
+
+    @staticmethod
+    def load_cache_file(storage, cache_file):
+        """
+        Read the tables written by `save_cache_file`
+
+        Parameters
+        ----------
+        storage : :class:`openpathsampling.storage.Storage`
+            The storage the tables have to match
+        cache_file : str
+            The name of the file to be read
+
+        Returns
+        -------
+        dict of str : dict of str : numpy.ndarray or `None`
+            the tables for each store or `None` if the file does not exist
+            or does not match the storage
+        """
+        if not os.path.isfile(cache_file):
+            return None
+
+        data = np.load(cache_file)
+        arrays = {key: data[key] for key in data.files}
+        data.close()
+
+        if int(arrays.pop('file_size')[0]) != storage.file_size:
+            logger.info('Cache file `%s` is outdated' % cache_file)
+            return None
+
+        tables = {}
+        for key, values in arrays.items():
+            store_name, column = key.split('.', 1)
+            tables.setdefault(store_name, {})[column] = values
+
+        for store_name, table in tables.items():
+            if int(table.pop('__len__')[0]) != \
+                    len(getattr(storage, store_name)):
+                logger.info('Cache file `%s` is outdated' % cache_file)
+                return None
+
+        return tables
+
     class CacheTimer(object):
         def __init__(self, context, store=None):
             self.store = store
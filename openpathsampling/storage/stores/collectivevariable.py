@@ -45,8 +45,24 @@ class CVStore(UniqueNamedObjectStore):
         """
         self.storage.snapshots.sync_cv(cv)
 
-    def complete(self, cv):
-        self.storage.snapshots.complete_cv(cv)
+    def complete(self, cv, chunksize=1024, pool=None):
+        """
+        Compute and store all missing values of a CV with a partial diskcache
+
+        Parameters
+        ----------
+        cv : :class:`openpathsampling.CollectiveVariable`
+            the CV to be completed
+        chunksize : int
+            the number of values computed and written at once
+        pool : object or `None`
+            a :class:`openpathsampling.engines.EngineProcessPool` that knows
+            the CV or a pool of threads like `multiprocessing.pool.ThreadPool`
+            to compute the chunks in parallel. See
+            :meth:`openpathsampling.storage.SnapshotWrapperStore.complete_cv`
+
+        """
+        self.storage.snapshots.complete_cv(cv, chunksize=chunksize, pool=pool)
 
     def sync_all(self):
         map(self.sync, self)
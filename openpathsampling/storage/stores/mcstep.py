@@ -18,3 +18,33 @@ class MCStepStore(VariableStore):
         self.create_variable('previous', 'obj.samplesets')
         self.create_variable('simulation', 'obj.pathsimulators')
         self.create_variable('mccycle', 'int')
+
+    def save(self, obj, idx=None):
+        """
+        Save a MC step using the policy of the storage if one is set
+
+        If the storage has a :class:`openpathsampling.storage.StoragePolicy`
+        only the trajectories and snapshots it chooses are stored in full,
+        all other snapshots of the step are only mentioned.
+
+        Parameters
+        ----------
+        obj : :class:`openpathsampling.MCStep`
+            the step to be stored
+        idx : int or string or `None`
+            the index to be used for storing
+        """
+        policy = getattr(self.storage, 'policy', None)
+
+        if policy is None or obj.__uuid__ in self.index:
+            return super(MCStepStore, self).save(obj, idx)
+
+        map(self.storage.save, policy.keep(obj))
+
+        snapshots = self.storage.snapshots
+        current_mention = snapshots.only_mention
+        snapshots.only_mention = True
+        try:
+            return super(MCStepStore, self).save(obj, idx)
+        finally:
+            snapshots.only_mention = current_mention
@@ -3,6 +3,8 @@ from openpathsampling.netcdfplus import StorableObject, ObjectStore
 
 from uuid import UUID
 
+import numpy as np
+
 
 class MoveChangeStore(ObjectStore):
     def __init__(self):
@@ -67,6 +69,7 @@ class MoveChangeStore(ObjectStore):
 
         """
         if not self._cached_all:
+            self.storage.flush_writes()
             poss = range(len(self))
             uuids = self.vars['uuid']
 
@@ -98,6 +101,98 @@ class MoveChangeStore(ObjectStore):
 
             self._cached_all = True
 
+    def cache_table(self):
+        """
+        Return the content of the store as a table of numpy arrays
+
+        References to other objects are replaced by their indices in the
+        referenced store.
+
+        Returns
+        -------
+        dict of str : numpy.ndarray
+            the columns of the table
+        """
+        self.storage.flush_writes()
+
+        samples = self.storage.samples
+
+        table = {
+            'cls': np.array(self.variables['cls'][:].tolist(), dtype=unicode),
+            'mover': self.storage.pathmovers.reference_positions(
+                self.variables['mover'][:]),
+            'details': self.storage.details.reference_positions(
+                self.variables['details'][:])
+        }
+
+        table['samples'], table['samples_length'] = \
+            samples.ragged_reference_positions(self.variables['samples'][:])
+        table['subchanges'], table['subchanges_length'] = \
+            self.ragged_reference_positions(self.variables['subchanges'][:])
+
+        try:
+            input_samples = self.variables['input_samples'][:]
+        except KeyError:
+            # BACKWARD COMPATIBILITY: REMOVE IN 2.0
+            input_samples = [''] * len(table['cls'])
+
+        table['input_samples'], table['input_samples_length'] = \
+            samples.ragged_reference_positions(input_samples)
+
+        return table
+
+    def cache_all_from_table(self, table):
+        """
+        Fill the cache from a table created by `cache_table`
+
+        Parameters
+        ----------
+        table : dict of str : numpy.ndarray
+            the columns of the table
+        """
+        if not self._cached_all:
+            samples = self.storage.samples
+            pathmovers = self.storage.pathmovers
+            details = self.storage.details
+
+            samples_idxss = self.split_ragged(
+                table['samples'], table['samples_length'])
+            input_samples_idxss = self.split_ragged(
+                table['input_samples'], table['input_samples_length'])
+            subchanges_idxss = self.split_ragged(
+                table['subchanges'], table['subchanges_length'])
+
+            for pos, cls_name, samples_idxs, input_samples_idxs, \
+                    mover_idx, details_idx in zip(
+                        range(len(table['cls'])), table['cls'],
+                        samples_idxss, input_samples_idxss,
+                        table['mover'], table['details']):
+                if pos not in self.cache:
+                    cls = self.class_list[cls_name]
+                    obj = cls.__new__(cls)
+                    MoveChange.__init__(obj)
+
+                    if mover_idx >= 0:
+                        obj.mover = pathmovers.load(int(mover_idx))
+
+                    obj.samples = samples.positions_to_objects(samples_idxs)
+                    obj.input_samples = samples.positions_to_objects(
+                        input_samples_idxs)
+
+                    if details_idx >= 0:
+                        obj.details = details.positions_to_objects(
+                            [details_idx], lazy=True)[0]
+
+                    obj.__uuid__ = self.index.index(pos)
+                    self.cache[pos] = obj
+
+            for pos, subchanges_idxs in enumerate(subchanges_idxss):
+                if len(subchanges_idxs) > 0:
+                    self.load(pos).subchanges = \
+                        self.positions_to_objects(subchanges_idxs)
+
+            self._cached_all = True
+
     def _add_empty_to_cache(self, pos, uuid, cls_name, samples_idxs,
                             input_samples_idxs, mover_idx, details_idx):
 
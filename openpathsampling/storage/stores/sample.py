@@ -49,6 +49,7 @@ class SampleSetStore(VariableStore):
             list of sample indices
         """
 
+        self.storage.flush_writes()
         return self.variables['samples'][idx].tolist()
 
     def initialize(self):
@@ -111,6 +111,40 @@ class BaseSnapshotStore(IndexedObjectStore):
 
         return obj
 
+    def load_many(self, idxs):
+        """
+        Load several snapshots reading each feature in a single slab
+
+        Parameters
+        ----------
+        idxs : list of int
+            the indices of the snapshots in the snapshot wrapper store
+
+        Returns
+        -------
+        list of :obj:`openpathsampling.engines.BaseSnapshot`
+            the loaded snapshots in the order of `idxs`
+        """
+        n_idxs = []
+        for idx in idxs:
+            pos = idx / 2
+            if pos not in self.index:
+                raise KeyError(idx)
+
+            n_idxs.append(int(self.index[pos]))
+
+        objs = []
+        for _ in n_idxs:
+            obj = self._cls.__new__(self._cls)
+            self._cls.init_empty(obj)
+            objs.append(obj)
+
+        if objs:
+            self._get_many(n_idxs, objs)
+
+        return [
+            obj.reversed if idx & 1 else obj for idx, obj in zip(idxs, objs)]
+
     def _load(self, idx):
         """
         Load a snapshot from the storage.
@@ -172,6 +206,62 @@ class BaseSnapshotStore(IndexedObjectStore):
 
         return idx
 
+    def save_many(self, objs, idxs=None):
+        """
+        Save several snapshots at once at consecutive positions
+
+        Parameters
+        ----------
+        objs : list of :class:`openpathsampling.engines.BaseSnapshot`
+            the snapshots to be saved
+        idxs : list of int
+            the indices of the snapshots in the snapshot wrapper store
+
+        Returns
+        -------
+        list of int
+            the indices of the snapshots
+        """
+        snapshots = []
+        positions = []
+        for obj, idx in zip(objs, idxs):
+            pos = idx / 2
+            if pos not in self.index:
+                # mark as saved so later duplicates are skipped
+                self.index.append(pos)
+                snapshots.append(obj)
+                positions.append(pos)
+
+        if not snapshots:
+            return idxs
+
+        n_idx = len(self.index) - len(snapshots)
+
+        logger.debug('Saving %d snapshots using IDX #%d - #%d' % (
+            len(snapshots), n_idx, n_idx + len(snapshots) - 1))
+
+        try:
+            self._save_many(snapshots, n_idx)
+            self.write_rows('index', n_idx, positions)
+
+            for pos, obj in enumerate(snapshots, n_idx):
+                self.cache[pos] = obj
+
+        except:
+            logger.debug('Problem saving %d - %d !' % (
+                n_idx, n_idx + len(snapshots) - 1))
+            # in case we did not succeed remove the marks as being saved
+            for pos in positions:
+                del self.index[pos]
+            raise
+
+        self._set_ids(n_idx, snapshots)
+
+        return idxs
+
+    def _save_many(self, snapshots, idx):
+        self._set_many(idx, snapshots)
+
     def _save(self, snapshot, idx):
         """
         Add the current state of the snapshot in the database.
@@ -200,6 +290,14 @@ class BaseSnapshotStore(IndexedObjectStore):
     def _set(self, idx, snapshot):
         pass
 
+    def _set_many(self, idx, snapshots):
+        for pos, snapshot in enumerate(snapshots, idx):
+            self._set(pos, snapshot)
+
+    def _get_many(self, idxs, snapshots):
+        for idx, snapshot in zip(idxs, snapshots):
+            self._get(idx, snapshot)
+
     def load_indices(self):
         self.index.extend(self.vars['index'])
 
@@ -228,4 +326,4 @@ class BaseSnapshotStore(IndexedObjectStore):
             return None
 
     def __len__(self):
-        return len(self.storage.dimensions[self.prefix]) * 2
+        return self.storage.dimension_length(self.prefix) * 2
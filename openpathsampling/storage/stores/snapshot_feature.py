@@ -25,10 +25,27 @@ class FeatureSnapshotStore(BaseSnapshotStore):
     def _set(self, idx, snapshot):
         [self.write(attr, idx, snapshot) for attr in self.storables]
 
+    def _set_many(self, idx, snapshots):
+        [self.write_many(attr, idx, snapshots) for attr in self.storables]
+
     def _get(self, idx, snapshot):
         [setattr(snapshot, attr, self.vars[attr][idx])
          for attr in self.storables]
 
+    def _get_many(self, idxs, snapshots):
+        left = min(idxs)
+        right = max(idxs) + 1
+        if right - left > 2 * len(idxs):
+            # scattered rows are cheaper to read one by one
+            return super(FeatureSnapshotStore, self)._get_many(
+                idxs, snapshots)
+
+        # read the range covering all rows once per feature
+        for attr in self.storables:
+            values = self.vars[attr][left:right]
+            for idx, snapshot in zip(idxs, snapshots):
+                setattr(snapshot, attr, values[idx - left])
+
     def initialize(self):
         super(FeatureSnapshotStore, self).initialize()
 
@@ -45,7 +45,7 @@ class SnapshotValueStore(ObjectStore):
         self.snapshot_pos = self.storage.stores['snapshots'].pos
 
     def __len__(self):
-        return len(self.variables['value'])
+        return len(self.vars['value'])
 
     # ==========================================================================
     # LOAD/SAVE DECORATORS FOR CACHE HANDLING
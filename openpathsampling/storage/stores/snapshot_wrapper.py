@@ -1,9 +1,13 @@
+import itertools
 import logging
+import multiprocessing.pool
 from uuid import UUID
 
+import numpy as np
+
 import openpathsampling.engines as peng
 from openpathsampling.netcdfplus import ObjectStore, with_timing_logging, \
-    NetCDFPlus, LoaderProxy
+    NetCDFPlus, LoaderProxy, LazyHashedList
 
 from snapshot_feature import FeatureSnapshotStore
 from snapshot_value import SnapshotValueStore
@@ -12,6 +16,15 @@ logger = logging.getLogger(__name__)
 init_log = logging.getLogger('openpathsampling.initialization')
 
 
+def _evaluate_cv(task):
+    # compute the values of a CV for a list of snapshots in a worker thread
+    cv, snapshots = task
+    if snapshots:
+        return cv._eval_dict(snapshots)
+    else:
+        return []
+
+
 class ReversalHashedList(dict):
     def __init__(self):
         dict.__init__(self)
@@ -64,10 +77,70 @@ class ReversalHashedList(dict):
             dict.__delitem__(self, k)
 
 
+class LazyReversalHashedList(LazyHashedList):
+    """
+    A drop-in for :class:`ReversalHashedList` that keeps uuids in the file
+
+    See :class:`openpathsampling.netcdfplus.LazyHashedList`
+    """
+
+    def _disk_keys(self, hi, lo, rows):
+        one = np.uint64(1)
+        return hi, lo & ~one, 2 * rows ^ (lo & one).astype(np.int64)
+
+    def __len__(self):
+        return (self._size + len(self._list)) * 2
+
+    def append(self, key):
+        self._added[key & ~1] = \
+            (self._size + len(self._list)) * 2 ^ (key & 1)
+        self._list.append(key)
+
+    def __setitem__(self, key, value):
+        self._added[key & ~1] = value ^ (key & 1)
+        row = value / 2
+        if row >= self._size:
+            self._list[row - self._size] = key ^ (value & 1)
+
+    def get(self, key, d=None):
+        uu = self._lookup(key & ~1)
+        if uu is not None:
+            return uu ^ (key & 1)
+        else:
+            return d
+
+    def __getitem__(self, key):
+        uu = self._lookup(key & ~1)
+        if uu is None:
+            raise KeyError(key)
+
+        return uu ^ (key & 1)
+
+    def __contains__(self, key):
+        return self._lookup(key & ~1) is not None
+
+    def index(self, key):
+        return self._row_uuid(key / 2) ^ (key & 1)
+
+    def mark(self, key):
+        k = key & ~1
+        if k not in self:
+            self._added[k] = -2
+
+    def unmark(self, key):
+        k = key & ~1
+        if k in self._added:
+            del self._added[k]
+
+
 class SnapshotWrapperStore(ObjectStore):
     """
     A Store to store arbitrary snapshots
     """
+
+    # number of chunks computed at once by `complete_cv` with a pool
+    parallel_cv_chunks = 16
+
     def __init__(self):
         super(SnapshotWrapperStore, self).__init__(
             peng.BaseSnapshot,
@@ -194,8 +267,12 @@ class SnapshotWrapperStore(ObjectStore):
 
         return obj
 
+    def _store_idx(self, n_idx):
+        # read the raw index, queued writes are answered by the variable
+        return int(self.vars['store'].variable[n_idx / 2])
+
     def _load(self, idx):
-        store_idx = int(self.variables['store'][idx / 2])
+        store_idx = self._store_idx(idx)
 
         if store_idx < 0:
             # print store_idx, self.storage, self.name, idx
@@ -213,7 +290,7 @@ class SnapshotWrapperStore(ObjectStore):
             return snap
 
     def __len__(self):
-        return len(self.storage.dimensions[self.prefix]) * 2
+        return self.storage.dimension_length(self.prefix) * 2
 
     def initialize(self):
         super(SnapshotWrapperStore, self).initialize()
@@ -241,7 +318,7 @@ class SnapshotWrapperStore(ObjectStore):
 
         store = FeatureSnapshotStore(descriptor)
 
-        store_idx = int(len(self.storage.dimensions['snapshottype']))
+        store_idx = self.storage.dimension_length('snapshottype')
         store_name = 'snapshot' + str(store_idx)
         self.storage.register_store(store_name, store, False)
 
@@ -292,7 +369,10 @@ class SnapshotWrapperStore(ObjectStore):
 
     @with_timing_logging
     def load_indices(self):
-        self.index.extend(self.vars['uuid'][:])
+        if self.storage.lazy_index:
+            self.index = self.create_lazy_uuid_index()
+        else:
+            self.index.extend(self.vars['uuid'][:])
 
     def get_cv_cache(self, idx):
         store_name = SnapshotWrapperStore._get_cv_name(idx)
@@ -329,8 +409,8 @@ class SnapshotWrapperStore(ObjectStore):
 
         if n_idx is not None:
             # snapshot is mentioned
-            store_idx = int(self.variables['store'][n_idx / 2])
-            if not store_idx == -1:
+            store_idx = self._store_idx(n_idx)
+            if store_idx >= 0:
                 # and stored
                 return self.reference(obj)
 
@@ -369,6 +449,93 @@ class SnapshotWrapperStore(ObjectStore):
 
         return self.reference(obj)
 
+    def save_many(self, objs):
+        """
+        Save several snapshots at once
+
+        New snapshots are stored in a contiguous range of indices and each
+        variable (store indices, uuids and the features of the snapshots) is
+        written in a single slab. Missing snapshot types are registered
+        first if `treat_missing_snapshot_type` allows it. Only proxies,
+        mentioned or already stored snapshots and snapshots of types that
+        cannot be added are passed on to `save`.
+
+        Parameters
+        ----------
+        objs : list of :class:`openpathsampling.engines.BaseSnapshot`
+            the snapshots to be stored
+
+        Returns
+        -------
+        list
+            the references of the stored snapshots
+        """
+        new = []
+        saved = set()
+
+        if not self.only_mention:
+            for obj in objs:
+                if obj is None or type(obj) is LoaderProxy:
+                    continue
+
+                uuid = obj.__uuid__
+                if uuid in saved or uuid in self.index or \
+                        (uuid ^ 1) in self.index or \
+                        not isinstance(obj, self.content_class):
+                    continue
+
+                descriptor = obj.engine.descriptor
+                if descriptor not in self.type_list:
+                    if self._can_add_type():
+                        self.add_type(descriptor)
+                    else:
+                        continue
+
+                saved.add(uuid)
+                saved.add(uuid ^ 1)
+                new.append(obj)
+
+        if new:
+            n_idx = len(self.index)
+            self.index.extend([obj.__uuid__ for obj in new])
+
+            store_idxs = []
+            by_store = {}
+            for pos, obj in enumerate(new):
+                store, store_idx = self.type_list[obj.engine.descriptor]
+                store_idxs.append(store_idx)
+                objs_idxs = by_store.setdefault(store_idx, (store, [], []))
+                objs_idxs[1].append(obj)
+                objs_idxs[2].append(n_idx + 2 * pos)
+
+            self.write_rows('store', n_idx / 2, store_idxs)
+
+            for store, store_objs, store_obj_idxs in by_store.values():
+                store.save_many(store_objs, store_obj_idxs)
+
+            for pos, obj in enumerate(new):
+                self._auto_complete_single_snapshot(obj, n_idx + 2 * pos)
+                self.cache[n_idx + 2 * pos] = obj
+
+            self._set_ids(n_idx, new)
+
+        refs = []
+        for obj in objs:
+            if obj is None:
+                refs.append(None)
+            elif type(obj) is not LoaderProxy and obj.__uuid__ in saved:
+                refs.append(self.reference(obj))
+            else:
+                refs.append(self.save(obj))
+
+        return refs
+
+    def _can_add_type(self):
+        mode = self.treat_missing_snapshot_type
+        return mode == 'create' or (
+            mode == 'single' and
+            self.storage.dimension_length('snapshottype') == 0)
+
     def _save(self, obj, n_idx):
         try:
             store, store_idx = self.type_list[obj.engine.descriptor]
@@ -379,10 +546,7 @@ class SnapshotWrapperStore(ObjectStore):
 
         except KeyError:
             # there is no store yet to handle the given type of snapshot
-            mode = self.treat_missing_snapshot_type
-            if mode == 'create' or \
-                    (mode == 'single' and
-                             len(self.storage.dimensions['snapshottype']) == 0):
+            if self._can_add_type():
                 # we just create space for it
                 store, store_idx = self.add_type(obj.engine.descriptor)
                 self.vars['store'][n_idx / 2] = store_idx
@@ -428,87 +592,296 @@ class SnapshotWrapperStore(ObjectStore):
                         cv_store.vars['value'][n_idx] = value
                         cv_store.cache[n_idx] = value
 
-    def complete_cv(self, cv):
+    def _iter_uuids(self, chunksize=65536):
+        """
+        Iterate over `(position, uuid)` of all stored snapshot pairs
+
+        The uuids are read in chunks, so this works also for 10M+ stored
+        snapshots.
+        """
+        n_pairs = len(self) / 2
+        for left in range(0, n_pairs, chunksize):
+            right = min(n_pairs, left + chunksize)
+            for pos, uuid in enumerate(self.vars['uuid'][left:right], left):
+                yield pos, uuid
+
+    def _iter_missing_cv(self, cv_store):
+        """
+        Iterate over `(position, idx, reverse)` of all values missing in a store
+
+        `idx` is the index of the stored snapshot of the pair and `reverse`
+        is `True` if the value of its reversed snapshot is missing
+        """
+        for pair in range(len(self) / 2):
+            if cv_store.time_reversible:
+                if pair not in cv_store.index:
+                    yield pair, 2 * pair, False
+            else:
+                for pos in [2 * pair, 2 * pair + 1]:
+                    if pos not in cv_store.index:
+                        yield pos, 2 * pair, pos & 1 == 1
+
+    def _load_chunk(self, idxs):
+        """
+        Load several stored snapshots reading each feature only once
+
+        Cached snapshots are not loaded again. All others of the same
+        snapshot type are read in a single slab per feature.
+
+        Parameters
+        ----------
+        idxs : list of int
+            the even indices of the snapshots
+
+        Returns
+        -------
+        dict of int : :obj:`openpathsampling.engines.BaseSnapshot`
+            the snapshots by index. `None` for snapshots that are only
+            mentioned and cannot be loaded from a fallback
+        """
+        snapshots = {}
+        by_store = {}
+
+        self.storage.flush_writes()
+
+        for idx in idxs:
+            try:
+                snapshots[idx] = self.cache[idx]
+                continue
+            except KeyError:
+                try:
+                    snapshots[idx] = self.cache[idx ^ 1].reversed
+                    continue
+                except KeyError:
+                    pass
+
+            store_idx = self._store_idx(idx)
+            if store_idx < 0:
+                try:
+                    snapshots[idx] = self.load(idx)
+                except KeyError:
+                    snapshots[idx] = None
+            else:
+                by_store.setdefault(store_idx, []).append(idx)
+
+        for store_idx, store_idxs in by_store.items():
+            store = self.store_snapshot_list[store_idx]
+            for idx, obj in zip(store_idxs, store.load_many(store_idxs)):
+                self._get_id(idx, obj)
+                self.cache[idx] = obj
+                snapshots[idx] = obj
+
+        return snapshots
+
+    def _cv_chunks(self, cv, cv_store, chunksize):
+        """
+        Iterate over chunks of missing values of a CV
+
+        Returns `(positions, values, missing)` per chunk where `values` holds
+        the cached values or `None` and `missing` the snapshots for which the
+        value still needs to be computed
+        """
+        chunk = []
+        for missing in self._iter_missing_cv(cv_store):
+            chunk.append(missing)
+            if len(chunk) == chunksize:
+                yield self._prepare_cv_chunk(cv, chunk)
+                chunk = []
+
+        if chunk:
+            yield self._prepare_cv_chunk(cv, chunk)
+
+    def _prepare_cv_chunk(self, cv, chunk):
+        snapshots = self._load_chunk(
+            sorted(set(idx for pos, idx, reverse in chunk)))
+
+        positions = []
+        items = []
+        for pos, idx, reverse in chunk:
+            snapshot = snapshots[idx]
+            if snapshot is None:
+                continue
+
+            if reverse:
+                if snapshot._reversed is not None:
+                    snapshot = snapshot._reversed
+                else:
+                    snapshot = snapshot.reversed
+
+            positions.append(pos)
+            items.append(snapshot)
+
+        # get from cache first, this is fastest
+        values = [cv._cache_dict._get(snapshot) for snapshot in items]
+        missing = [
+            snapshot for snapshot, value in zip(items, values)
+            if value is None
+        ]
+
+        return positions, values, missing
+
+    def complete_cv(self, cv, chunksize=1024, pool=None):
         """
         Compute all missing values of a CV and store them
 
+        The missing values are computed in chunks of snapshots. The snapshots
+        of a chunk are read at once, all values that are not cached are
+        computed in a single call of the CV, so CVs with `cv_requires_lists`
+        get the whole chunk at once, and are written to the file as
+        contiguous ranges. Snapshots that are only mentioned are skipped.
 
         Parameters
         ----------
         cv : :obj:`openpathsampling.CollectiveVariable`
-
+        chunksize : int
+            the number of values computed and written at once
+        pool : object or `None`
+            a :class:`openpathsampling.engines.EngineProcessPool` that knows
+            the CV or a pool of threads with a `map` function like
+            `multiprocessing.pool.ThreadPool`. If given, the chunks are
+            computed in parallel while the snapshots are loaded and the
+            values written by the calling thread. `parallel_cv_chunks`
+            chunks are kept in memory at a time. The workers of an
+            `EngineProcessPool` get the CV by its uuid and only the snapshots
+            are sent to them. Other process pools are not supported, since
+            CVs can in general not be pickled. With a thread pool the CV
+            must be safe to call from several threads
 
         """
+        if isinstance(pool, multiprocessing.pool.Pool) and \
+                not isinstance(pool, multiprocessing.pool.ThreadPool):
+            raise ValueError(
+                'CVs cannot be sent to the workers of a '
+                '`multiprocessing.Pool`. Use a '
+                '`openpathsampling.engines.EngineProcessPool` instead.')
+
         if cv not in self.cv_list:
             return
 
         cv_store = self.cv_list[cv][0]
 
-        if cv_store.allow_incomplete:
+        if not cv_store.allow_incomplete:
             # for complete this does not make sense
+            return
+
+        chunks = self._cv_chunks(cv, cv_store, chunksize)
+
+        if pool is None:
+            n_parallel = 1
+        else:
+            n_parallel = self.parallel_cv_chunks
+
+        n_stored = 0
+        while True:
+            # only keep a few chunks in memory at a time
+            window = list(itertools.islice(chunks, n_parallel))
+            if not window:
+                break
+
+            if not cv._eval_dict:
+                # no way to compute, so store only what is cached
+                computed = [[] for _ in window]
+            elif pool is None:
+                computed = [
+                    cv._eval_dict(missing) if missing else []
+                    for positions, values, missing in window]
+            elif isinstance(pool, peng.EngineProcessPool):
+                computed = pool.evaluate_many([
+                    (cv, missing) for positions, values, missing in window])
+            else:
+                computed = pool.map(_evaluate_cv, [
+                    (cv, missing) for positions, values, missing in window])
 
-            # TODO: Make better looping over this to not have
-            # to load all the indices at once
-            # can be problematic for 10M+ stored snapshots
-            indices = self.vars['uuid'][:]
+            for (positions, values, missing), results in zip(window, computed):
+                results = iter(results)
+                values = [
+                    next(results, None) if value is None else value
+                    for value in values]
 
-            for pos, idx in enumerate(indices):
-                if not cv_store.time_reversible:
-                    pos *= 2
+                n_stored += self._write_cv_chunk(cv_store, positions, values)
 
-                proxy = None
+            logger.info(
+                'Completed CV `%s`: %d values stored' % (cv.name, n_stored))
 
-                if pos not in cv_store.index:
-                    # this value is not stored to go ahead
+    @staticmethod
+    def _write_cv_chunk(cv_store, positions, values):
+        """
+        Write the values of a chunk to a contiguous range of a partial store
+        """
+        stored = [
+            (pos, value) for pos, value in zip(positions, values)
+            if value is not None]
 
-                    proxy = self.storage.snapshots[idx]
+        if not stored:
+            return 0
 
-                    # get from cache first, this is fastest
-                    value = cv._cache_dict._get(proxy)
+        positions, values = zip(*stored)
 
-                    if value is None:
-                        # not in cache so compute it if possible
-                        if cv._eval_dict:
-                            value = cv._eval_dict([proxy])[0]
-                        else:
-                            value = None
+        n_idx = cv_store.free()
 
-                    if value is not None:
-                        n_idx = cv_store.free()
+        cv_store.write_rows('value', n_idx, values)
+        cv_store.write_rows('index', n_idx, positions)
 
-                        cv_store.vars['value'][n_idx] = value
-                        cv_store.vars['index'][n_idx] = pos
-                        cv_store.index[pos] = n_idx
-                        cv_store.cache[n_idx] = value
+        for n, (pos, value) in enumerate(stored, n_idx):
+            cv_store.index[pos] = n
+            cv_store.cache[n] = value
 
-                if not cv_store.time_reversible:
-                    pos += 1
-                    if pos not in cv_store.index:
-                        if proxy is None:
-                            proxy = self.storage.snapshots[idx]
+        return len(stored)
 
-                        if proxy._reversed is not None:
-                            proxy = proxy._reversed
-                        else:
-                            proxy = proxy.reversed
+    def cv_values(self, cv, positions):
+        """
+        Return the stored values of a CV for several snapshots at once
+
+        The values are read in a single read from the diskcache without
+        loading any snapshot.
+
+        Parameters
+        ----------
+        cv : :obj:`openpathsampling.CollectiveVariable`
+        positions : list of int
+            the indices of the snapshots in this store as returned by `pos`
+
+        Returns
+        -------
+        numpy.ndarray or `None`
+            the values in the order of `positions`. `None` if the CV has no
+            diskcache in this store, its values are not numeric or not all
+            values are stored
+        """
+        if cv not in self.cv_list or len(positions) == 0:
+            return None
 
-                        # get from cache first, this is fastest
-                        value = cv._cache_dict._get(proxy)
+        cv_store = self.cv_list[cv][0]
+        value = cv_store.vars['value']
 
-                        if value is None:
-                            # not in cache so compute it if possible
-                            if cv._eval_dict:
-                                value = cv._eval_dict([proxy])[0]
-                            else:
-                                value = None
+        if hasattr(value, 'var_vlen') or \
+                not isinstance(value.dtype, np.dtype) or \
+                value.dtype.kind not in 'biuf':
+            return None
+
+        rows = np.asarray(positions, dtype=np.int64)
 
-                        if value is not None:
-                            n_idx = cv_store.free()
+        if cv_store.time_reversible:
+            rows = rows / 2
 
-                            cv_store.vars['value'][n_idx] = value
-                            cv_store.vars['index'][n_idx] = pos
-                            cv_store.index[pos] = n_idx
-                            cv_store.cache[n_idx] = value
+        if cv_store.allow_incomplete:
+            index = cv_store.index
+            rows = np.array(
+                [index.get(row, -1) for row in rows.tolist()],
+                dtype=np.int64)
+        else:
+            rows[rows >= len(value)] = -1
+
+        if np.any(rows < 0):
+            return None
+
+        # read each row only once and in increasing order
+        unique, inverse = np.unique(rows, return_inverse=True)
+
+        self.storage.flush_writes()
+        data = np.asarray(cv_store.variables['value'][unique])[inverse]
+
+        return value.getter(data)
 
     def sync_cv(self, cv):
         """
@@ -532,7 +905,8 @@ class SnapshotWrapperStore(ObjectStore):
             # loop all objects in the fast CV cache
             for obj, value in cv._cache_dict.cache.iteritems():
                 if value is not None:
-                    pos = self.pos(obj)
+                    # bounded caches use the uuid as key
+                    pos = self.index.get(getattr(obj, '__uuid__', obj))
 
                     # if the snapshot is not saved, nothing we can do
                     if pos is None:
@@ -684,16 +1058,14 @@ class SnapshotWrapperStore(ObjectStore):
 
         store.initialize()
 
-        store_idx = int(len(self.storage.dimensions['cvcache']))
+        store_idx = self.storage.dimension_length('cvcache')
         self.cv_list[cv] = (store, store_idx)
         self.storage.vars['cvcache'][store_idx] = store
 
         # use the cache and function of the CV to fill the store when it is made
         if not allow_incomplete:
 
-            indices = self.vars['uuid'][:]
-
-            for pos, idx in enumerate(indices):
+            for pos, idx in self._iter_uuids():
 
                 proxy = LoaderProxy(self.storage.snapshots, idx)
                 value = cv._cache_dict._get(proxy)
@@ -715,6 +1087,9 @@ class SnapshotWrapperStore(ObjectStore):
     def create_uuid_index(self):
         return ReversalHashedList()
 
+    def create_lazy_uuid_index(self):
+        return LazyReversalHashedList(self.vars['uuid'])
+
     def _get_id(self, idx, obj):
         uuid = self.index.index(int(idx))
         obj.__uuid__ = uuid
@@ -724,6 +1099,9 @@ class SnapshotWrapperStore(ObjectStore):
     def _set_id(self, idx, obj):
         self.vars['uuid'][idx / 2] = obj.__uuid__
 
+    def _set_ids(self, idx, objs):
+        self.write_rows('uuid', idx / 2, [obj.__uuid__ for obj in objs])
+
     def idx(self, obj):
         """
         Return the index in this store for a given object
@@ -10,9 +10,14 @@ class TrajectoryStore(ObjectStore):
         return {}
 
     def _save(self, trajectory, idx):
-        self.vars['snapshots'][idx] = trajectory
         store = self.storage.snapshots
 
+        # store all new snapshots at once, so saving the list of snapshots
+        # only needs to look up their references
+        store.save_many(trajectory.as_proxies())
+
+        self.vars['snapshots'][idx] = trajectory
+
         for frame, snapshot in enumerate(trajectory.iter_proxies()):
             if type(snapshot) is not LoaderProxy:
                 loader = store.proxy(snapshot)
@@ -55,6 +60,45 @@ class TrajectoryStore(ObjectStore):
 
             self._cached_all = True
 
+    def cache_table(self):
+        """
+        Return the snapshot indices of all trajectories as numpy arrays
+
+        Returns
+        -------
+        dict of str : numpy.ndarray
+            `snapshots` holds the concatenated indices of the snapshots and
+            `snapshots_length` the length of each trajectory
+        """
+        self.storage.flush_writes()
+
+        table = {}
+        table['snapshots'], table['snapshots_length'] = \
+            self.storage.snapshots.ragged_reference_positions(
+                self.variables['snapshots'][:])
+
+        return table
+
+    def cache_all_from_table(self, table):
+        """
+        Fill the cache from a table created by `cache_table`
+
+        Parameters
+        ----------
+        table : dict of str : numpy.ndarray
+            the columns of the table
+        """
+        if not self._cached_all:
+            snapshots = self.storage.snapshots
+            rows = self.split_ragged(
+                table['snapshots'], table['snapshots_length'])
+
+            [self.add_single_to_cache(
+                i, snapshots.positions_to_objects(row, lazy=True))
+             for i, row in enumerate(rows)]
+
+            self._cached_all = True
+
     def add_single_to_cache(self, idx, snaps):
         """
         Add a single object to cache by json
@@ -94,6 +138,7 @@ class TrajectoryStore(ObjectStore):
         """
 
         # get the values
+        self.storage.flush_writes()
         return self.variables['snapshots'][idx].tolist()
 
     def iter_snapshot_indices(self):
@@ -1,4 +1,10 @@
+import os
+import time
+
+import numpy as np
+
 import openpathsampling as paths
+from openpathsampling.netcdfplus import LoaderProxy
 
 
 def split_md_storage(filename):
@@ -93,3 +99,295 @@ def join_md_storage(filename_main, filename_data=None):
     st_traj.close()
     st_main.close()
     st_to.close()
+
+
+def _iter_changes(change):
+    yield change
+    for subchange in change.subchanges:
+        for sub in _iter_changes(subchange):
+            yield sub
+
+
+def keep_active(step):
+    """
+    Default policy of `compact_storage`
+
+    Keeps the trajectories of the active sampleset of a step, which includes
+    all accepted samples, and the shooting points of the moves in the step.
+
+    Parameters
+    ----------
+    step : :obj:`openpathsampling.MCStep`
+
+    Returns
+    -------
+    list of :obj:`openpathsampling.Trajectory` or
+    :obj:`openpathsampling.engines.BaseSnapshot`
+    """
+    kept = [sample.trajectory for sample in step.active]
+
+    if step.change is not None:
+        for change in _iter_changes(step.change):
+            details = change.details
+            if details is not None:
+                snapshot = getattr(details, 'shooting_snapshot', None)
+                if snapshot is not None:
+                    kept.append(snapshot)
+
+    return kept
+
+
+def _step_trajectories(step):
+    samples = list(step.active)
+    if step.previous is not None:
+        samples.extend(step.previous)
+
+    if step.change is not None:
+        for change in _iter_changes(step.change):
+            samples.extend(change.samples)
+            samples.extend(change.input_samples)
+
+    return [sample.trajectory for sample in samples if sample is not None]
+
+
+def _loaded_snapshots(items):
+    snapshots = []
+    for item in items:
+        try:
+            snapshots.append(
+                item.__subject__ if type(item) is LoaderProxy else item)
+        except RuntimeWarning:
+            # the snapshot is only mentioned in the original file
+            pass
+
+    return snapshots
+
+
+def _copy_cv_values(cv_stores, snapshots):
+    for cv, cv_store in cv_stores.iteritems():
+        cache = cv._cache_dict.cache
+        for snapshot in snapshots:
+            value = cv_store.get(snapshot)
+            if value is not None:
+                cache[snapshot] = value
+
+
+def compact_storage(filename, filename_to, keep=None):
+    """
+    Copy a storage and drop the snapshots that are not needed
+
+    All MC steps and the objects they reference are copied, but only the
+    snapshots selected by `keep` are stored in full. All other snapshots,
+    mostly those of rejected trial trajectories, are only mentioned, i.e.
+    stored by uuid without coordinates. Trajectories and snapshots that are
+    not referenced from any step are dropped.
+
+    Stored values of CVs are copied from the diskcaches of the original file
+    and not recomputed, except for snapshots that are only mentioned in the
+    original file. uuids are kept, while indices are reassigned in the
+    order the objects are copied. Named objects like ensembles, networks
+    and move schemes as well as all tags are copied.
+
+    Parameters
+    ----------
+    filename : str
+        the file to be compacted
+    filename_to : str
+        the file to be created
+    keep : function or `None`
+        the policy `keep(step)` that returns a list of trajectories or
+        snapshots of a step that are to be stored in full. If `None`
+        (default) then `keep_active` is used which keeps the active
+        samplesets and the shooting points.
+
+    """
+    if keep is None:
+        keep = keep_active
+
+    st_from = paths.Storage(filename=filename, mode='r')
+    st_to = paths.Storage(filename=filename_to, mode='w')
+
+    cvs = list(st_from.cvs)
+    steps = list(st_from.steps)
+
+    # remember the diskcaches of the original. Saving a CV will attach the
+    # diskcache in the new file
+    cv_stores = {
+        cv: st_from.cvs.cache_store(cv)
+        for cv in cvs if st_from.cvs.has_cache(cv)
+    }
+
+    for cv in cvs:
+        if cv.diskcache_enabled and cv.diskcache_template is None:
+            cv.diskcache_template = st_from.snapshots[0]
+
+    map(st_to.cvs.save, cvs)
+
+    # store all snapshots to be kept in full
+    kept = []
+    for step in steps:
+        for obj in keep(step):
+            if isinstance(obj, paths.Trajectory):
+                snapshots = list(obj)
+            else:
+                snapshots = [obj]
+
+            _copy_cv_values(cv_stores, snapshots)
+
+            if isinstance(obj, paths.Trajectory):
+                st_to.trajectories.save(obj)
+            else:
+                st_to.snapshots.save(obj)
+
+            kept.extend(snapshots)
+
+    # partial diskcaches are filled from the cache, so the kept snapshots
+    # must still be alive here
+    st_to.cvs.sync_all()
+    del kept
+
+    # this will tell the storage not to save snapshots only a reference
+    st_to.snapshots.only_mention = True
+
+    for step in steps:
+        snapshots = _loaded_snapshots(
+            snapshot
+            for trajectory in _step_trajectories(step)
+            for snapshot in trajectory.iter_proxies()
+        )
+        _copy_cv_values(cv_stores, snapshots)
+        st_to.steps.save(step)
+
+        # values of snapshots not in the new file are skipped
+        st_to.cvs.sync_all()
+        del snapshots
+
+    for storage_name in [
+        'pathmovers', 'topologies', 'networks',
+        'shootingpointselectors', 'engines', 'volumes',
+        'ensembles', 'transitions', 'pathsimulators', 'interfacesets',
+        'msouters', 'schemes'
+    ]:
+        map(
+            getattr(st_to, storage_name).save,
+            getattr(st_from, storage_name)
+        )
+
+    for name, obj in st_from.tag.iteritems():
+        st_to.tag[name] = obj
+
+    st_to.close()
+    st_from.close()
+
+
+def _rate(count, elapsed):
+    return count / max(elapsed, 1e-9)
+
+
+def benchmark_chunking(
+        filename, policies, n_frames=1000, n_atoms=1000, block=100,
+        n_random=100):
+    """
+    Measure coordinate throughput of chunking policies
+
+    For each policy a storage of `n_frames` toy snapshots with `n_atoms`
+    atoms is written in trajectories of `block` frames. Then the coordinates
+    are read in blocks of frames (sequential), as `n_random` single frames
+    (random) and as the coordinates of a single atom in all frames (atom).
+
+    Parameters
+    ----------
+    filename : str
+        the file to be used. It is overwritten for each policy and removed
+        in the end
+    policies : dict of str : :class:`openpathsampling.netcdfplus.ChunkingPolicy`
+        the policies to be compared by name. `None` uses the default layout.
+        The policies are applied to coordinates and velocities
+    n_frames : int
+        the number of frames to be stored
+    n_atoms : int
+        the number of atoms of each frame
+    block : int
+        the number of frames per saved trajectory and per sequential read
+    n_random : int
+        the number of single frames read at random
+
+    Returns
+    -------
+    dict of str : dict of str : float
+        for each policy the throughput in frames per second for `append`,
+        `sequential`, `random` and `atom`
+    """
+    import openpathsampling.engines.toy as toys
+
+    topology = toys.Topology(
+        n_spatial=3,
+        masses=np.ones(n_atoms),
+        pes=None,
+        n_atoms=n_atoms
+    )
+    engine = toys.Engine({}, topology)
+
+    random = np.random.RandomState(0)
+
+    snapshots = [
+        toys.Snapshot(
+            coordinates=random.random_sample((n_atoms, 3)),
+            velocities=random.random_sample((n_atoms, 3)),
+            engine=engine
+        ) for _ in range(n_frames)
+    ]
+
+    results = {}
+
+    for name, policy in policies.items():
+        if policy is None:
+            chunking = {}
+        else:
+            chunking = {'coordinates': policy, 'velocities': policy}
+
+        storage = paths.Storage(filename, 'w', chunking=chunking)
+
+        start = time.time()
+        for left in range(0, n_frames, block):
+            storage.trajectories.save(
+                paths.Trajectory(snapshots[left:left + block]))
+
+        storage.sync()
+        append = time.time() - start
+        storage.close()
+
+        storage = paths.Storage(filename, 'r')
+
+        # read the netCDF variable directly to measure only the layout
+        variable = storage.variables['snapshot0_coordinates']
+
+        start = time.time()
+        for left in range(0, n_frames, block):
+            variable[left:left + block]
+
+        sequential = time.time() - start
+
+        start = time.time()
+        for idx in random.randint(0, n_frames, n_random):
+            variable[idx]
+
+        random_access = time.time() - start
+
+        start = time.time()
+        variable[:, random.randint(0, n_atoms), :]
+        atom = time.time() - start
+
+        storage.close()
+
+        results[name] = {
+            'append': _rate(n_frames, append),
+            'sequential': _rate(n_frames, sequential),
+            'random': _rate(n_random, random_access),
+            'atom': _rate(n_frames, atom)
+        }
+
+    if os.path.isfile(filename):
+        os.remove(filename)
+
+    return results
@@ -120,6 +120,76 @@ class testVolumeInterfaceSet(object):
     def test_bad_new_interface(self):
         self.weird_set.new_interface(0.25)
 
+    def test_interface_index(self):
+        traj = make_1d_traj([-0.2, -0.05, 0.0, 0.05, 0.1, 0.2])
+        assert_equal([self.increasing_set.interface_index(s) for s in traj],
+                     [0, 0, 0, 1, 1, 2])
+        assert_equal([self.decreasing_set.interface_index(s) for s in traj],
+                     [2, 1, 0, 0, 0, 0])
+        assert_equal([self.weird_set.interface_index(s) for s in traj],
+                     [1, 0, 0, 0, 0, 1])
+
+    def test_volumes_use_interface_index(self):
+        traj = make_1d_traj([-0.2, -0.05, 0.0, 0.05, 0.1, 0.2])
+        for iface_set in [self.increasing_set, self.decreasing_set]:
+            # the index is opt-in
+            assert_equal(iface_set.index_enabled, False)
+            for volume in iface_set:
+                assert_equal(volume.cache_enabled, False)
+            assert_equal(iface_set.enable_index(), iface_set)
+            assert_equal(iface_set.index_enabled, True)
+            for (i, volume) in enumerate(iface_set):
+                plain = paths.CVDefinedVolume(self.cv, volume.lambda_min,
+                                              volume.lambda_max)
+                for snap in traj:
+                    assert_equal(volume(snap), plain(snap))
+                assert_equal(volume.cache_hits, len(traj))
+
+            iface_set.disable_index()
+            assert_equal(iface_set.index_enabled, False)
+            for volume in iface_set:
+                assert_equal(volume.cache_enabled, False)
+
+    @raises(ValueError)
+    def test_enable_index_not_nested(self):
+        # the interfaces of the weird set are not nested
+        self.weird_set.enable_index()
+
+    def test_disable_cache_removes_index(self):
+        self.increasing_set.enable_index()
+        volume = self.increasing_set[1]
+        volume.disable_cache()
+        volume(make_1d_traj([0.0])[0])
+        assert_equal(volume.cache_hits, 0)
+        assert_equal(self.increasing_set.index_enabled, False)
+
+    def test_interface_index_keeps_result_cache(self):
+        volume = self.increasing_set[1]
+        volume.enable_cache()
+        user_cache = volume._result_cache
+        self.increasing_set.enable_index()
+        assert_equal(volume._result_cache.cache, user_cache)
+
+        traj = make_1d_traj([-0.2, 0.05, 0.2])
+        assert_equal([volume(snap) for snap in traj], [True, True, False])
+        for snap in traj:
+            assert_equal(user_cache[snap], volume(snap))
+
+    def test_interface_index_intersect_with(self):
+        state = paths.CVDefinedVolume(self.cv, -0.15, float("inf"))
+        iface_set = paths.VolumeInterfaceSet(cv=self.cv,
+                                             minvals=float("-inf"),
+                                             maxvals=[0.0, 0.1],
+                                             intersect_with=state)
+        traj = make_1d_traj([-0.2, -0.05, 0.05, 0.2])
+        assert_equal([iface_set.interface_index(s) for s in traj],
+                     [2, 0, 1, 2])
+        iface_set.enable_index()
+        for snap in traj:
+            assert_equal([vol(snap) for vol in iface_set],
+                         [-0.15 <= snap.xyz[0][0] <= 0.0,
+                          -0.15 <= snap.xyz[0][0] <= 0.1])
+
     def test_storage(self):
         import os
         fname = data_filename("interface_set_storage_test.nc")
@@ -164,6 +234,17 @@ class testPeriodicVolumeInterfaceSet(object):
         new_iface = self.increasing_set.new_interface(-140)
         expected = paths.PeriodicCVDefinedVolume(self.cv, 0.0, -140, -180, 180)
         assert_equal(new_iface, expected)
+
+    def test_interface_index(self):
+        traj = make_1d_traj([-170, -100, 0, 50, 120, 170])
+        assert_equal([self.increasing_set.interface_index(s) for s in traj],
+                     [2, 3, 0, 0, 1, 2])
+        self.increasing_set.enable_index()
+        for (i, volume) in enumerate(self.increasing_set):
+            for snap in traj:
+                assert_equal(volume(snap),
+                             self.increasing_set.interface_index(snap) <= i)
+            assert_equal(volume.cache_hits, len(traj))
     
     def test_storage(self):
         import os
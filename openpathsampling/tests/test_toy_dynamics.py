@@ -125,6 +125,42 @@ class testCombinations(object):
         assert_almost_equal(self.simpletest.kinetic_energy(self), 0.4575)
 
 
+class testBatchedPES(object):
+    def setUp(self):
+        self.positions = np.array([init_pos, init_pos[::-1], [0.1, -0.2]])
+        self.velocities = np.array([init_vel, init_vel[::-1], [0.3, 0.0]])
+        self.mass = sys_mass
+        self.pes = gaussian + outer - linear + harmonic
+
+    def _single(self, i):
+        class Single(object):
+            pass
+        single = Single()
+        single.positions = self.positions[i]
+        single.velocities = self.velocities[i]
+        single.mass = self.mass
+        return single
+
+    def test_V(self):
+        batch = self.pes.V(self)
+        assert_equal(batch.shape, (3,))
+        for i in range(3):
+            assert_almost_equal(batch[i], self.pes.V(self._single(i)))
+
+    def test_dVdx(self):
+        batch = self.pes.dVdx(self)
+        assert_equal(batch.shape, (3, 2))
+        for i in range(3):
+            np.testing.assert_allclose(batch[i],
+                                       self.pes.dVdx(self._single(i)))
+
+    def test_kinetic_energy(self):
+        batch = self.pes.kinetic_energy(self)
+        for i in range(3):
+            assert_almost_equal(batch[i],
+                                self.pes.kinetic_energy(self._single(i)))
+
+
 # === TESTS FOR TOY ENGINE OBJECT =========================================
 
 class test_convert_fcn(object):
@@ -211,6 +247,25 @@ class testToyEngine(object):
         else:
             raise RuntimeError('Did not raise MaxLength Error')
 
+    def test_generate_max_length(self):
+        self.sim.initialized = True
+        try:
+            self.sim.generate(self.sim.current_snapshot, [true_func],
+                              max_length=3)
+        except paths.engines.EngineMaxLengthError as e:
+            assert_equal(len(e.last_trajectory), 3)
+        else:
+            raise RuntimeError('Did not raise MaxLength Error')
+
+        # n_frames_max still applies if it is shorter
+        try:
+            self.sim.generate(self.sim.current_snapshot, [true_func],
+                              max_length=100)
+        except paths.engines.EngineMaxLengthError as e:
+            assert_equal(len(e.last_trajectory), self.sim.n_frames_max)
+        else:
+            raise RuntimeError('Did not raise MaxLength Error')
+
     def test_generate_n_frames(self):
         self.sim.initialized = True
         ens = paths.LengthEnsemble(4) # first snap plus n_frames
@@ -228,6 +283,93 @@ class testToyEngine(object):
             assert_items_equal(s1.coordinates[0], s2.coordinates[0])
             assert_items_equal(s1.velocities[0], s2.velocities[0])
 
+    def test_generate_block_mode(self):
+        calls = []
+
+        def x_values(snapshots):
+            calls.append(len(snapshots))
+            return [snap.coordinates[0][0] for snap in snapshots]
+
+        orig = self.sim.current_snapshot.copy()
+        self.sim.options['n_frames_max'] = 50
+        trajs = []
+        for block_size in [1, 7]:
+            del calls[:]
+            cv = paths.FunctionCV('x', x_values, cv_requires_lists=True)
+            ens = paths.AllInXEnsemble(
+                paths.CVDefinedVolume(cv, float("-inf"), 0.75))
+            self.sim.options['block_size'] = block_size
+            self.sim.current_snapshot = orig
+            trajs.append(self.sim.generate(orig, [ens.can_append]))
+            if block_size > 1:
+                # the first call is the check of the initial frame
+                assert_equal(calls[1], block_size)
+
+            # frames generated past the stop are discarded
+            last = trajs[-1][-1]
+            assert_items_equal(self.sim.current_snapshot.coordinates[0],
+                               last.coordinates[0])
+            assert_items_equal(self.sim.current_snapshot.velocities[0],
+                               last.velocities[0])
+
+        assert_equal(len(trajs[0]), len(trajs[1]))
+        for (s1, s2) in zip(trajs[0], trajs[1]):
+            assert_items_equal(s1.coordinates[0], s2.coordinates[0])
+            assert_items_equal(s1.velocities[0], s2.velocities[0])
+
+    def test_generate_batch(self):
+        ens = paths.LengthEnsemble(4)
+        orig = self.sim.current_snapshot.copy()
+        other = toy.Snapshot(coordinates=np.array([[0.1, 0.2]]),
+                             velocities=np.array([[-0.3, 0.4]]),
+                             engine=self.sim)
+        trajs = self.sim.generate_batch([orig, other], [ens.can_append])
+        assert_equal(len(trajs), 2)
+        for (init, traj) in zip([orig, other], trajs):
+            assert_equal(len(traj), 4)
+            assert_equal(traj[0], init)
+            self.sim.current_snapshot = init
+            single = self.sim.generate(init, [ens.can_append])
+            for (s1, s2) in zip(traj, single):
+                np.testing.assert_allclose(s1.coordinates, s2.coordinates)
+                np.testing.assert_allclose(s1.velocities, s2.velocities)
+
+    def test_generate_batch_backward(self):
+        ens = paths.LengthEnsemble(3)
+        orig = self.sim.current_snapshot.copy()
+        traj = self.sim.generate_batch([orig], [ens.can_prepend],
+                                       direction=-1)[0]
+        assert_equal(len(traj), 3)
+        assert_equal(traj[-1], orig)
+        single = self.sim.generate(orig, [ens.can_prepend], direction=-1)
+        for (s1, s2) in zip(traj, single):
+            np.testing.assert_allclose(s1.coordinates, s2.coordinates)
+            np.testing.assert_allclose(s1.velocities, s2.velocities)
+
+    def test_generate_batch_max_length(self):
+        orig = self.sim.current_snapshot.copy()
+        try:
+            self.sim.generate_batch([orig, orig.copy()], [true_func])
+        except paths.engines.EngineMaxLengthError as e:
+            assert_equal(len(e.last_trajectory), self.sim.n_frames_max)
+        else:
+            raise RuntimeError('Did not raise MaxLength Error')
+
+    def test_generate_batch_nan(self):
+        ens = paths.LengthEnsemble(4)
+        orig = self.sim.current_snapshot.copy()
+        broken = toy.Snapshot(coordinates=np.array([[0.1, 0.2]]),
+                              velocities=np.array([[float('nan'), 0.4]]),
+                              engine=self.sim)
+        for on_nan in ['fail', 'retry']:
+            self.sim.options['on_nan'] = on_nan
+            try:
+                self.sim.generate_batch([orig, broken], [ens.can_append])
+            except paths.engines.EngineNaNError:
+                pass
+            else:
+                raise RuntimeError('Did not raise NaN Error')
+
     def test_start_with_snapshot(self):
         snap = toy.Snapshot(coordinates=np.array([1,2]),
                         velocities=np.array([3,4]))
@@ -6,6 +6,7 @@ from test_helpers import data_filename, assert_close_unit
 
 import mdtraj as md
 import numpy as np
+from nose.tools import assert_raises
 
 import openpathsampling.collectivevariable as op
 import openpathsampling.engines.openmm as peng
@@ -58,6 +59,146 @@ class test_FunctionCV(object):
             md_dihed.reshape(md_dihed.shape[:-1]),
             my_dihed, rtol=10 ** -6, atol=10 ** -10)
 
+    def test_shared_mdtraj_conversion(self):
+        psi_op = op.MDTrajFunctionCV(
+            "psi",
+            md.compute_dihedrals,
+            topology=self.topology,
+            indices=[[6, 8, 14, 16]])
+
+        phi_op = op.MDTrajFunctionCV(
+            "phi",
+            md.compute_dihedrals,
+            topology=self.topology,
+            indices=[[4, 6, 8, 14]])
+
+        paths.shared_intermediates.clear()
+        misses = paths.shared_intermediates.misses
+
+        psi_op(self.traj_topology)
+        phi_op(self.traj_topology)
+
+        # the mdtraj trajectory was only created once
+        assert (paths.shared_intermediates.misses == misses + 1)
+
+        md_phi = md.compute_dihedrals(self.mdtraj, indices=[[4, 6, 8, 14]])
+        np.testing.assert_allclose(
+            md_phi.reshape(md_phi.shape[:-1]),
+            phi_op(self.traj_topology), rtol=10 ** -6, atol=10 ** -10)
+
+    def test_shared_mdtraj_conversion_copies(self):
+        conversion = paths.MDTrajConversion(self.topology.mdtraj)
+
+        paths.shared_intermediates.clear()
+        misses = paths.shared_intermediates.misses
+
+        t1 = conversion(self.traj_topology)
+        t2 = conversion(self.traj_topology)
+
+        # each caller gets its own coordinates of the shared conversion
+        assert (paths.shared_intermediates.misses == misses + 1)
+        assert (t1.topology is t2.topology)
+        t1.xyz += 1.0
+        np.testing.assert_allclose(t2.xyz, self.mdtraj.xyz, rtol=10 ** -6)
+
+        # results are returned as computed by the function
+        center_op = op.MDTrajFunctionCV(
+            "center",
+            lambda t: (t.xyz[:, 0], t.n_frames),
+            topology=self.topology,
+            cv_requires_lists=True,
+            cv_wrap_numpy_array=False,
+            cv_scalarize_numpy_singletons=False)
+
+        assert (type(center_op._eval(self.traj_topology)) is tuple)
+
+    def test_mdtraj_function_atom_indices(self):
+        atom_pairs = [[0, 1], [10, 14]]
+        distance_op = op.MDTrajFunctionCV(
+            "distances",
+            md.compute_distances,
+            topology=self.topology,
+            atom_indices=[14, 0, 10, 1],
+            atom_pairs=atom_pairs)
+
+        # the kwargs are given for the full system
+        assert (distance_op.kwargs['atom_pairs'] == atom_pairs)
+
+        md_distances = md.compute_distances(self.mdtraj, atom_pairs)
+        np.testing.assert_allclose(
+            md_distances, distance_op(self.traj_topology),
+            rtol=10 ** -6, atol=10 ** -10)
+
+        dct = distance_op.to_dict()
+        assert (dct['atom_indices'] == [14, 0, 10, 1])
+        copied = op.MDTrajFunctionCV.from_dict(dct)
+        np.testing.assert_allclose(
+            md_distances, copied(self.traj_topology),
+            rtol=10 ** -6, atol=10 ** -10)
+
+        # all atoms of the kwargs must be part of the subset
+        assert_raises(
+            ValueError, op.MDTrajFunctionCV, "distances",
+            md.compute_distances, topology=self.topology,
+            atom_indices=[0, 1], atom_pairs=atom_pairs)
+
+    def test_shared_intermediates_per_thread(self):
+        import threading
+
+        intermediate = paths.CoordinateSlice([0, 1])
+
+        paths.shared_intermediates.clear()
+        misses = paths.shared_intermediates.misses
+        intermediate(self.traj_topology)
+
+        thread_misses = []
+
+        def compute():
+            intermediate(self.traj_topology)
+            thread_misses.append(paths.shared_intermediates.misses)
+
+        thread = threading.Thread(target=compute)
+        thread.start()
+        thread.join()
+
+        # the thread computed its own result with its own counters
+        assert (thread_misses == [1])
+        assert (paths.shared_intermediates.misses == misses + 1)
+
+    def test_mdtraj_conversion_subset(self):
+        atoms = [6, 8, 14, 16]
+        conversion = paths.MDTrajConversion(
+            self.topology.mdtraj, atom_indices=atoms)
+
+        t = conversion(self.traj_topology)
+        assert (t.xyz.shape == (len(self.traj_topology), len(atoms), 3))
+        assert (t.topology.n_atoms == len(atoms))
+        np.testing.assert_allclose(t.xyz, self.mdtraj.xyz[:, atoms])
+
+        # the topology of the subset is shared between calls
+        t2 = conversion(self.traj_topology[:2])
+        assert (t2.topology is t.topology)
+        np.testing.assert_allclose(t2.xyz, self.mdtraj.xyz[:2, atoms])
+
+    def test_mdtraj_conversion_buffers(self):
+        topology = self.topology.mdtraj
+        conversion = paths.MDTrajConversion(topology, atom_indices=[6, 8])
+
+        # the key keeps the topology and compares it by identity
+        assert (conversion.key() ==
+                paths.MDTrajConversion(topology, [6, 8]).key())
+        assert (conversion.key() !=
+                paths.MDTrajConversion(topology.copy(), [6, 8]).key())
+
+        # only the most recently used buffers are kept
+        limit = paths.MDTrajConversion.buffer_limit
+        for atom in range(limit + 2):
+            paths.MDTrajConversion(topology, atom_indices=[atom]).compute(
+                self.traj_topology)
+
+        buffers = paths.MDTrajConversion._thread_buffers()
+        assert (len(buffers) == limit)
+
     def test_atom_pair_featurizer(self):
         """ Create an atom pair collectivevariable using MSMSBuilder3 """
 
@@ -259,6 +400,173 @@ class test_FunctionCV(object):
             if os.path.isfile(fname):
                 os.remove(fname)
 
+    def test_values_for(self):
+        fname = data_filename("cv_storage_test.nc")
+        if os.path.isfile(fname):
+            os.remove(fname)
+
+        traj = paths.Trajectory(list(self.traj_simple))
+
+        storage_w = paths.Storage(fname, "w")
+        storage_w.trajectories.save(traj)
+
+        cv1 = paths.CoordinateFunctionCV(
+            'f1',
+            lambda snapshot: snapshot.coordinates[0]
+        ).with_diskcache()
+
+        storage_w.save(cv1)
+        storage_w.cvs.complete(cv1)
+
+        reversed_traj = traj.reversed
+        values = cv1.values_for(traj)
+        assert (values.shape[0] == len(traj))
+        for value, expected in zip(values, cv1(traj)):
+            assert_close_unit(value, expected)
+
+        for value, expected in zip(
+                cv1.values_for(reversed_traj), cv1(reversed_traj)):
+            assert_close_unit(value, expected)
+
+        storage_w.close()
+
+        if os.path.isfile(fname):
+            os.remove(fname)
+
+    def test_cache_limit(self):
+        fname = data_filename("cv_storage_test.nc")
+        if os.path.isfile(fname):
+            os.remove(fname)
+
+        traj = paths.Trajectory(list(self.traj_simple))
+
+        storage_w = paths.Storage(fname, "w")
+        storage_w.trajectories.save(traj)
+
+        cv1 = paths.CoordinateFunctionCV(
+            'f1',
+            lambda snapshot: snapshot.coordinates[0]
+        ).with_diskcache(
+            allow_incomplete=True
+        )
+
+        storage_w.save(cv1)
+        cv1.with_cache_limit(max_count=2, spill=True)
+
+        values = cv1(traj)
+
+        cache = cv1._cache_dict.cache
+        assert (len(cache) == 2)
+        assert (cache.evictions == len(traj) - 2)
+
+        # evicted values were written to the diskcache
+        store = storage_w.cvs.cache_store(cv1)
+        assert (len(store.vars['value']) == len(traj) - 2)
+
+        for value, expected in zip(cv1(traj), values):
+            assert_close_unit(value, expected)
+
+        image = storage_w.cache_image()
+        assert (image['cv_caches']['f1']['count'] == 2)
+        assert (image['cv_caches']['f1']['evictions'] == cache.evictions)
+
+        storage_w.close()
+
+        if os.path.isfile(fname):
+            os.remove(fname)
+
+    def test_storage_complete_parallel(self):
+        from multiprocessing.pool import ThreadPool
+
+        fname = data_filename("cv_storage_test.nc")
+        if os.path.isfile(fname):
+            os.remove(fname)
+
+        traj = paths.Trajectory(list(self.traj_simple))
+
+        storage_w = paths.Storage(fname, "w")
+        storage_w.trajectories.save(traj)
+
+        cv1 = paths.CoordinateFunctionCV(
+            'f1',
+            lambda snapshot: snapshot.coordinates[0]
+        ).with_diskcache(
+            allow_incomplete=True
+        )
+
+        storage_w.save(cv1)
+
+        store = storage_w.cvs.cache_store(cv1)
+        assert (len(store.vars['value']) == 0)
+
+        pool = ThreadPool(2)
+        storage_w.cvs.complete(cv1, chunksize=3, pool=pool)
+        pool.close()
+
+        assert (len(store.vars['value']) == len(traj))
+
+        for idx, value in zip(
+                store.variables['index'][:],
+                store.vars['value']):
+            snap = storage_w.snapshots[
+                storage_w.snapshots.vars['uuid'][idx]]
+
+            assert_close_unit(cv1(snap), value)
+
+        storage_w.close()
+
+        if os.path.isfile(fname):
+            os.remove(fname)
+
+    def test_storage_complete_process_pool(self):
+        from multiprocessing import Pool
+
+        fname = data_filename("cv_storage_test.nc")
+        if os.path.isfile(fname):
+            os.remove(fname)
+
+        traj = paths.Trajectory(list(self.traj_simple))
+
+        storage_w = paths.Storage(fname, "w")
+        storage_w.trajectories.save(traj)
+
+        cv1 = paths.CoordinateFunctionCV(
+            'f1',
+            lambda snapshot: snapshot.coordinates[0]
+        ).with_diskcache(
+            allow_incomplete=True
+        )
+
+        storage_w.save(cv1)
+
+        # the CV cannot be sent to the workers of a multiprocessing pool
+        pool = Pool(1)
+        assert_raises(
+            ValueError, storage_w.cvs.complete, cv1, chunksize=3, pool=pool)
+        pool.terminate()
+
+        store = storage_w.cvs.cache_store(cv1)
+        assert (len(store.vars['value']) == 0)
+
+        # the workers of an engine pool know the CV by its uuid
+        with paths.engines.EngineProcessPool(2, [cv1]) as pool:
+            storage_w.cvs.complete(cv1, chunksize=3, pool=pool)
+
+        assert (len(store.vars['value']) == len(traj))
+
+        for idx, value in zip(
+                store.variables['index'][:],
+                store.vars['value']):
+            snap = storage_w.snapshots[
+                storage_w.snapshots.vars['uuid'][idx]]
+
+            assert_close_unit(cv1(snap), value)
+
+        storage_w.close()
+
+        if os.path.isfile(fname):
+            os.remove(fname)
+
     def test_storage_sync(self):
         import os
 
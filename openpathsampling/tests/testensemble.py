@@ -1320,6 +1320,14 @@ class testTISEnsemble(EnsembleTest):
             failmsg = "Failure in "+test+"("+str(ttraj[test])+"): "
             self._single_test(test_f, ttraj[test], results[test], failmsg)
 
+    def test_collectivevariables(self):
+        assert_equal(self.tis.collectivevariables(), [op])
+        op2 = paths.FunctionCV("Id2", lambda snap : snap.coordinates[0][0])
+        vol4 = paths.CVDefinedVolume(op2, 0.0, 1.0)
+        ens = self.tis & AllInXEnsemble(vol4)
+        assert_equal(ens.collectivevariables(), [op, op2])
+        assert_equal(LengthEnsemble(3).collectivevariables(), [])
+
 class EnsembleCacheTest(EnsembleTest):
     def _was_cache_reset(self, cache):
         return cache.contents == { }
@@ -1420,6 +1428,60 @@ class testEnsembleCache(EnsembleCacheTest):
         self.rev.check(new_traj)
         assert_equal(self._was_cache_reset(self.rev), True)
 
+    def test_frame_results_survive_reset(self):
+        evaluated = []
+        def in_vol1(frame):
+            evaluated.append(frame)
+            return vol1(frame)
+
+        old_traj = self.traj[0:4]
+        self.fwd.check(old_traj)
+        for frame in old_traj.as_proxies():
+            self.fwd.frame_result(frame, in_vol1)
+        assert_equal(len(evaluated), 4)
+        # shares its first 3 frames with the old trajectory
+        new_traj = self.traj[0:3] + self.traj[4:6]
+        assert_equal(self.fwd.check(new_traj), True)
+        results = [self.fwd.frame_result(frame, in_vol1)
+                   for frame in new_traj.as_proxies()]
+        assert_equal(results, [vol1(frame) for frame in new_traj])
+        assert_equal(len(evaluated), 6)
+        # only results for the last trajectory before a reset are kept
+        self.fwd.check(self.traj[4:6])
+        self.fwd.check(self.traj[0:1])
+        self.fwd.frame_result(self.traj.get_as_proxy(0), in_vol1)
+        assert_equal(len(evaluated), 7)
+
+    def test_trusted_call_after_shooting(self):
+        ens = AllInXEnsemble(vol2)
+        traj = ttraj['upper_in_in_cross_in']
+        for i in range(1, len(traj) + 1):
+            assert_equal(ens.can_append(traj[:i], trusted=True),
+                         ens(traj[:i]))
+        # forward shot from frame 1: shared prefix, new final frames
+        trial = traj[:2] + ttraj['upper_in_out_in']
+        for i in range(2, len(trial) + 1):
+            assert_equal(ens.can_append(trial[:i], trusted=True),
+                         ens(trial[:i]))
+        # backward shot: shared suffix
+        trial = ttraj['upper_in_out'] + traj[2:]
+        for i in range(1, len(trial) + 1):
+            assert_equal(ens.can_prepend(trial[-i:], trusted=True),
+                         ens(trial[-i:]))
+
+    def test_trusted_call_part_in(self):
+        for ens in [PartInXEnsemble(vol1), PartOutXEnsemble(vol1)]:
+            for test in ['lower_out_in_out', 'upper_in_out_in',
+                         'lower_out_out', 'upper_in_in_cross_in']:
+                traj = ttraj[test]
+                for i in range(1, len(traj) + 1):
+                    assert_equal(ens(traj[:i], trusted=True),
+                                 ens(traj[:i]))
+            # a shot from frame 1 shares the first frames
+            trial = ttraj['lower_out_in_out'][:2] + ttraj['lower_out_out']
+            for i in range(2, len(trial) + 1):
+                assert_equal(ens(trial[:i], trusted=True), ens(trial[:i]))
+
 
 class testSequentialEnsembleCache(EnsembleCacheTest):
     def setUp(self):
@@ -2491,6 +2553,85 @@ class testEnsembleSplit(EnsembleTest):
         sub_traj = ensembleAXA.find_last_subtrajectory(traj3)
         assert(traj3.subtrajectory_indices(sub_traj) == [2,3,4])
 
+class testSequentialEnsembleAutomaton(EnsembleTest):
+    def setUp(self):
+        in_A = AllInXEnsemble(vol1)
+        out_A = AllOutXEnsemble(vol1)
+        self.ensembles = [
+            SequentialEnsemble([in_A, out_A, in_A]),
+            paths.TISEnsemble(vol1, vol3, vol2),
+            paths.MinusInterfaceEnsemble(vol1, vol2, 2),
+            SequentialEnsemble([
+                SingleFrameEnsemble(in_A),
+                OptionalEnsemble(out_A & AllInXEnsemble(vol2)),
+                PartOutXEnsemble(vol2) & LengthEnsemble(slice(2, 6)),
+                AllInXEnsemble(vol1 | vol3)
+            ])
+        ]
+        random.seed(5)
+        values = [0.0, 0.3, 0.6, 2.2]
+        self.trajs = [
+            make_1d_traj([random.choice(values) for i in range(length)])
+            for length in [1, 2, 5, 12, 20, 20]
+        ]
+        self.trajs += [ttraj[key] for key in sorted(ttraj.keys())[:20]]
+
+    def test_compile(self):
+        for ens in self.ensembles:
+            assert(ens.automaton is not None)
+
+        ens = SequentialEnsemble([
+            AllInXEnsemble(vol1), ExitsXEnsemble(vol1)
+        ])
+        assert_equal(ens.automaton, None)
+
+    def test_same_slices(self):
+        for ens in self.ensembles:
+            generic = ens.__class__.from_dict(ens.to_dict())
+            generic._use_automaton = False
+            assert_equal(generic.automaton, None)
+            for traj in self.trajs:
+                for kwargs in [{}, {'overlap': 0}, {'max_length': 3},
+                               {'min_length': 4}]:
+                    assert_equal(
+                        list(ens.iter_valid_slices(traj, **kwargs)),
+                        list(generic.iter_valid_slices(traj, **kwargs))
+                    )
+
+
+class testEvaluateArray(EnsembleTest):
+    def setUp(self):
+        in_A = AllInXEnsemble(vol1)
+        out_A = AllOutXEnsemble(vol1)
+        self.ensembles = [
+            in_A, out_A, PartInXEnsemble(vol1), PartOutXEnsemble(vol1),
+            in_A & LengthEnsemble(3), out_A | PartInXEnsemble(vol2 - vol1),
+            ~in_A, SingleFrameEnsemble(in_A), OptionalEnsemble(out_A),
+            SequentialEnsemble([in_A, out_A, in_A]),
+            paths.TISEnsemble(vol1, vol3, vol2),
+            paths.MinusInterfaceEnsemble(vol1, vol2, 2),
+            # these use the frame-by-frame fallback
+            ExitsXEnsemble(vol1),
+            SlicedTrajectoryEnsemble(in_A, slice(1, None)),
+            SequentialEnsemble([in_A, ExitsXEnsemble(vol1)])
+        ]
+
+    def test_evaluate_array(self):
+        for key in sorted(ttraj.keys()):
+            traj = ttraj[key]
+            masks = paths.VolumeMasks(traj)
+            for ens in self.ensembles:
+                assert_equal(ens.evaluate_array(traj, masks), ens(traj))
+                assert_equal(ens.evaluate_array(traj), ens(traj))
+
+    def test_masks_computed_once(self):
+        traj = ttraj['upper_in_out_in']
+        masks = paths.VolumeMasks(traj)
+        assert_equal(list(masks(vol1)), [True, False, True])
+        assert(masks(vol1) is masks(vol1))
+        assert_equal(len(masks), 3)
+
+
 class testVolumeCombinations(EnsembleTest):
     def setup(self):
         self.outA = paths.AllOutXEnsemble(vol1)
@@ -132,6 +132,16 @@ class testTwoWayShootingStrategy(MoveStrategyTestSetup):
             assert_equal(type(mover.selector), paths.UniformSelector)
             assert_equal(type(mover.modifier), paths.NoModification)
 
+    def test_make_movers_concurrent(self):
+        strategy = TwoWayShootingStrategy(modifier=paths.NoModification(),
+                                          concurrent=True)
+        scheme = MoveScheme(self.network)
+        movers = strategy.make_movers(scheme)
+        assert_equal(len(movers), 6)
+        for mover in movers:
+            assert_equal(type(mover), paths.ConcurrentTwoWayShootingMover)
+            assert_equal(type(mover.selector), paths.UniformSelector)
+
     def test_composition_with_default_scheme(self):
         strategy = TwoWayShootingStrategy(modifier=paths.NoModification())
         scheme = DefaultScheme(self.network, engine=None)
@@ -144,6 +154,43 @@ class testTwoWayShootingStrategy(MoveStrategyTestSetup):
             assert_equal(type(mover.modifier), paths.NoModification)
 
 
+class testConcurrentStrategy(MoveStrategyTestSetup):
+    def test_make_movers(self):
+        scheme = MoveScheme(self.network)
+        scheme.movers['shooting'] = OneWayShootingStrategy().make_movers(
+            scheme)
+        strategy = ConcurrentStrategy(n_workers=2)
+        movers = strategy.make_movers(scheme)
+        assert_equal(len(movers), 1)
+        assert_equal(type(movers[0]), paths.ConcurrentMover)
+        assert_equal(movers[0].movers, scheme.movers['shooting'])
+        assert_equal(movers[0].n_workers, 2)
+
+    def test_make_movers_shared_ensembles(self):
+        scheme = MoveScheme(self.network)
+        shooters = OneWayShootingStrategy().make_movers(scheme)
+        extra = paths.OneWayShootingMover(
+            ensemble=shooters[0].ensemble,
+            selector=paths.UniformSelector()
+        )
+        scheme.movers['shooting'] = shooters + [extra]
+        movers = ConcurrentStrategy().make_movers(scheme)
+        assert_equal(len(movers), 2)
+        assert_equal(movers[0].movers, shooters)
+        assert_equal(movers[1].movers, [extra])
+
+    def test_composition_with_default_scheme(self):
+        scheme = DefaultScheme(self.network, engine=None)
+        scheme.append(ConcurrentStrategy())
+        root = scheme.move_decision_tree()
+        assert_equal(len(scheme.movers['shooting']), 1)
+        concurrent = scheme.movers['shooting'][0]
+        assert_equal(type(concurrent), paths.ConcurrentMover)
+        assert_equal(len(concurrent.movers), 6)
+        assert_in(concurrent, scheme.choice_probability)
+        scheme.sanity_check()
+
+
 class testNearestNeighborRepExStrategy(MoveStrategyTestSetup):
     def test_make_movers(self):
         strategy = NearestNeighborRepExStrategy()
@@ -2,9 +2,12 @@
 @author: David W.H. Swenson
 '''
 
+import random
+
 from nose.plugins.skip import SkipTest
 from nose.tools import (assert_equal, assert_not_equal, assert_items_equal,
                         raises, assert_true, assert_in, assert_not_in)
+import numpy as np
 from numpy.testing import assert_allclose
 
 from openpathsampling.collectivevariable import FunctionCV
@@ -199,6 +202,72 @@ class testForwardShootMover(testShootingMover):
 
         assert_equal(mover.is_ensemble_change_mover, False)
 
+    def test_max_trial_length(self):
+        mover = ForwardShootMover(
+            ensemble=self.tps,
+            selector=UniformSelector(),
+            engine=self.toy_engine
+        )
+        full = mover._make_forward_trajectory(self.toy_traj, 10)
+        assert_equal(self.tps(full), True)
+        # a trial cut one frame after the limit is rejected by Metropolis
+        details = {}
+        cut = mover._make_forward_trajectory(self.toy_traj, 10,
+                                             max_trial_length=20,
+                                             details=details)
+        assert_equal(len(cut), 21)
+        assert_allclose(cut.xyz[:20], full.xyz[:20])
+        assert_equal(details['early_reject'], True)
+        # limits beyond the trial do not change it
+        details = {}
+        trial = mover._make_forward_trajectory(
+            self.toy_traj, 10, max_trial_length=len(full), details=details)
+        assert_equal(len(trial), len(full))
+        assert_equal(details['early_reject'], False)
+
+    def test_max_trial_length_retry(self):
+        # the early stop is no max length failure, so it is never retried
+        self.toy_engine.options['on_max_length'] = 'retry'
+        self.toy_engine.options['retries_when_max_length'] = 2
+        mover = ForwardShootMover(
+            ensemble=self.tps,
+            selector=UniformSelector(),
+            engine=self.toy_engine
+        )
+        full = mover._make_forward_trajectory(self.toy_traj, 10)
+        details = {}
+        cut = mover._make_forward_trajectory(self.toy_traj, 10,
+                                             max_trial_length=20,
+                                             details=details)
+        assert_equal(len(cut), 21)
+        assert_allclose(cut.xyz, full.xyz[:21])
+        assert_equal(details['early_reject'], True)
+
+        for i in range(5):
+            change = mover.move(self.toy_samp)
+            details = change.details
+            if details.early_reject:
+                assert_equal(change.accepted, False)
+
+    def test_move_predrawn_acceptance(self):
+        mover = ForwardShootMover(
+            ensemble=self.tps,
+            selector=UniformSelector(),
+            engine=self.toy_engine
+        )
+        for i in range(5):
+            change = mover.move(self.toy_samp)
+            details = change.details
+            assert_equal(change.accepted, details.metropolis_random <=
+                         details.metropolis_acceptance)
+            max_len = mover.selector.max_trial_length(
+                self.toy_traj, details.metropolis_random)
+            assert(len(change.trials[0].trajectory) <= max_len + 1)
+            assert_equal(change.accepted,
+                         len(change.trials[0].trajectory) <= max_len)
+            if details.early_reject:
+                assert_equal(len(change.trials[0].trajectory), max_len + 1)
+
 class testBackwardShootMover(testShootingMover):
     def test_move(self):
         mover = BackwardShootMover(
@@ -303,6 +372,76 @@ class testBackwardFirstTwoWayShootingMover(testForwardFirstTwoWayShootingMover):
     # runs the same tests as ForwardFirst
 
 
+class testConcurrentTwoWayShootingMover(testShootingMover):
+    def _check_run(self, mover):
+        traj, details = mover._run(self.init_samp[0].trajectory, 4)
+        assert_allclose(traj.xyz[:,0,0], [-0.1, 0.2, 0.4, 0.6, 0.8])
+        assert_equal(details.keys(), ['modified_shooting_snapshot'])
+        assert_equal(details['modified_shooting_snapshot'], traj[2])
+
+        traj, details = mover._run(self.init_samp[0].trajectory, 3)
+        assert_allclose(traj.xyz[:,0,0], [-0.1, 0.1, 0.3, 0.5, 0.7])
+        assert_equal(details['modified_shooting_snapshot'], traj[2])
+        assert_not_in(details['modified_shooting_snapshot'],
+                      self.init_samp[0].trajectory)
+
+    def test_run(self):
+        mover = ConcurrentTwoWayShootingMover(
+            ensemble=self.tps,
+            selector=UniformSelector(),
+            modifier=paths.NoModification(),
+            engine=self.dyn
+        )
+        assert_equal(mover.n_engine_workers(), 2)
+        # without a pool the halves are generated one after the other
+        self._check_run(mover)
+
+    def test_run_pool(self):
+        mover = ConcurrentTwoWayShootingMover(
+            ensemble=self.tps,
+            selector=UniformSelector(),
+            modifier=paths.NoModification(),
+            engine=self.dyn
+        )
+        pool = paths.engines.EngineProcessPool(2, [mover, self.dyn])
+        with pool, pool.use():
+            self._check_run(mover)
+        assert_equal(pool.is_running, False)
+
+    def test_run_toy(self):
+        mover = ConcurrentTwoWayShootingMover(
+            ensemble=self.tps,
+            selector=UniformSelector(),
+            modifier=paths.NoModification(),
+            engine=self.toy_engine
+        )
+        pool = paths.engines.EngineProcessPool(2, [mover, self.toy_engine])
+        with pool, pool.use():
+            change = mover.move(self.toy_samp)
+        assert_equal(change.accepted, True)
+        assert_in(change.details.modified_shooting_snapshot,
+                  change.trials[0].trajectory)
+        assert_in(change.details.shooting_snapshot,
+                  change.initial_trajectory)
+        self.toy_samp.apply_samples(change).sanity_check()
+
+    @raises(paths.engines.EngineMaxLengthError)
+    def test_run_max_length(self):
+        self.toy_engine.options['n_frames_max'] = 3
+        mover = ConcurrentTwoWayShootingMover(
+            ensemble=self.tps,
+            selector=UniformSelector(),
+            modifier=paths.NoModification(),
+            engine=self.toy_engine
+        )
+        try:
+            mover._run(self.toy_traj, 30)
+        except paths.engines.EngineMaxLengthError as e:
+            # both halves are part of the partial trajectory
+            assert_equal(len(e.last_trajectory), 5)
+            raise
+
+
 class testTwoWayShootingMover(testShootingMover):
     def test_properties(self):
         selector = UniformSelector()
@@ -861,6 +1000,111 @@ class testConditionalSequentialMover(testSequentialMover):
     def test_restricted_by_ensemble(self):
         raise SkipTest
 
+
+class testConcurrentMover(testShootingMover):
+    def setup(self):
+        super(testConcurrentMover, self).setup()
+        op = self.stateA.collectivevariable
+        self.stateA2 = CVDefinedVolume(op, -100, -0.001)
+        self.tps2 = ef.A2BEnsemble(self.stateA2, self.stateB)
+        self.shooter = ForwardShootMover(
+            ensemble=self.tps,
+            selector=UniformSelector(),
+            engine=self.toy_engine
+        )
+        self.shooter2 = BackwardShootMover(
+            ensemble=self.tps2,
+            selector=UniformSelector(),
+            engine=self.toy_engine
+        )
+        self.sample_set = SampleSet([
+            Sample(trajectory=self.toy_traj, replica=0, ensemble=self.tps),
+            Sample(trajectory=self.toy_traj, replica=1, ensemble=self.tps2)
+        ])
+
+    @raises(ValueError)
+    def test_shared_ensembles(self):
+        ConcurrentMover([self.shooter, ForwardShootMover(
+            ensemble=self.tps,
+            selector=UniformSelector(),
+            engine=self.toy_engine
+        )])
+
+    def test_n_workers(self):
+        mover = ConcurrentMover([self.shooter, self.shooter2])
+        assert_equal(mover.n_workers, 2)
+        assert_equal(mover.to_dict()['n_workers'], 2)
+
+    def _check_change(self, change):
+        assert_equal(len(change.subchanges), 2)
+        assert_equal(change.accepted, True)
+        assert_equal(change.subchanges[0].mover, self.shooter)
+        assert_equal(change.subchanges[1].mover, self.shooter2)
+        new_set = self.sample_set.apply_samples(change)
+        new_set.sanity_check()
+        traj = new_set[self.tps].trajectory
+        traj2 = new_set[self.tps2].trajectory
+        # forward shot keeps the start, backward shot keeps the end
+        assert_equal(traj[0], self.toy_traj[0])
+        assert_not_equal(traj[-1], self.toy_traj[-1])
+        assert_not_equal(traj2[0], self.toy_traj[0])
+        assert_equal(traj2[-1], self.toy_traj[-1])
+        for snap in traj + traj2:
+            assert_equal(snap.engine, self.toy_engine)
+
+    def test_move_serial(self):
+        mover = ConcurrentMover([self.shooter, self.shooter2], n_workers=0)
+        change = mover.move(self.sample_set)
+        assert_equal(mover._pool, None)
+        self._check_change(change)
+
+    def test_move(self):
+        mover = ConcurrentMover([self.shooter, self.shooter2])
+        try:
+            change = mover.move(self.sample_set)
+            self._check_change(change)
+            assert_equal(mover._pool.is_running, True)
+            # a second move reuses the running workers
+            change = mover.move(self.sample_set)
+            self._check_change(change)
+        finally:
+            mover.close()
+        assert_equal(mover._pool, None)
+
+
+    def test_move_reproducible(self):
+        mover = ConcurrentMover([self.shooter, self.shooter2])
+        shooting_points = []
+        try:
+            for _ in range(2):
+                random.seed(42)
+                np.random.seed(42)
+                change = mover.move(self.sample_set)
+                shooting_points.append([
+                    sub.details.shooting_snapshot
+                    for sub in change.subchanges
+                ])
+        finally:
+            mover.close()
+
+        for snap1, snap2 in zip(*shooting_points):
+            assert_equal(snap1, snap2)
+
+    def test_random_generators(self):
+        pool = paths.engines.EngineProcessPool(1, [self.toy_engine])
+        state = np.random.get_state()
+        with pool.use(seed=3):
+            rng = paths.engines.numpy_random()
+            assert_equal(type(rng), np.random.RandomState)
+            value = rng.randint(100)
+            assert_equal(type(paths.engines.python_random()), random.Random)
+        assert_equal(value, np.random.RandomState(3).randint(100))
+        assert_equal(paths.engines.numpy_random(), np.random)
+        assert_equal(paths.engines.python_random(), random)
+        # the global generators are left alone
+        assert_equal(list(np.random.get_state()[1]), list(state[1]))
+
+
 class SubtrajectorySelectTester(object):
 
     def setup(self):
@@ -222,6 +222,105 @@ class testShootFromSnapshotsSimulation(object):
             assert_true(len(set(length_to_submover[k])) <= 1)
 
 
+class testConcurrentPathSampling(object):
+    def setup(self):
+        # 1D motion on a flat potential: forward shots end in the state on
+        # the right, backward shots in the state on the left
+        pes = toys.LinearSlope(m=[0.0], c=[0.0])
+        topology = toys.Topology(n_spatial=1, masses=[1.0], pes=pes)
+        integrator = toys.LeapfrogVerletIntegrator(0.1)
+        options = {
+            'integ': integrator,
+            'n_frames_max': 1000,
+            'n_steps_per_frame': 1
+        }
+        self.engine = toys.Engine(options=options, topology=topology)
+        cvA = paths.FunctionCV("xA", lambda s : s.xyz[0][0])
+        cvB = paths.FunctionCV("xB", lambda s : -s.xyz[0][0])
+        stateA = paths.CVDefinedVolume(cvA, float("-inf"), -0.5)
+        stateB = paths.CVDefinedVolume(cvB, float("-inf"), -0.5)
+        interfacesA = paths.VolumeInterfaceSet(cvA, float("-inf"),
+                                               [-0.5, -0.3, -0.1])
+        interfacesB = paths.VolumeInterfaceSet(cvB, float("-inf"),
+                                               [-0.5, -0.3, -0.1])
+        network = paths.MSTISNetwork([(stateA, interfacesA),
+                                      (stateB, interfacesB)])
+
+        self.scheme = paths.MoveScheme(network)
+        self.scheme.append([
+            paths.strategies.OneWayShootingStrategy(engine=self.engine),
+            paths.strategies.ConcurrentStrategy(),
+            paths.strategies.OrganizeByMoveGroupStrategy()
+        ])
+
+        traj = paths.Trajectory([
+            toys.Snapshot(coordinates=np.array([[x]]),
+                          velocities=np.array([[1.0]]),
+                          engine=self.engine)
+            for x in [-0.55, -0.45, -0.35, -0.25, -0.15, -0.05,
+                      0.05, 0.15, 0.25, 0.35, 0.45, 0.55]
+        ])
+        samples = []
+        for ens in network.from_state[stateA].ensembles:
+            samples.append(paths.Sample(replica=len(samples),
+                                        trajectory=traj, ensemble=ens))
+        for ens in network.from_state[stateB].ensembles:
+            samples.append(paths.Sample(replica=len(samples),
+                                        trajectory=traj.reversed,
+                                        ensemble=ens))
+        self.sample_set = paths.SampleSet(samples)
+        self.sample_set.sanity_check()
+
+    def test_run(self):
+        sim = PathSampling(storage=None, move_scheme=self.scheme,
+                           sample_set=self.sample_set)
+        sim.output_stream = open(os.devnull, "w")
+        assert_equal(sim._make_engine_pool().n_workers, 6)
+        sim.run(2)
+        sim.sample_set.sanity_check()
+        # the workers belong to the run, not to the mover
+        assert_equal(self.scheme.movers['shooting'][0]._pool, None)
+        assert_equal(paths.engines.active_pool(), None)
+        shooters = self.scheme.movers['shooting'][0].movers
+        changes = [
+            change for change in sim.current_step.change
+            if isinstance(change.mover, paths.ConcurrentMover)
+        ]
+        assert_equal(len(changes), 1)
+        assert_equal([sub.mover for sub in changes[0].subchanges],
+                     shooters)
+        for ens in self.scheme.network.sampling_ensembles:
+            assert_true(ens(sim.sample_set[ens].trajectory))
+
+    def test_run_two_way(self):
+        scheme = paths.MoveScheme(self.scheme.network)
+        scheme.append([
+            paths.strategies.TwoWayShootingStrategy(
+                modifier=paths.NoModification(), engine=self.engine,
+                concurrent=True),
+            paths.strategies.OrganizeByMoveGroupStrategy()
+        ])
+        sim = PathSampling(storage=None, move_scheme=scheme,
+                           sample_set=self.sample_set)
+        sim.output_stream = open(os.devnull, "w")
+        assert_equal(sim._make_engine_pool().n_workers, 2)
+        sim.run(2)
+        sim.sample_set.sanity_check()
+        assert_equal(paths.engines.active_pool(), None)
+        for ens in scheme.network.sampling_ensembles:
+            assert_true(ens(sim.sample_set[ens].trajectory))
+
+    def test_no_pool_without_concurrent_movers(self):
+        scheme = paths.MoveScheme(self.scheme.network)
+        scheme.append([
+            paths.strategies.OneWayShootingStrategy(engine=self.engine),
+            paths.strategies.OrganizeByMoveGroupStrategy()
+        ])
+        sim = PathSampling(storage=None, move_scheme=scheme,
+                           sample_set=self.sample_set)
+        assert_equal(sim._make_engine_pool(), None)
+
+
 class testCommittorSimulation(object):
     def setup(self):
         # As a test system, let's use 1D motion on a flat potential. If the
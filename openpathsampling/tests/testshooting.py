@@ -68,3 +68,23 @@ class testFinalFrameSelector(SelectorTest):
         assert_items_equal([0.1, 0.2, 0.3, 0.4, 0.5],
                            [s.coordinates[0][0] for s in samples[0].trajectory]
                           )
+
+class testUniformSelector(SelectorTest):
+    def test_max_trial_length(self):
+        sel = UniformSelector()
+        # sum_bias of the old trajectory is 5 - 2 = 3
+        assert_equal(sel.max_trial_length(self.mytraj, 1.0), 5)
+        assert_equal(sel.max_trial_length(self.mytraj, 0.5), 8)
+        assert_equal(sel.max_trial_length(self.mytraj, 0.4), 9)
+        assert_equal(sel.max_trial_length(self.mytraj, 0.0), None)
+        for rand in [0.9, 0.5, 0.31, 0.2]:
+            max_len = sel.max_trial_length(self.mytraj, rand)
+            longest = make_1d_traj(coordinates=[0.0] * max_len)
+            too_long = make_1d_traj(coordinates=[0.0] * (max_len + 1))
+            snap = self.mytraj[1]
+            assert(rand <= sel.probability_ratio(snap, self.mytraj, longest))
+            assert(rand > sel.probability_ratio(snap, self.mytraj, too_long))
+
+    def test_max_trial_length_default(self):
+        sel = FirstFrameSelector()
+        assert_equal(sel.max_trial_length(self.mytraj, 0.5), None)
@@ -3,9 +3,10 @@
 @author Jan-Hendrik Prinz
 """
 import os
+import shutil
 
 import mdtraj as md
-from nose.tools import (assert_equal)
+from nose.tools import (assert_equal, assert_raises)
 
 import openpathsampling as paths
 
@@ -13,6 +14,7 @@ import openpathsampling.engines.openmm as peng
 import openpathsampling.engines.toy as toys
 
 from openpathsampling.netcdfplus import ObjectJSON
+from openpathsampling.netcdfplus.writebehind import WriteBehindQueue
 from openpathsampling.storage import Storage
 from test_helpers import (data_filename,
                           compare_snapshot
@@ -204,6 +206,25 @@ class testStorage(object):
 
             store.close()
 
+    def test_load_resave(self):
+        store = Storage(filename=self.filename, mode='w')
+        store.save(self.template_snapshot)
+        store.close()
+
+        for write_behind in [False, True]:
+            store = Storage(filename=self.filename, mode='a')
+            if write_behind:
+                store.enable_write_behind()
+
+            loaded = store.snapshots[0]
+            store.snapshots.cache.clear()
+            store.save(loaded)
+            store.save(loaded.reversed)
+
+            assert_equal(len(store.snapshots), 2)
+            compare_snapshot(store.snapshots[0], self.template_snapshot, True)
+            store.close()
+
     def test_proxy(self):
         for use_uuid in [True]:
             store = Storage(filename=self.filename, mode='w')
@@ -303,6 +324,102 @@ class testStorage(object):
 
         compare_snapshot(storage_w.objects['snapshot0'][4], test_snap)
 
+    def test_storage_policy(self):
+        storage_w = paths.Storage(
+            self.filename, "w",
+            policy=paths.storage.AcceptedPathsPolicy())
+
+        storage_w.snapshots.add_type(self.template_snapshot)
+
+        ensemble = paths.LengthEnsemble(3)
+        accepted = paths.Sample(
+            replica=0, trajectory=self.traj[0:3], ensemble=ensemble)
+        rejected = paths.Sample(
+            replica=0, trajectory=self.traj[3:6], ensemble=ensemble)
+
+        step = paths.MCStep(
+            mccycle=1,
+            active=paths.SampleSet([accepted]),
+            change=paths.RejectedSampleMoveChange([rejected])
+        )
+
+        storage_w.steps.save(step)
+
+        snapshots = storage_w.snapshots
+        assert(snapshots.only_mention is False)
+
+        for snap in self.traj[0:6]:
+            assert(snap.__uuid__ in snapshots.index)
+
+        # only the accepted trajectory is stored in full
+        for snap in self.traj[0:3]:
+            assert(snapshots.vars['store'][snapshots.pos(snap) / 2]
+                   is not None)
+
+        for snap in self.traj[3:6]:
+            assert(snapshots.vars['store'][snapshots.pos(snap) / 2] is None)
+
+        storage_w.close()
+
+    def test_compact_storage(self):
+        storage_w = paths.Storage(self.filename, "w")
+
+        ensemble = paths.LengthEnsemble(3)
+        accepted = paths.Sample(
+            replica=0, trajectory=self.traj[0:3], ensemble=ensemble)
+        rejected = paths.Sample(
+            replica=0, trajectory=self.traj[3:6], ensemble=ensemble)
+
+        step = paths.MCStep(
+            mccycle=1,
+            active=paths.SampleSet([accepted]),
+            change=paths.RejectedSampleMoveChange([rejected])
+        )
+
+        storage_w.steps.save(step)
+
+        cv = paths.FunctionCV(
+            'x', lambda snap: snap.xyz[0][0]
+        ).with_diskcache(allow_incomplete=True)
+        storage_w.save(cv)
+        storage_w.cvs.complete(cv)
+
+        scheme = paths.LockedMoveScheme(paths.IdentityPathMover())
+        storage_w.save(scheme)
+        storage_w.tag['ensemble'] = ensemble
+        storage_w.close()
+
+        paths.storage.compact_storage(self.filename, self.filename_clone)
+
+        storage_r = paths.Storage(self.filename_clone, "r")
+        snapshots = storage_r.snapshots
+        assert_equal(len(storage_r.steps), 1)
+
+        for snap in self.traj[0:6]:
+            assert(snap.__uuid__ in snapshots.index)
+
+        # only the active trajectory is stored in full
+        for snap in self.traj[0:3]:
+            pos = snapshots.pos(snap)
+            assert(snapshots.vars['store'][pos / 2] is not None)
+            compare_snapshot(snapshots[pos], snap)
+
+        for snap in self.traj[3:6]:
+            assert(snapshots.vars['store'][snapshots.pos(snap) / 2] is None)
+
+        # the values are copied for kept and mentioned snapshots
+        cv_store = storage_r.cvs.cache_store(storage_r.cvs[0])
+        for snap in self.traj[0:6]:
+            np.testing.assert_allclose(cv_store[snap], cv(snap), rtol=1e-6)
+
+        # schemes and tags are copied
+        assert_equal(len(storage_r.schemes), 1)
+        assert_equal(storage_r.schemes[0].__uuid__, scheme.__uuid__)
+        assert_equal(storage_r.tag.keys(), ['ensemble'])
+        assert_equal(storage_r.tag['ensemble'].__uuid__, ensemble.__uuid__)
+
+        storage_r.close()
+
     def test_load_save_uuid(self):
         store = Storage(filename=self.filename, mode='w')
         assert(os.path.isfile(self.filename))
@@ -342,6 +459,283 @@ class testStorage(object):
 
         store.close()
 
+    def test_quantized_coordinates(self):
+        store = Storage(
+            filename=self.filename, mode='w',
+            precision={'coordinates': 1e-3}, zlib=True)
+
+        snapshot = toys.Snapshot(
+            coordinates=np.array([[0.12345, -0.5]]),
+            velocities=np.array([[0.0, 0.0]]),
+            engine=self.engine
+        )
+
+        store.save(snapshot)
+        store.close()
+
+        store = Storage(filename=self.filename, mode='r')
+        variable = store.variables['snapshot0_coordinates']
+        assert(variable.dtype == np.int32)
+
+        loaded = store.snapshots[0]
+        assert(loaded.coordinates.dtype == np.float32)
+        np.testing.assert_allclose(
+            loaded.coordinates, [[0.123, -0.5]], atol=1e-6)
+
+        store.close()
+
+    def test_chunking_policy(self):
+        policy = paths.netcdfplus.AtomBlockChunking(16, n_frames=128)
+        store = Storage(
+            filename=self.filename, mode='w',
+            chunking={'coordinates': policy})
+
+        topology = toys.Topology(
+            n_spatial=2,
+            masses=np.ones(40),
+            pes=None,
+            n_atoms=40
+        )
+        store.save(toys.Snapshot(
+            coordinates=np.zeros((40, 2)),
+            velocities=np.zeros((40, 2)),
+            engine=toys.Engine({}, topology)
+        ))
+
+        variable = store.variables['snapshot0_coordinates']
+        assert_equal(variable.shape[1:], (40, 2))
+        assert_equal(variable.chunking(), [128, 16, 2])
+
+        results = paths.storage.benchmark_chunking(
+            self.filename_clone,
+            {'default': None, 'frames': paths.netcdfplus.FramesPerChunk(8)},
+            n_frames=20, n_atoms=4, block=5, n_random=5)
+
+        assert_equal(sorted(results), ['default', 'frames'])
+        assert_equal(
+            sorted(results['frames']),
+            ['append', 'atom', 'random', 'sequential'])
+
+        store.close()
+
+    def test_in_memory(self):
+        store = Storage(filename=self.filename, mode='w', in_memory=True)
+        store.save(self.toy_template)
+        compare_snapshot(store.snapshots[0], self.toy_template, True)
+        store.close()
+
+        # without persist nothing is written
+        assert(not os.path.isfile(self.filename))
+
+        store = Storage(
+            filename=self.filename, mode='w', in_memory=True, persist=True)
+        store.save(self.toy_template)
+        store.close()
+
+        assert(os.path.isfile(self.filename))
+
+        store = Storage(filename=self.filename, mode='r')
+        compare_snapshot(store.snapshots[0], self.toy_template, True)
+        store.close()
+
+    def test_memmap(self):
+        store = Storage(filename=self.filename, mode='w', memmap=True)
+        store.save(self.toy_template)
+
+        variable = store.variables['snapshot0_coordinates']
+        assert(isinstance(variable, paths.netcdfplus.MemmapVariable))
+
+        # arrays read from a writable file are copies
+        stored = variable[0].copy()
+        loaded = variable[0:1]
+        loaded += 1.0
+        np.testing.assert_array_equal(variable[0], stored)
+        store.close()
+
+        store = Storage(filename=self.filename, mode='r')
+        compare_snapshot(store.snapshots[0], self.toy_template, True)
+        store.close()
+
+        shutil.rmtree(self.filename + '.arrays')
+
+    def test_memmap_in_memory(self):
+        assert_raises(
+            ValueError, Storage,
+            filename=self.filename, mode='w', in_memory=True, memmap=True)
+
+    def test_save_many(self):
+        store = Storage(filename=self.filename, mode='w')
+
+        traj = paths.Trajectory(self.traj[0:5])
+        store.save(traj[0])
+
+        # the first snapshot is already stored and the last one is repeated
+        snapshots = list(traj) + [traj[4].reversed]
+        refs = store.snapshots.save_many(snapshots)
+
+        assert_equal(refs, [s.__uuid__ for s in snapshots])
+        assert_equal(len(store.snapshots), 2 * len(traj))
+        for idx, snap in enumerate(traj):
+            assert_equal(store.snapshots.index[snap.__uuid__], 2 * idx)
+
+        store.close()
+
+        store = Storage(filename=self.filename, mode='a')
+        for idx, snap in enumerate(traj):
+            compare_snapshot(store.snapshots[2 * idx], snap)
+
+        store.close()
+
+    def test_save_many_new_type(self):
+        store = Storage(filename=self.filename, mode='w')
+        assert_equal(len(store.snapshots.type_list), 0)
+
+        # the snapshot type is registered before the slab is written
+        traj = paths.Trajectory(self.traj[0:5])
+        refs = store.snapshots.save_many(list(traj))
+
+        assert_equal(refs, [s.__uuid__ for s in traj])
+        assert_equal(len(store.snapshots.type_list), 1)
+        for idx, snap in enumerate(traj):
+            assert_equal(store.snapshots.index[snap.__uuid__], 2 * idx)
+
+        store.close()
+
+        store = Storage(filename=self.filename, mode='a')
+        for idx, snap in enumerate(traj):
+            compare_snapshot(store.snapshots[2 * idx], snap)
+
+        store.close()
+
+    def test_save_many_json(self):
+        store = Storage(filename=self.filename, mode='w')
+
+        details = [paths.Details(value=idx) for idx in range(5)]
+        refs = store.details.save_many(details + [None, details[0]])
+
+        assert_equal(refs[:5], [d.__uuid__ for d in details])
+        assert_equal(refs[5], None)
+        assert_equal(len(store.details), len(details))
+        store.close()
+
+        store = Storage(filename=self.filename, mode='r')
+        for idx, detail in enumerate(details):
+            loaded = store.details[idx]
+            assert_equal(loaded.__uuid__, detail.__uuid__)
+            assert_equal(loaded.value, idx)
+
+        store.close()
+
+    def test_lazy_index(self):
+        store = Storage(filename=self.filename, mode='w')
+        traj = paths.Trajectory(self.traj[0:5])
+        store.save(traj)
+        store.close()
+
+        store = Storage(filename=self.filename, mode='a', lazy_index=True)
+        assert(isinstance(store.snapshots.index, paths.netcdfplus.LazyHashedList))
+
+        for idx, snap in enumerate(traj):
+            assert(snap.__uuid__ in store.snapshots.index)
+            assert_equal(store.snapshots.index[snap.__uuid__], 2 * idx)
+            assert_equal(
+                store.snapshots.index[snap.reversed.__uuid__], 2 * idx + 1)
+            assert_equal(store.snapshots.index.index(2 * idx), snap.__uuid__)
+
+        loaded = store.trajectories[traj.__uuid__]
+        for s, t in zip(loaded, traj):
+            compare_snapshot(s, t)
+
+        # new objects are added to the index in memory
+        traj2 = paths.Trajectory(self.traj[5:7])
+        store.save(traj2)
+        assert_equal(store.snapshots.index[traj2[1].__uuid__], 2 * 6)
+        assert_equal(len(store.trajectories), 2)
+        store.close()
+
+    def test_analysis_cache_file(self):
+        store = Storage(filename=self.filename, mode='w')
+        traj = paths.Trajectory(self.traj[0:5])
+        # every call of `reversed` creates a new trajectory
+        rev = traj.reversed
+        store.save(traj)
+        store.save(rev)
+        store.close()
+
+        cache_file = self.filename + '.analysis.npz'
+        if os.path.isfile(cache_file):
+            os.remove(cache_file)
+
+        try:
+            # the first time writes the cache file, the second time reads it
+            for _ in range(2):
+                storage_r = paths.AnalysisStorage(
+                    self.filename, cache_file=True)
+                assert(os.path.isfile(cache_file))
+                assert_equal(len(storage_r.trajectories), 2)
+
+                for loaded, t in zip(storage_r.trajectories, [traj, rev]):
+                    assert_equal(loaded.__uuid__, t.__uuid__)
+                    for s1, s2 in zip(loaded, t):
+                        assert_equal(s1.__uuid__, s2.__uuid__)
+                        compare_snapshot(s1, s2, True)
+
+                # the reversed trajectory holds the reversed snapshots
+                loaded, loaded_rev = list(storage_r.trajectories)
+                for s1, s2 in zip(loaded_rev, reversed(loaded)):
+                    assert_equal(s1.__uuid__, s2.reversed.__uuid__)
+
+                storage_r.close()
+        finally:
+            if os.path.isfile(cache_file):
+                os.remove(cache_file)
+
+    def test_write_behind(self):
+        store = Storage(filename=self.filename, mode='w')
+        store.enable_write_behind()
+        assert(store.write_behind)
+
+        traj = paths.Trajectory(self.traj[0:5])
+        store.save(traj)
+
+        # reading while writes are pending
+        assert_equal(len(store.snapshots), 2 * len(traj))
+        assert_equal(len(store.trajectories), 1)
+        store.snapshots.cache.clear()
+        compare_snapshot(store.snapshots[2], traj[1])
+
+        store.sync()
+        store.disable_write_behind()
+        assert(not store.write_behind)
+        store.close()
+
+        store = Storage(filename=self.filename, mode='a')
+        loaded = store.trajectories[0]
+        assert_equal(len(loaded), len(traj))
+        for s, t in zip(loaded, traj):
+            compare_snapshot(s, t)
+
+        store.close()
+
+    def test_write_behind_error(self):
+        class FailingVariable(object):
+            name = 'failing'
+            dtype = np.dtype(np.float32)
+            dimensions = ()
+
+            def __setitem__(self, key, value):
+                raise IOError('disk full')
+
+        variable = FailingVariable()
+        writer = WriteBehindQueue()
+        writer.put(variable, 0, 1.0)
+
+        # the error is raised by all later calls, not only the first
+        assert_raises(IOError, writer.drain)
+        assert_raises(IOError, writer.drain)
+        assert_raises(IOError, writer.put, variable, 1, 2.0)
+        assert_raises(IOError, writer.stop)
+
     def test_reverse_bug(self):
         store = Storage(filename=self.filename,
                         mode='w')
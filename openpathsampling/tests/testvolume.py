@@ -391,6 +391,127 @@ class testVolumeFactory(object):
             volume.VolumeFactory.CVRangeVolumePeriodicSet(op_id, mins, maxs)
         )
 
+class FrameList(list):
+    """List of CV values that looks like a trajectory to `Volume.mask`"""
+    def as_proxies(self):
+        return self
+
+
+class testVolumeMask(object):
+    def setUp(self):
+        self.frames = FrameList(
+            [-200.0, -100.0, -0.75, -0.5, -0.3, 0.0, 0.25, 0.5, 0.6, 0.75,
+             1.0, 80.0, 170.0, 200.0, float('nan')]
+        )
+
+    def _check_mask(self, vol, frames=None):
+        if frames is None:
+            frames = self.frames
+        mask = vol.mask(frames)
+        assert_equal(mask.dtype, bool)
+        assert_equal(list(mask), [bool(vol(value)) for value in frames])
+
+    def test_cv_volumes(self):
+        for vol in [volA, volB, volC, volD,
+                    volume.CVDefinedVolume(op_id, float('-inf'), 0.5),
+                    volume.CVDefinedVolume(op_id, 0.5, float('inf'))]:
+            self._check_mask(vol)
+
+    def test_combinations(self):
+        empty = volume.EmptyVolume()
+        full = volume.FullVolume()
+        for vol in [volA | volA2, volA & volA2, volA ^ volA2, volA - volA2,
+                    ~volA, ~(volA2 - volB), empty, full, volA2 | empty,
+                    full - volA2]:
+            self._check_mask(vol)
+
+    def test_periodic_volumes(self):
+        # the periodic wrapping fails for NaN
+        frames = FrameList(self.frames[:-1])
+        for vol in [
+            volume.PeriodicCVDefinedVolume(op_id, -150, 70, -180, 180),
+            volume.PeriodicCVDefinedVolume(op_id, 70, -150, -180, 180),
+            volume.PeriodicCVDefinedVolume(op_id, -100, 75)
+        ]:
+            self._check_mask(vol, frames)
+
+    def test_fallback(self):
+        class ValueVolume(volume.Volume):
+            def __call__(self, snapshot):
+                return snapshot > 0.0
+
+        self._check_mask(ValueVolume())
+        self._check_mask(ValueVolume() | volA)
+
+
+class Frame(object):
+    """Weak-referenceable stand-in for a snapshot with a CV value"""
+    def __init__(self, value):
+        self.value = value
+
+    def __float__(self):
+        return self.value
+
+
+class CountingIdentity(CallIdentity):
+    def __init__(self):
+        super(CountingIdentity, self).__init__()
+        self.n_calls = 0
+
+    def __call__(self, value):
+        self.n_calls += 1
+        return value
+
+
+class testVolumeCache(object):
+    def setUp(self):
+        self.op = CountingIdentity()
+        self.volA = volume.CVDefinedVolume(self.op, -0.5, 0.5)
+        self.volB = volume.CVDefinedVolume(self.op, 0.25, 0.75)
+        self.frames = [Frame(value) for value in [-0.6, 0.0, 0.3, 0.6]]
+
+    def test_cache_disabled_by_default(self):
+        assert_equal(self.volA.cache_enabled, False)
+        for frame in self.frames + self.frames:
+            self.volA(frame)
+        assert_equal(self.op.n_calls, 8)
+        assert_equal(self.volA.cache_hits, 0)
+        assert_equal(self.volA.cache_misses, 0)
+
+    def test_cache_hits_and_misses(self):
+        assert_is(self.volA.enable_cache(), self.volA)
+        results = [self.volA(frame) for frame in self.frames]
+        assert_equal(results, [False, True, True, False])
+        assert_equal([self.volA(frame) for frame in self.frames], results)
+        assert_equal(self.op.n_calls, 4)
+        assert_equal(self.volA.cache_hits, 4)
+        assert_equal(self.volA.cache_misses, 4)
+
+        self.volA.disable_cache()
+        assert_equal(self.volA.cache_enabled, False)
+        self.volA(self.frames[0])
+        assert_equal(self.op.n_calls, 5)
+
+    def test_composite_reuses_children(self):
+        union = volume.UnionVolume(self.volA, self.volB).enable_cache()
+        negated = (~self.volB).enable_cache()
+        assert_equal(self.volA.cache_enabled, True)
+        assert_equal(self.volB.cache_enabled, True)
+        for frame in self.frames:
+            assert_equal(union(frame), 0.0 <= frame.value <= 0.75)
+            assert_equal(negated(frame), not 0.25 <= frame.value <= 0.75)
+        # volB was tested twice on the frames outside volA
+        assert_equal(self.volB.cache_hits, 2)
+        assert_equal(self.op.n_calls, 8)
+
+    def test_cache_is_weak(self):
+        self.volA.enable_cache()
+        self.volA(self.frames[0])
+        assert_equal(len(self.volA._result_cache), 1)
+        del self.frames[0]
+        assert_equal(len(self.volA._result_cache), 0)
+
+
 class testAbstract(object):
     @raises_with_message_like(TypeError, "Can't instantiate abstract class")
     def test_abstract_volume(self):
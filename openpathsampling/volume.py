@@ -6,7 +6,9 @@ Created on 03.09.2014
 
 import range_logic
 import abc
-from openpathsampling.netcdfplus import StorableNamedObject
+import functools
+import numpy as np
+from openpathsampling.netcdfplus import StorableNamedObject, WeakKeyCache
 
 # TODO: Make Full and Empty be Singletons to avoid storing them several times!
 
@@ -32,15 +34,109 @@ def join_volumes(volume_list):
     return volume
 
 
+def _unique(objects):
+    """
+    Remove duplicates from a list, keeping the order of first appearance
+    """
+    result = []
+    for obj in objects:
+        if not any(obj is other for other in result):
+            result.append(obj)
+    return result
+
+
+def cached_result(call):
+    """
+    Decorator for `Volume.__call__` to use the volume's result cache
+
+    If the result cache of the volume is enabled (see
+    :meth:`Volume.enable_cache`), the result for a snapshot is looked up in
+    the cache first and only computed if the snapshot has not been tested
+    before. Calls with additional arguments always bypass the cache.
+    """
+    @functools.wraps(call)
+    def cached_call(self, snapshot, *args, **kwargs):
+        cache = self._result_cache
+        if cache is None or args or kwargs:
+            return call(self, snapshot, *args, **kwargs)
+
+        try:
+            result = cache[snapshot]
+        except KeyError:
+            self._cache_misses += 1
+            result = call(self, snapshot)
+            cache[snapshot] = result
+        else:
+            self._cache_hits += 1
+
+        return result
+
+    return cached_call
+
+
 class Volume(StorableNamedObject):
     """
     A Volume describes a set of snapshots 
+
+    Volumes can keep the results for tested snapshots in an opt-in cache
+    that only holds weak references to the snapshots, similar to the value
+    cache of a collective variable. Use :meth:`enable_cache` to switch it
+    on.
     """
 
     __metaclass__ = abc.ABCMeta
 
     def __init__(self):
         super(Volume, self).__init__()
+        self._result_cache = None
+        self._cache_hits = 0
+        self._cache_misses = 0
+
+    def enable_cache(self):
+        """
+        Cache the results of `__call__` for each snapshot
+
+        Composite volumes also enable the cache of the volumes they are
+        built from, so that these results are reused by every composite
+        that shares them.
+
+        Returns
+        -------
+        :class:`openpathsampling.Volume`
+            the volume itself
+        """
+        if self._result_cache is None:
+            self._result_cache = WeakKeyCache()
+        return self
+
+    def disable_cache(self):
+        """
+        Drop the result cache and stop caching
+
+        This only affects this volume and not the volumes it is built from.
+
+        Returns
+        -------
+        :class:`openpathsampling.Volume`
+            the volume itself
+        """
+        self._result_cache = None
+        return self
+
+    @property
+    def cache_enabled(self):
+        """bool : `True` if results are cached"""
+        return self._result_cache is not None
+
+    @property
+    def cache_hits(self):
+        """int : number of calls answered from the result cache"""
+        return self._cache_hits
+
+    @property
+    def cache_misses(self):
+        """int : number of calls that had to compute the result"""
+        return self._cache_misses
 
     @abc.abstractmethod
     def __call__(self, snapshot):
@@ -49,6 +145,40 @@ class Volume(StorableNamedObject):
         '''
         
         return False # pragma: no cover
+
+    def mask(self, trajectory):
+        '''
+        Returns a boolean array which frames of the trajectory are in the volume
+
+        This default evaluates the volume frame by frame. Volumes that can
+        test all frames at once (e.g. from an array of CV values) override
+        it.
+
+        Parameters
+        ----------
+        trajectory : :class:`openpathsampling.Trajectory`
+            the trajectory to be tested
+
+        Returns
+        -------
+        numpy.ndarray of bool
+            `mask[i]` is `True` if and only if `trajectory[i]` is in the
+            volume
+        '''
+        return np.array(
+            [bool(self(frame)) for frame in trajectory.as_proxies()],
+            dtype=bool
+        )
+
+    def collectivevariables(self):
+        """
+        Return the collective variables this volume depends on
+
+        Returns
+        -------
+        list of :class:`openpathsampling.CollectiveVariable`
+        """
+        return []
                 
     def __str__(self):
         '''
@@ -110,6 +240,10 @@ class VolumeCombination(Volume):
     This should be treated as an abstract class. For storage purposes, use
     specific subclasses in practice.
     """
+
+    # the combination `fnc` for boolean arrays; set in the subclasses
+    _mask_fnc = None
+
     def __init__(self, volume1, volume2, fnc, str_fnc):
         super(VolumeCombination, self).__init__()
         self.volume1 = volume1
@@ -117,6 +251,7 @@ class VolumeCombination(Volume):
         self.fnc = fnc
         self.sfnc = str_fnc
 
+    @cached_result
     def __call__(self, snapshot):
         # short circuit following JHP's implementation in ensemble.py
         a = self.volume1(snapshot)
@@ -129,6 +264,22 @@ class VolumeCombination(Volume):
             return self.fnc(a, b)
         #return self.fnc(self.volume1.__call__(snapshot),
                         #self.volume2.__call__(snapshot))
+
+    def mask(self, trajectory):
+        if self._mask_fnc is None:
+            return super(VolumeCombination, self).mask(trajectory)
+        return self._mask_fnc(self.volume1.mask(trajectory),
+                              self.volume2.mask(trajectory))
+
+    def enable_cache(self):
+        self.volume1.enable_cache()
+        self.volume2.enable_cache()
+        return super(VolumeCombination, self).enable_cache()
+
+    def collectivevariables(self):
+        return _unique(
+            self.volume1.collectivevariables() +
+            self.volume2.collectivevariables())
     
     def __str__(self):
         return '(' + self.sfnc.format(str(self.volume1), str(self.volume2)) + ')'
@@ -139,24 +290,32 @@ class VolumeCombination(Volume):
 
 class UnionVolume(VolumeCombination):
     """ "Or" combination (union) of two volumes."""
+    _mask_fnc = staticmethod(np.logical_or)
+
     def __init__(self, volume1, volume2):
         super(UnionVolume, self).__init__(volume1, volume2, lambda a,b : a or b, str_fnc = '{0} or {1}')
 
 
 class IntersectionVolume(VolumeCombination):
     """ "And" combination (intersection) of two volumes."""
+    _mask_fnc = staticmethod(np.logical_and)
+
     def __init__(self, volume1, volume2):
         super(IntersectionVolume, self).__init__(volume1, volume2, lambda a,b : a and b, str_fnc = '{0} and {1}')
 
 
 class SymmetricDifferenceVolume(VolumeCombination):
     """ "Xor" combination of two volumes."""
+    _mask_fnc = staticmethod(np.logical_xor)
+
     def __init__(self, volume1, volume2):
         super(SymmetricDifferenceVolume, self).__init__(volume1, volume2, lambda a,b : a ^ b, str_fnc = '{0} xor {1}')
 
 
 class RelativeComplementVolume(VolumeCombination):
     """ "Subtraction" combination (relative complement) of two volumes."""
+    _mask_fnc = staticmethod(lambda a, b: np.logical_and(a, np.logical_not(b)))
+
     def __init__(self, volume1, volume2):
         super(RelativeComplementVolume, self).__init__(volume1, volume2, lambda a,b : a and not b, str_fnc = '{0} and not {1}')
 
@@ -167,8 +326,19 @@ class NegatedVolume(Volume):
         super(NegatedVolume, self).__init__()
         self.volume = volume
 
+    @cached_result
     def __call__(self, snapshot):
         return not self.volume(snapshot)
+
+    def mask(self, trajectory):
+        return np.logical_not(self.volume.mask(trajectory))
+
+    def enable_cache(self):
+        self.volume.enable_cache()
+        return super(NegatedVolume, self).enable_cache()
+
+    def collectivevariables(self):
+        return self.volume.collectivevariables()
     
     def __str__(self):
         return '(not ' + str(self.volume) + ')'
@@ -182,6 +352,9 @@ class EmptyVolume(Volume):
     def __call__(self, snapshot):
         return False
 
+    def mask(self, trajectory):
+        return np.zeros(len(trajectory), dtype=bool)
+
     def __and__(self, other):
         return self
 
@@ -209,6 +382,9 @@ class FullVolume(Volume):
     def __call__(self, snapshot):
         return True
 
+    def mask(self, trajectory):
+        return np.ones(len(trajectory), dtype=bool)
+
     def __invert__(self):
         return EmptyVolume()
 
@@ -365,6 +541,7 @@ class CVDefinedVolume(Volume):
         else:
             return super(CVDefinedVolume, self).__sub__(other)
 
+    @cached_result
     def __call__(self, snapshot):
         l = self.collectivevariable(snapshot).__float__()
 
@@ -379,6 +556,32 @@ class CVDefinedVolume(Volume):
 
         return True
 
+    def _cv_array(self, trajectory):
+        """
+        The values of the collective variable for all frames as float array
+        """
+        values = self.collectivevariable.values_for(trajectory)
+        if isinstance(values, np.ndarray) and values.dtype.kind in 'biuf':
+            return values.astype(float)
+
+        return np.array([value.__float__() for value in values], dtype=float)
+
+    def mask(self, trajectory):
+        l = self._cv_array(trajectory)
+
+        # same comparisons as in `__call__`, so NaN is treated the same way
+        result = np.ones(len(l), dtype=bool)
+        if self.lambda_min != float('-inf'):
+            result &= np.logical_not(self.lambda_min > l)
+
+        if self.lambda_min != float('inf'):
+            result &= np.logical_not(self.lambda_max < l)
+
+        return result
+
+    def collectivevariables(self):
+        return [self.collectivevariable]
+
     def __str__(self):
         return '{{x|{2}(x) in [{0}, {1}]}}'.format(
             self.lambda_min, self.lambda_max, self.collectivevariable.name)
@@ -469,6 +672,7 @@ class PeriodicCVDefinedVolume(CVDefinedVolume):
                                     self.period_min, self.period_max
                                    )
 
+    @cached_result
     def __call__(self, snapshot):
         l = self.collectivevariable(snapshot).__float__()
         if self.wrap:
@@ -478,6 +682,23 @@ class PeriodicCVDefinedVolume(CVDefinedVolume):
         else:
             return self.lambda_min <= l <= self.lambda_max
 
+    def mask(self, trajectory):
+        l = self._cv_array(trajectory)
+        if self.wrap:
+            # vectorized version of `do_wrap`
+            val = l - self._period_shift
+            positive = l - np.trunc(val / self._period_len) * self._period_len
+            wrapped = l + np.trunc(
+                (self._period_len - val) / self._period_len) * self._period_len
+            wrapped = np.where(wrapped >= self._period_len,
+                               wrapped - self._period_len, wrapped)
+            l = np.where(val > 0, positive, wrapped)
+
+        if self.lambda_min > self.lambda_max:
+            return np.logical_or(l >= self.lambda_min, l <= self.lambda_max)
+        else:
+            return np.logical_and(self.lambda_min <= l, l <= self.lambda_max)
+
     def __str__(self):
         if self.wrap:
             fcn = 'x|({0}(x) - {2}) % {1} + {2}'.format(
@@ -546,6 +767,7 @@ class VoronoiVolume(Volume):
         
         return min_idx
 
+    @cached_result
     def __call__(self, snapshot, state=None):
         '''
         Returns `True` if snapshot belongs to voronoi cell in state
@@ -572,6 +794,9 @@ class VoronoiVolume(Volume):
         
         return self.cell(snapshot) == state
 
+    def collectivevariables(self):
+        return [self.collectivevariable]
+
 
 class VolumeFactory(object):
     @staticmethod